@@ -0,0 +1,105 @@
+# Copyright 2022 Alex Butler
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Shared helpers for the benchmark scripts in this directory."""
+
+from __future__ import annotations
+
+import os
+import pathlib
+import subprocess
+import sys
+import time
+import timeit
+import typing as t
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from dbt_feature_flags.base import BaseFeatureFlagsClient, JSONValue  # noqa: E402
+
+# Runs the dbt CLI with the package's .pth bootstrap applied, as an installed
+# dbt-feature-flags would.
+DBT_WITH_PLUGIN = (
+    "import sys, dbt_feature_flags.bootstrap as bootstrap; bootstrap.install(); "
+    "from dbt.cli.main import cli; sys.exit(cli())"
+)
+DBT_WITHOUT_PLUGIN = "import sys; from dbt.cli.main import cli; sys.exit(cli())"
+
+
+class StaticClient(BaseFeatureFlagsClient):
+    def bool_variation(self, flag: str, default: bool = False) -> bool:
+        return default
+
+    def string_variation(self, flag: str, default: str = "") -> str:
+        return default
+
+    def number_variation(self, flag: str, default: float | int = 0) -> float | int:
+        return default
+
+    def json_variation(self, flag: str, default: JSONValue | None = None) -> JSONValue:
+        return {} if default is None else default
+
+
+def best_ns(fn: t.Callable[[], t.Any], number: int, repeat: int = 5) -> float:
+    """Best-of-repeat time per call in nanoseconds."""
+    return min(timeit.Timer(fn).repeat(repeat=repeat, number=number)) / number * 1e9
+
+
+def generate_project(project: pathlib.Path, models: int, flagged: float) -> None:
+    """Write a chained dbt-duckdb project where flagged% of models use a flag."""
+    (project / "models").mkdir(parents=True)
+    (project / "dbt_project.yml").write_text(
+        "name: bench\nversion: '1.0'\nprofile: bench\nconfig-version: 2\n"
+    )
+    (project / "profiles.yml").write_text(
+        "bench:\n  target: dev\n  outputs:\n    dev:\n"
+        f"      type: duckdb\n      path: {project / 'bench.duckdb'}\n"
+    )
+    every = max(1, round(100 / flagged)) if flagged else 0
+    for i in range(models):
+        flag = (
+            "{{ config(enabled=feature_flag('bench_flag', default=true)) }}\n"
+            if every and i % every == 0
+            else ""
+        )
+        upstream = f"{{{{ ref('model_{i - 1}') }}}}" if i else "(select 1 as id)"
+        (project / "models" / f"model_{i}.sql").write_text(
+            f"{flag}select id from {upstream} as upstream\n"
+        )
+
+
+def dbt_parse(
+    project: pathlib.Path, plugin: bool = True, partial: bool = True
+) -> float:
+    """Run `dbt parse` in a fresh interpreter and return the wall time."""
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(ROOT),
+        "DBT_PROFILES_DIR": str(project),
+        "DBT_FF_DISABLE": "true",  # mock mode, never reach a provider
+    }
+    code = DBT_WITH_PLUGIN if plugin else DBT_WITHOUT_PLUGIN
+    args = ["parse", "--project-dir", str(project)]
+    if not partial:
+        args.append("--no-partial-parse")
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", code, *args],
+        check=True,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    return time.perf_counter() - start
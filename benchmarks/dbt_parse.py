@@ -0,0 +1,64 @@
+# Copyright 2022 Alex Butler
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""End-to-end `dbt parse` on generated projects, with and without the plugin.
+
+For each project size, a chained dbt-duckdb project is generated with
+--flagged percent of its models gated by a feature flag in config(). The
+unpatched run uses a project without flags (dbt cannot render feature_flag
+without the plugin); both plugin runs use mock mode. Every parse is cold
+(--no-partial-parse). Requires the dbt-duckdb adapter.
+
+Usage:
+    python benchmarks/dbt_parse.py --models 100 1000 10000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import pathlib
+import tempfile
+
+from _common import dbt_parse, generate_project
+
+
+def run(
+    sizes: tuple[int, ...] = (100, 1000, 10000), flagged: float = 10
+) -> dict[str, dict[str, float]]:
+    results = {}
+    for models in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            plain = pathlib.Path(tmp, "plain")
+            flags = pathlib.Path(tmp, "flags")
+            generate_project(plain, models, 0)
+            generate_project(flags, models, flagged)
+            results[str(models)] = {
+                "without_plugin_s": dbt_parse(plain, plugin=False, partial=False),
+                "with_plugin_s": dbt_parse(plain, partial=False),
+                "with_plugin_and_flags_s": dbt_parse(flags, partial=False),
+            }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--flagged", type=float, default=10, help="percent")
+    args = parser.parse_args()
+    print(json.dumps(run(tuple(args.models), args.flagged), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# Copyright 2022 Alex Butler
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Flag evaluation cost per provider, through the validate/memoize wrappers.
+
+Each provider client is built around a local fake of its SDK (no network), so
+the numbers isolate the plugin's own overhead: the cached path is a repeated
+lookup of one flag, the uncached path clears the evaluation cache before every
+call and therefore includes validation and the (fake) SDK call.
+
+Usage:
+    python benchmarks/evaluation.py --number 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import pathlib
+import tempfile
+import typing as t
+from types import SimpleNamespace
+
+from _common import StaticClient, best_ns
+
+from dbt_feature_flags.base import BaseFeatureFlagsClient, JSONValue
+
+
+class FakeHarnessSDK:
+    def __init__(self) -> None:
+        self.configs: dict[str, list[t.Any]] = {"flags": [], "segments": []}
+
+    def bool_variation(self, flag: str, target: object, default: bool) -> bool:
+        return True
+
+    def string_variation(self, flag: str, target: object, default: str) -> str:
+        return "variant"
+
+    def number_variation(
+        self, flag: str, target: object, default: float | int
+    ) -> float | int:
+        return 1
+
+    def json_variation(
+        self, flag: str, target: object, default: JSONValue
+    ) -> JSONValue:
+        return {"enabled": True}
+
+
+class FakeSplitClient:
+    def get_treatment(self, key: str, flag: str) -> str:
+        return "on"
+
+    def get_treatment_with_config(self, key: str, flag: str) -> SimpleNamespace:
+        return SimpleNamespace(treatment="on", config='{"enabled": true}')
+
+
+class FakeLaunchDarklySDK:
+    def variation_detail(
+        self, flag: str, target: object, default: t.Any
+    ) -> SimpleNamespace:
+        value = {"enabled": True} if isinstance(default, dict) else default
+        return SimpleNamespace(value=value, reason={"kind": "FALLTHROUGH"})
+
+    def all_flags_state(
+        self, target: object, with_reasons: bool = False
+    ) -> SimpleNamespace:
+        values = {"flag": True, "text": "variant", "number": 1}
+        return SimpleNamespace(
+            valid=True,
+            to_values_map=lambda: values,
+            get_flag_reason=lambda flag: {"kind": "FALLTHROUGH"},
+        )
+
+
+def _harness() -> BaseFeatureFlagsClient:
+    from dbt_feature_flags.harness import HarnessFeatureFlagsClient
+
+    client = object.__new__(HarnessFeatureFlagsClient)
+    client.client = FakeHarnessSDK()
+    client._resolved = {}
+    client.target = object()
+    BaseFeatureFlagsClient.__init__(client)
+    return client
+
+
+def _fme() -> BaseFeatureFlagsClient:
+    from dbt_feature_flags.fme import HarnessFMEClient
+
+    client = object.__new__(HarnessFMEClient)
+    client._key = "dbt-default"
+    client._factory = SimpleNamespace(ready=True)
+    client._client = FakeSplitClient()
+    BaseFeatureFlagsClient.__init__(client)
+    return client
+
+
+def _launchdarkly() -> BaseFeatureFlagsClient:
+    from dbt_feature_flags.launchdarkly import LaunchDarklyFeatureFlagsClient
+
+    client = object.__new__(LaunchDarklyFeatureFlagsClient)
+    client.client = FakeLaunchDarklySDK()
+    client.target = {"key": "dbt-default"}
+    BaseFeatureFlagsClient.__init__(client)
+    return client
+
+
+def _file(tmp: pathlib.Path) -> BaseFeatureFlagsClient:
+    from dbt_feature_flags.local import FileFeatureFlagsClient
+
+    path = tmp / "flags.json"
+    path.write_text(
+        json.dumps(
+            {
+                "flags": {
+                    "flag": True,
+                    "text": "variant",
+                    "number": 1,
+                    "payload": {"value": {"enabled": True}},
+                }
+            }
+        )
+    )
+    return FileFeatureFlagsClient(path)
+
+
+def _snapshot(tmp: pathlib.Path) -> BaseFeatureFlagsClient:
+    from dbt_feature_flags.snapshot import SnapshotFeatureFlagsClient
+
+    return SnapshotFeatureFlagsClient(
+        StaticClient, "mock", path=tmp / ".dbt_ff_snapshot.json"
+    )
+
+
+CALLS: dict[str, tuple[str, t.Any]] = {
+    "bool_variation": ("flag", False),
+    "string_variation": ("text", ""),
+    "number_variation": ("number", 0),
+    "json_variation": ("payload", {"x": 1}),
+}
+
+
+def measure(client: BaseFeatureFlagsClient, number: int) -> dict[str, float]:
+    results = {}
+    clear = client.cache.clear
+    for variation, (flag, default) in CALLS.items():
+        evaluate = getattr(client, variation)
+        evaluate(flag, default)
+        results[f"{variation}_cached_ns"] = best_ns(
+            lambda: evaluate(flag, default), number
+        )
+        clear_ns = best_ns(clear, number)
+        results[f"{variation}_uncached_ns"] = (
+            best_ns(lambda: (clear(), evaluate(flag, default)), number) - clear_ns
+        )
+    return results
+
+
+def run(number: int = 100_000) -> dict[str, dict[str, float]]:
+    with tempfile.TemporaryDirectory() as tmp:
+        clients: dict[str, BaseFeatureFlagsClient] = {
+            "static": StaticClient(),
+            "harness": _harness(),
+            "fme": _fme(),
+            "launchdarkly": _launchdarkly(),
+            "file": _file(pathlib.Path(tmp)),
+            "snapshot": _snapshot(pathlib.Path(tmp)),
+        }
+        return {name: measure(client, number) for name, client in clients.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=100_000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.number), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Copyright 2022 Alex Butler
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-call overhead of the patched dbt get_rendered.
+
+Measures the wrapper alone (around a no-op render function) and dbt's real
+get_rendered on a template without flags, patched vs. unpatched, in mock and
+provider mode, and in provider mode recording the flag dependency graph.
+
+Usage:
+    python benchmarks/get_rendered.py --number 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import typing as t
+
+from _common import StaticClient, best_ns
+
+from dbt_feature_flags.graph import FlagGraph
+from dbt_feature_flags.patch import _MOCK_CLIENT, get_rendered
+
+
+def run(number: int = 100_000) -> dict[str, dict[str, float]]:
+    from dbt.clients import jinja
+
+    original = getattr(jinja, "_get_rendered", jinja.get_rendered)
+    ctx = {"var": lambda name, default=None: default}
+
+    def noop(*_: t.Any) -> None:
+        return None
+
+    node = type("Node", (), {"unique_id": "model.bench.node"})()
+
+    def per_call_ns(fn: t.Callable[..., t.Any]) -> float:
+        local_ctx = dict(ctx)
+        return best_ns(lambda: fn("select 1", local_ctx, node), number)
+
+    results = {}
+    modes: tuple[tuple[str, t.Any, FlagGraph | None], ...] = (
+        ("mock", _MOCK_CLIENT, None),
+        ("provider", StaticClient(), None),
+        ("graph", StaticClient(), FlagGraph()),
+    )
+    for mode, client, flag_graph in modes:
+        for name, fn in (("noop", noop), ("dbt", original)):
+            base_ns = per_call_ns(fn)
+            patched_ns = per_call_ns(get_rendered(fn, client, flag_graph))
+            results[f"{mode}_{name}"] = {
+                "unpatched_ns": base_ns,
+                "patched_ns": patched_ns,
+                "overhead_ns": patched_ns - base_ns,
+            }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=100_000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.number), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Copyright 2022 Alex Butler
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Full vs. selective partial parse invalidation on a synthetic project.
+
+Generates a project with --models models, a --flagged percentage of which use
+a feature flag in config(), parses it once, then times `dbt parse` after
+(a) deleting partial_parse.msgpack and (b) invalidating only the flagged files.
+Requires the dbt-duckdb adapter.
+
+Usage:
+    python benchmarks/partial_parse.py --models 5000 --flagged 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import pathlib
+import tempfile
+import time
+
+from _common import dbt_parse, generate_project
+
+from dbt_feature_flags.index import build_index
+from dbt_feature_flags.partial_parse import invalidate_files
+
+
+def run(models: int = 5000, flagged: float = 10) -> dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        project = pathlib.Path(tmp, "bench")
+        generate_project(project, models, flagged)
+        partial_parse = project / "target" / "partial_parse.msgpack"
+        results = {"models": models, "cold_parse_s": dbt_parse(project)}
+        results["warm_parse_s"] = dbt_parse(project)
+
+        index = build_index(str(project), str(project / "target"))
+        files = {ref.path for ref in index.references()}
+        results["flagged_files"] = len(files)
+
+        partial_parse.unlink()
+        results["full_invalidation_parse_s"] = dbt_parse(project)
+
+        start = time.perf_counter()
+        invalidate_files(partial_parse, files)
+        results["selective_invalidation_s"] = time.perf_counter() - start
+        results["selective_invalidation_parse_s"] = dbt_parse(project)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", type=int, default=5000)
+    parser.add_argument("--flagged", type=float, default=10, help="percent")
+    args = parser.parse_args()
+    print(json.dumps(run(args.models, args.flagged), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# Copyright 2022 Alex Butler
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Preflight runtime as the number of config-layer flags grows.
+
+Runs preflight against a provider that answers from memory, so the timings
+cover bulk evaluation, state fingerprinting, comparison and the state file
+write. "first" has no saved state, "unchanged" repeats the run with the same
+values and "changed" flips every flag.
+
+Usage:
+    python benchmarks/preflight_flags.py --counts 10 100 1000 10000
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import tempfile
+import time
+
+from _common import StaticClient
+
+from dbt_feature_flags import patch, preflight
+
+
+class ValueClient(StaticClient):
+    def __init__(self, value: bool) -> None:
+        self.value = value
+        super().__init__()
+
+    def bool_variation(self, flag: str, default: bool = False) -> bool:
+        return self.value
+
+
+def _timed_run(flags: list[str], target_dir: str, value: bool) -> float:
+    original = patch._get_client
+    patch._get_client = lambda: ValueClient(value)  # type: ignore[assignment]
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            preflight.run(flags, target_dir=target_dir, selective=False)
+            return time.perf_counter() - start
+    finally:
+        patch._get_client = original  # type: ignore[assignment]
+
+
+def run(counts: tuple[int, ...] = (10, 100, 1000, 10000)) -> dict[str, dict]:
+    results = {}
+    for count in counts:
+        flags = [f"flag_{i}" for i in range(count)]
+        with tempfile.TemporaryDirectory() as target_dir:
+            results[str(count)] = {
+                "first_s": _timed_run(flags, target_dir, True),
+                "unchanged_s": _timed_run(flags, target_dir, True),
+                "changed_s": _timed_run(flags, target_dir, False),
+            }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    args = parser.parse_args()
+    print(json.dumps(run(tuple(args.counts)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# Copyright 2022 Alex Butler
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Run the benchmark suite and write the results as one JSON document.
+
+The document records the package, Python and dbt versions next to each
+benchmark's results so runs from different releases can be compared.
+
+Usage:
+    python benchmarks/run.py --output bench.json
+    python benchmarks/run.py --only evaluation get_rendered --quick
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import platform
+import re
+import sys
+import typing as t
+from importlib import metadata
+
+from _common import ROOT
+import dbt_parse
+import evaluation
+import get_rendered
+import partial_parse
+import preflight_flags
+import startup
+import threads
+import validate
+
+# name -> (full run, quick run)
+BENCHMARKS: dict[str, tuple[t.Callable[[], t.Any], t.Callable[[], t.Any]]] = {
+    "startup": (startup.run, lambda: startup.run(runs=5)),
+    "evaluation": (evaluation.run, lambda: evaluation.run(number=10_000)),
+    "get_rendered": (get_rendered.run, lambda: get_rendered.run(number=10_000)),
+    "threads": (threads.run, lambda: threads.run(calls=20_000)),
+    "validate": (validate.run, lambda: validate.run(number=20_000)),
+    "preflight": (preflight_flags.run, lambda: preflight_flags.run((10, 100, 1000))),
+    "dbt_parse": (dbt_parse.run, lambda: dbt_parse.run((100, 1000))),
+    "partial_parse": (partial_parse.run, lambda: partial_parse.run(models=500)),
+}
+
+
+def _version(package: str) -> str | None:
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        if package != "dbt-feature-flags":
+            return None
+    # Running from a checkout that is not installed
+    pyproject = (ROOT / "pyproject.toml").read_text()
+    match = re.search(r'^version = "(.+)"', pyproject, re.MULTILINE)
+    return match.group(1) if match else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS))
+    parser.add_argument(
+        "--quick", action="store_true", help="smaller sizes, for smoke testing"
+    )
+    args = parser.parse_args()
+
+    report: dict[str, t.Any] = {
+        "meta": {
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "dbt_feature_flags": _version("dbt-feature-flags"),
+            "dbt_core": _version("dbt-core"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": args.quick,
+        },
+        "results": {},
+    }
+    for name in args.only or BENCHMARKS:
+        print(f"running {name}...", file=sys.stderr)
+        full, quick = BENCHMARKS[name]
+        report["results"][name] = quick() if args.quick else full()
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
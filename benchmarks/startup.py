@@ -0,0 +1,70 @@
+# Copyright 2022 Alex Butler
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Interpreter startup cost of the zzz_dbt_feature_flags.pth bootstrap.
+
+Compares `python -c pass` without the package against the same interpreter
+executing the .pth line first, both for the deferred bootstrap and for the
+previous eager patch.
+
+Usage:
+    python benchmarks/startup.py --runs 30
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from _common import ROOT
+
+SCENARIOS = {
+    "baseline": "pass",
+    "bootstrap": (ROOT / "zzz_dbt_feature_flags.pth").read_text().strip(),
+    "eager_patch": (
+        "import dbt_feature_flags.patch as patch; patch.patch_dbt_environment()"
+    ),
+}
+
+
+def measure(code: str, runs: int) -> dict[str, float]:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True, cwd=ROOT)
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "min_ms": min(samples),
+        "median_ms": statistics.median(samples),
+        "max_ms": max(samples),
+    }
+
+
+def run(runs: int = 20) -> dict[str, dict[str, float]]:
+    return {name: measure(code, runs) for name, code in SCENARIOS.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(run(args.runs), indent=2))
+
+
+if __name__ == "__main__":
+    main()
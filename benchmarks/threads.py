@@ -0,0 +1,69 @@
+# Copyright 2022 Alex Butler
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cached flag evaluation throughput as the number of dbt threads grows.
+
+Usage:
+    python benchmarks/threads.py --calls 200000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+
+from _common import StaticClient
+
+
+def throughput(threads: int, calls: int) -> dict[str, float]:
+    client = StaticClient()
+    flags = [f"flag_{i}" for i in range(50)]
+    client.bulk_evaluate(flags)
+    barrier = threading.Barrier(threads + 1)
+
+    def work() -> None:
+        evaluate = client.bool_variation
+        barrier.wait()
+        for i in range(calls):
+            evaluate(flags[i % 50])
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "calls_per_s": threads * calls / elapsed,
+        "ns_per_call": elapsed / (threads * calls) * 1e9,
+    }
+
+
+def run(calls: int = 200_000) -> dict[str, dict[str, float]]:
+    return {str(n): throughput(n, calls) for n in (1, 2, 4, 8, 16)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200_000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.calls), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# Copyright 2022 Alex Butler
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-call cost of flag validation on the cache-miss path.
+
+Compares the previous validate() decorator (reproduced below as the baseline)
+with the shared Validator and with trusted mode (DBT_FF_TRUSTED, no
+validation), each wrapping the same provider method.
+
+Usage:
+    python benchmarks/validate.py --number 200000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import typing as t
+from functools import wraps
+
+from _common import best_ns
+
+from dbt_feature_flags.base import VALIDATORS
+
+
+def legacy_validate(
+    types: tuple[type[t.Any], ...],
+    default_types: tuple[type[t.Any], ...] | None = None,
+) -> t.Callable[[t.Any], t.Any]:
+    """validate() as of dbt-feature-flags 0.5.2."""
+    valid_default_types = default_types or types
+
+    def _validate(v: t.Any, flag_name: str, func_name: str) -> t.Any:
+        if not isinstance(v, tuple(types)):
+            raise ValueError(
+                f"Invalid return value for {func_name}({flag_name}...) feature flag call. Found type {type(v).__name__}."
+            )
+        return v
+
+    def _main(func: t.Any) -> t.Any:
+        default_value = func.__defaults__[0] if func.__defaults__ else None
+
+        @wraps(func)
+        def _injected_validator(flag: str, default: t.Any = default_value) -> t.Any:
+            if not isinstance(default, valid_default_types):
+                raise ValueError(
+                    f"Invalid default value: {default} for {func.__name__}({flag}...) feature flag call. Found type {type(default).__name__}."
+                )
+            try:
+                return _validate(func(flag, default), flag, func.__name__)
+            except ValueError as exc:
+                raise ValueError(
+                    f"Invalid feature flag evaluation {func.__name__}({flag}...). Ensure the correct feature_flag_* function was used. Err: {exc}"
+                ) from exc
+
+        return _injected_validator
+
+    return _main
+
+
+def bool_variation(flag: str, default: bool = False) -> bool:
+    return True
+
+
+def json_variation(flag: str, default: t.Any = None) -> t.Any:
+    return {"enabled": True}
+
+
+def run(number: int = 200_000) -> dict[str, dict[str, float]]:
+    results = {}
+    for func, types, default_types, default in (
+        (bool_variation, (bool,), None, False),
+        (json_variation, (dict, list), (dict, list, type(None)), None),
+    ):
+        legacy = legacy_validate(types, default_types)(func)
+        current = VALIDATORS[func.__name__].wrap(func)  # type: ignore[index]
+        raw_ns = best_ns(lambda: func("flag", default), number)
+        legacy_ns = best_ns(lambda: legacy("flag", default), number)
+        current_ns = best_ns(lambda: current("flag", default), number)
+        results[func.__name__] = {
+            "legacy_overhead_ns": legacy_ns - raw_ns,
+            "validator_overhead_ns": current_ns - raw_ns,
+            "trusted_overhead_ns": 0.0,
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=200_000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.number), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -15,11 +15,81 @@
 from __future__ import annotations
 
 import abc
+import asyncio
+import copy
+import hashlib
+import json
 import logging
+import os
+import threading
 import typing as t
 from functools import wraps
 
+from dbt_feature_flags import telemetry
+
 JSONValue = dict[str, t.Any] | list[t.Any]
+Variation = t.Literal[
+    "bool_variation", "string_variation", "number_variation", "json_variation"
+]
+
+_MISSING: t.Any = object()
+
+# Provider independent evaluation reasons, see BaseFeatureFlagsClient.reasons.
+# Providers otherwise record their own short lowercase reason, e.g. "fallthrough".
+DEFAULT_REASON = "default"  # the flag is unknown or has no value of that type
+UNAVAILABLE_REASON = "unavailable"  # the provider was not ready or failed
+
+
+class EvaluationCache:
+    """Memoizes flag evaluations for the lifetime of a client.
+
+    A client lives for a single dbt invocation, so each (variation, flag, default)
+    is only sent to the provider once per run. This keeps parse time independent
+    of the number of flag references and serves consistent values even if a flag
+    flips mid-parse. JSON objects and arrays are copied in and out of the cache,
+    so a template mutating a result does not change what later nodes see.
+
+    dbt renders from many threads against one client. Reads are plain dict
+    lookups and never take a lock; the first value stored for a key wins, so
+    concurrent misses still agree on one value. Hit/miss counters are kept per
+    thread and summed on read.
+    """
+
+    def __init__(self) -> None:
+        self._values: dict[t.Hashable, t.Any] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counters: list[list[int]] = []
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def counter(self) -> list[int]:
+        """Return the calling thread's [hits, misses] counter."""
+        try:
+            return self._local.counter
+        except AttributeError:
+            counter = self._local.counter = [0, 0]
+            with self._lock:
+                self._counters.append(counter)
+            return counter
+
+    @property
+    def hits(self) -> int:
+        return sum(counter[0] for counter in self._counters)
+
+    @property
+    def misses(self) -> int:
+        return sum(counter[1] for counter in self._counters)
+
+    def clear(self) -> None:
+        self._values.clear()
+        with self._lock:
+            for counter in self._counters:
+                counter[:] = [0, 0]
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._values)}
 
 
 class BaseFeatureFlagsClient(abc.ABC):
@@ -30,28 +100,27 @@ class BaseFeatureFlagsClient(abc.ABC):
     logger = logging.getLogger("dbt_feature_flags")
 
     def __init__(self) -> None:
+        self.cache = EvaluationCache()
+        # flag -> why the provider served its value, recorded on cache misses
+        # from the evaluating SDK call itself
+        self.reasons: dict[str, str] = {}
+        self._targets: dict[str, BaseFeatureFlagsClient] = {}
+        self._targets_lock = threading.Lock()
         self._add_validators()
 
     @t.final
     def _add_validators(self) -> None:
-        object.__setattr__(
-            self, "bool_variation", validate(types=(bool,))(self.bool_variation)
-        )
-        object.__setattr__(
-            self, "string_variation", validate(types=(str,))(self.string_variation)
-        )
-        object.__setattr__(
-            self,
-            "number_variation",
-            validate(types=(float, int))(self.number_variation),
-        )
-        object.__setattr__(
-            self,
-            "json_variation",
-            validate(types=(dict, list), default_types=(dict, list, type(None)))(
-                self.json_variation
-            ),
-        )
+        recorder = telemetry.get_recorder()
+        trusted = _is_trusted()
+        for name, validator in VALIDATORS.items():
+            method = getattr(self, name)
+            if recorder is not None:
+                method = recorder.time_provider(method)
+            if not trusted:
+                method = validator.wrap(method)
+            object.__setattr__(self, name, memoize(self.cache)(method))
+        if recorder is not None:
+            recorder.instrument(self)
 
     @abc.abstractmethod
     def bool_variation(self, flag: str, default: bool = False) -> bool:
@@ -77,39 +146,508 @@ class BaseFeatureFlagsClient(abc.ABC):
             "JSON feature flags are not implemented for this driver"
         )
 
+    @t.final
+    def bulk_evaluate(
+        self,
+        flags: t.Iterable[str],
+        variation: Variation = "bool_variation",
+        default: t.Any = _MISSING,
+    ) -> dict[str, t.Any]:
+        """Evaluate many flags of one variation type, warming the cache in one call.
+
+        Flags that are not cached yet are fetched through _bulk_variation, which
+        providers override with their SDK's native batch API.
+        """
+        evaluate = getattr(self, variation)
+        if default is _MISSING:
+            default = evaluate.__defaults__[0] if evaluate.__defaults__ else None
+        flags = list(dict.fromkeys(flags))
+        missing = [flag for flag in flags if not evaluate.is_cached(flag, default)]
+        primed: dict[str, t.Any] = {}
+        if missing:
+            evaluated = self._bulk_variation(variation, missing, default)
+            for flag in missing:
+                if flag in evaluated:
+                    self.cache.counter()[1] += 1
+                    primed[flag] = evaluate.prime(flag, default, evaluated[flag])
+        return {
+            flag: primed[flag] if flag in primed else evaluate(flag, default)
+            for flag in flags
+        }
+
+    def _bulk_variation(
+        self, variation: Variation, flags: list[str], default: t.Any
+    ) -> dict[str, t.Any]:
+        """Return raw evaluations for flags. Defaults to one SDK call per flag."""
+        evaluate = getattr(type(self), variation)
+        return {flag: evaluate(self, flag, default) for flag in flags}
+
+    @t.final
+    def for_target(self, target: str) -> BaseFeatureFlagsClient:
+        """Return a client evaluating for another DBT_TARGET with this client's SDK.
+
+        The returned client has its own evaluation cache and is reused for the
+        same target. It shares the SDK connection, so only this client needs to
+        be shut down.
+        """
+        client = self._targets.get(target)
+        if client is None:
+            with self._targets_lock:
+                client = self._targets.get(target)
+                if client is None:
+                    client = copy.copy(self)
+                    for name in (*VALIDATORS, "_bulk_variation"):
+                        client.__dict__.pop(name, None)
+                    client._set_target(target)
+                    BaseFeatureFlagsClient.__init__(client)
+                    object.__setattr__(client, "shutdown", _shared_shutdown)
+                    self._targets[target] = client
+        return client
+
+    @t.final
+    def bulk_evaluate_targets(
+        self,
+        targets: t.Iterable[str],
+        flags: t.Iterable[str],
+        variation: Variation = "bool_variation",
+        default: t.Any = _MISSING,
+    ) -> dict[str, dict[str, t.Any]]:
+        """Bulk evaluate the same flags for many targets, e.g. one per tenant."""
+        flags = list(flags)
+        return {
+            target: self.for_target(target).bulk_evaluate(flags, variation, default)
+            for target in targets
+        }
+
+    def _set_target(self, target: str) -> None:
+        """Point a copy of this client at another target, see for_target()."""
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support evaluating multiple targets"
+        )
+
+    def state_version(self) -> str | None:
+        """Return a fingerprint of the state of every flag for this client's target.
+
+        Equal fingerprints guarantee that no flag evaluates differently, which
+        lets preflight skip evaluating flags. Providers return None when they
+        cannot tell, e.g. before their SDK is ready.
+        """
+        return None
+
+    def refresh(self) -> bool:
+        """Reload flag state from the provider, for long-lived clients.
+
+        Returns whether anything was reloaded. Providers whose SDK keeps itself
+        synchronized need nothing here; those that fetch flags once override it.
+        """
+        return False
+
     def shutdown(self) -> None:
         """Release provider resources after one-shot callers finish."""
 
 
+class Validator:
+    """Type checks for one variation, built once and shared by every client.
+
+    Only cache misses reach the validator, since memoize() sits in front of it.
+    Error messages are formatted on failure only.
+    """
+
+    __slots__ = ("types", "default_types")
+
+    def __init__(
+        self,
+        types: tuple[type[t.Any], ...],
+        default_types: tuple[type[t.Any], ...] | None = None,
+    ) -> None:
+        self.types = types
+        self.default_types = default_types or types
+
+    def _error(self, func_name: str, flag: str, err: object) -> ValueError:
+        return ValueError(
+            f"Invalid feature flag evaluation {func_name}({flag}...). Ensure the correct feature_flag_* function was used. Err: {err}"
+        )
+
+    def _invalid_value(self, func_name: str, flag: str, value: t.Any) -> ValueError:
+        return self._error(
+            func_name,
+            flag,
+            f"Invalid return value for {func_name}({flag}...) feature flag call. Found type {type(value).__name__}.",
+        )
+
+    def _invalid_default(self, func_name: str, flag: str, default: t.Any) -> ValueError:
+        return ValueError(
+            f"Invalid default value: {default} for {func_name}({flag}...) feature flag call. Found type {type(default).__name__}."
+        )
+
+    def _checker(self, func_name: str) -> t.Callable[[str, t.Any], t.Any]:
+        types = self.types
+
+        def _check(flag: str, value: t.Any) -> t.Any:
+            """Validate a value evaluated outside of this wrapper (bulk evaluation)."""
+            if isinstance(value, types):
+                return value
+            raise self._invalid_value(func_name, flag, value)
+
+        return _check
+
+    def wrap(self, func: t.Any) -> t.Any:
+        """Wrap a provider method to check its default and return value."""
+        default_value = func.__defaults__[0] if func.__defaults__ else None
+        func_name = func.__name__
+        types, default_types = self.types, self.default_types
+
+        @wraps(func)
+        def _injected_validator(flag: str, default: t.Any = default_value) -> t.Any:
+            if not isinstance(default, default_types):
+                raise self._invalid_default(func_name, flag, default)
+            try:
+                value = func(flag, default)
+            except ValueError as exc:
+                raise self._error(func_name, flag, exc) from exc
+            if isinstance(value, types):
+                return value
+            raise self._invalid_value(func_name, flag, value)
+
+        setattr(_injected_validator, "check", self._checker(func_name))
+        return _injected_validator
+
+    def wrap_async(self, func: t.Any) -> t.Any:
+        """wrap() for the coroutine methods of an AsyncBaseFeatureFlagsClient."""
+        default_value = func.__defaults__[0] if func.__defaults__ else None
+        func_name = func.__name__
+        types, default_types = self.types, self.default_types
+
+        @wraps(func)
+        async def _injected_validator(
+            flag: str, default: t.Any = default_value
+        ) -> t.Any:
+            if not isinstance(default, default_types):
+                raise self._invalid_default(func_name, flag, default)
+            try:
+                value = await func(flag, default)
+            except ValueError as exc:
+                raise self._error(func_name, flag, exc) from exc
+            if isinstance(value, types):
+                return value
+            raise self._invalid_value(func_name, flag, value)
+
+        setattr(_injected_validator, "check", self._checker(func_name))
+        return _injected_validator
+
+
+VALIDATORS: dict[Variation, Validator] = {
+    "bool_variation": Validator((bool,)),
+    "string_variation": Validator((str,)),
+    "number_variation": Validator((float, int)),
+    "json_variation": Validator((dict, list), (dict, list, type(None))),
+}
+
+
+class AsyncBaseFeatureFlagsClient(abc.ABC):
+    """Asyncio sibling of BaseFeatureFlagsClient for orchestrators.
+
+    Resolves flags for many projects or targets concurrently before dbt is
+    launched, without threads. Clients are built with ``await Client.create()``
+    and share the evaluation cache, validation and trusted mode of the
+    synchronous clients.
+    """
+
+    logger = BaseFeatureFlagsClient.logger
+
+    def __init__(self) -> None:
+        self.cache = EvaluationCache()
+        self.reasons: dict[str, str] = {}
+        self._targets: dict[str, AsyncBaseFeatureFlagsClient] = {}
+        trusted = _is_trusted()
+        for name, validator in VALIDATORS.items():
+            method = getattr(self, name)
+            if not trusted:
+                method = validator.wrap_async(method)
+            object.__setattr__(self, name, amemoize(self.cache)(method))
+
+    @classmethod
+    async def create(cls) -> AsyncBaseFeatureFlagsClient:
+        """Initialize the provider SDK and return a ready client."""
+        return cls()
+
+    @abc.abstractmethod
+    async def bool_variation(self, flag: str, default: bool = False) -> bool:
+        raise NotImplementedError(
+            "Boolean feature flags are not implemented for this driver"
+        )
+
+    @abc.abstractmethod
+    async def string_variation(self, flag: str, default: str = "") -> str:
+        raise NotImplementedError(
+            "String feature flags are not implemented for this driver"
+        )
+
+    @abc.abstractmethod
+    async def number_variation(
+        self, flag: str, default: float | int = 0
+    ) -> float | int:
+        raise NotImplementedError(
+            "Number feature flags are not implemented for this driver"
+        )
+
+    @abc.abstractmethod
+    async def json_variation(
+        self, flag: str, default: JSONValue | None = None
+    ) -> JSONValue:
+        raise NotImplementedError(
+            "JSON feature flags are not implemented for this driver"
+        )
+
+    @t.final
+    async def bulk_evaluate(
+        self,
+        flags: t.Iterable[str],
+        variation: Variation = "bool_variation",
+        default: t.Any = _MISSING,
+    ) -> dict[str, t.Any]:
+        """See BaseFeatureFlagsClient.bulk_evaluate."""
+        evaluate = getattr(self, variation)
+        if default is _MISSING:
+            default = evaluate.__defaults__[0] if evaluate.__defaults__ else None
+        flags = list(dict.fromkeys(flags))
+        missing = [flag for flag in flags if not evaluate.is_cached(flag, default)]
+        primed: dict[str, t.Any] = {}
+        if missing:
+            evaluated = await self._bulk_variation(variation, missing, default)
+            for flag in missing:
+                if flag in evaluated:
+                    self.cache.counter()[1] += 1
+                    primed[flag] = evaluate.prime(flag, default, evaluated[flag])
+        return {
+            flag: primed[flag] if flag in primed else await evaluate(flag, default)
+            for flag in flags
+        }
+
+    async def _bulk_variation(
+        self, variation: Variation, flags: list[str], default: t.Any
+    ) -> dict[str, t.Any]:
+        """Return raw evaluations for flags. Defaults to concurrent single calls."""
+        evaluate = getattr(type(self), variation)
+        values = await asyncio.gather(
+            *(evaluate(self, flag, default) for flag in flags)
+        )
+        return dict(zip(flags, values))
+
+    @t.final
+    def for_target(self, target: str) -> AsyncBaseFeatureFlagsClient:
+        """See BaseFeatureFlagsClient.for_target."""
+        client = self._targets.get(target)
+        if client is None:
+            client = copy.copy(self)
+            for name in (*VALIDATORS, "_bulk_variation"):
+                client.__dict__.pop(name, None)
+            client._set_target(target)
+            AsyncBaseFeatureFlagsClient.__init__(client)
+            object.__setattr__(client, "shutdown", _shared_ashutdown)
+            self._targets[target] = client
+        return client
+
+    @t.final
+    async def bulk_evaluate_targets(
+        self,
+        targets: t.Iterable[str],
+        flags: t.Iterable[str],
+        variation: Variation = "bool_variation",
+        default: t.Any = _MISSING,
+    ) -> dict[str, dict[str, t.Any]]:
+        """Bulk evaluate the same flags for many targets concurrently."""
+        flags, targets = list(flags), list(targets)
+        results = await asyncio.gather(
+            *(
+                self.for_target(target).bulk_evaluate(flags, variation, default)
+                for target in targets
+            )
+        )
+        return dict(zip(targets, results))
+
+    def _set_target(self, target: str) -> None:
+        """Point a copy of this client at another target, see for_target()."""
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support evaluating multiple targets"
+        )
+
+    async def shutdown(self) -> None:
+        """Release provider resources."""
+
+
+class ThreadedSDKClient(AsyncBaseFeatureFlagsClient):
+    """Async client over a synchronous provider whose SDK evaluates in memory.
+
+    Only the SDK handshake (the provider's __init__) and shutdown run in a worker
+    thread; evaluations read the SDK's local flag store and are served inline.
+    """
+
+    provider: t.ClassVar[type[BaseFeatureFlagsClient]]
+
+    def __init__(self, client: BaseFeatureFlagsClient) -> None:
+        self.client = client
+        super().__init__()
+
+    @classmethod
+    async def create(cls) -> ThreadedSDKClient:
+        return cls(await asyncio.to_thread(cls.provider))
+
+    def _evaluate(self, variation: Variation, flag: str, default: t.Any) -> t.Any:
+        value = getattr(self.provider, variation)(self.client, flag, default)
+        reason = self.client.reasons.get(flag)
+        if reason is not None:
+            self.reasons[flag] = reason
+        return value
+
+    async def bool_variation(self, flag: str, default: bool = False) -> bool:
+        return self._evaluate("bool_variation", flag, default)
+
+    async def string_variation(self, flag: str, default: str = "") -> str:
+        return self._evaluate("string_variation", flag, default)
+
+    async def number_variation(
+        self, flag: str, default: float | int = 0
+    ) -> float | int:
+        return self._evaluate("number_variation", flag, default)
+
+    async def json_variation(
+        self, flag: str, default: JSONValue | None = None
+    ) -> JSONValue:
+        return self._evaluate("json_variation", flag, default)
+
+    async def _bulk_variation(
+        self, variation: Variation, flags: list[str], default: t.Any
+    ) -> dict[str, t.Any]:
+        values = self.provider._bulk_variation(self.client, variation, flags, default)
+        reasons = self.client.reasons
+        self.reasons.update((flag, reasons[flag]) for flag in flags if flag in reasons)
+        return values
+
+    def _set_target(self, target: str) -> None:
+        self.client = self.client.for_target(target)
+
+    async def shutdown(self) -> None:
+        await asyncio.to_thread(self.client.shutdown)
+
+
+def _is_trusted() -> bool:
+    """DBT_FF_TRUSTED disables validation of provider values and defaults."""
+    return os.getenv("DBT_FF_TRUSTED", "").lower() in ("1", "true", "yes")
+
+
+def _shared_shutdown() -> None:
+    """Targets from for_target() leave the shared SDK to the client that owns it."""
+
+
+async def _shared_ashutdown() -> None:
+    """Async counterpart of _shared_shutdown."""
+
+
 def validate(
     types: tuple[type[t.Any], ...],
     default_types: tuple[type[t.Any], ...] | None = None,
 ) -> t.Callable[[t.Any], t.Any]:
-    valid_default_types = default_types or types
+    return Validator(types, default_types).wrap
+
+
+def state_digest(*parts: t.Any) -> str:
+    """Hash JSON serializable parts into a state_version() fingerprint."""
+    encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()[:32]
+
+
+def _freeze(value: t.Any) -> t.Hashable:
+    """Return a hashable stand-in for a default value (JSON defaults are not)."""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True, default=str)
+    return value
+
+
+def _copy_json(value: t.Any) -> t.Any:
+    """Copy JSON objects and arrays, so callers never share the cached value."""
+    if isinstance(value, (dict, list)):
+        return copy.deepcopy(value)
+    return value
 
-    def _validate(v: t.Any, flag_name: str, func_name: str) -> t.Any:
-        if not isinstance(v, tuple(types)):
-            raise ValueError(
-                f"Invalid return value for {func_name}({flag_name}...) feature flag call. Found type {type(v).__name__}."
-            )
-        return v
 
+def _add_cache_helpers(
+    wrapper: t.Any, func: t.Any, values: dict[t.Hashable, t.Any]
+) -> None:
+    """Attach is_cached() and prime(), used by bulk evaluation, to a memoized method."""
+    name = func.__name__
+
+    def _is_cached(flag: str, default: t.Any) -> bool:
+        try:
+            return (name, flag, type(default), _freeze(default)) in values
+        except TypeError:
+            # Unhashable default: kept out of the batch, so the memoized call
+            # reaches the validator, which rejects it
+            return True
+
+    def _prime(flag: str, default: t.Any, value: t.Any) -> t.Any:
+        check = getattr(func, "check", None)
+        value = check(flag, value) if check else value
+        key = (name, flag, type(default), _freeze(default))
+        return _copy_json(values.setdefault(key, _copy_json(value)))
+
+    setattr(wrapper, "is_cached", _is_cached)
+    setattr(wrapper, "prime", _prime)
+
+
+def memoize(cache: EvaluationCache) -> t.Callable[[t.Any], t.Any]:
     def _main(func: t.Any) -> t.Any:
         default_value = func.__defaults__[0] if func.__defaults__ else None
+        values = cache._values
+        name = func.__name__
 
         @wraps(func)
-        def _injected_validator(flag: str, default: t.Any = default_value) -> t.Any:
-            if not isinstance(default, valid_default_types):
-                raise ValueError(
-                    f"Invalid default value: {default} for {func.__name__}({flag}...) feature flag call. Found type {type(default).__name__}."
-                )
+        def _cached_evaluation(flag: str, default: t.Any = default_value) -> t.Any:
+            key = (name, flag, type(default), _freeze(default))
             try:
-                return _validate(func(flag, default), flag, func.__name__)
-            except ValueError as exc:
-                raise ValueError(
-                    f"Invalid feature flag evaluation {func.__name__}({flag}...). Ensure the correct feature_flag_* function was used. Err: {exc}"
-                ) from exc
+                value = values[key]
+            except KeyError:
+                cache.counter()[1] += 1
+                value = values.setdefault(key, _copy_json(func(flag, default)))
+            except TypeError:
+                # Unhashable default, never valid: let the validator reject it
+                return func(flag, default)
+            else:
+                cache.counter()[0] += 1
+            return _copy_json(value)
 
-        return _injected_validator
+        _add_cache_helpers(_cached_evaluation, func, values)
+        return _cached_evaluation
+
+    return _main
+
+
+def amemoize(cache: EvaluationCache) -> t.Callable[[t.Any], t.Any]:
+    """memoize() for coroutine methods."""
+
+    def _main(func: t.Any) -> t.Any:
+        default_value = func.__defaults__[0] if func.__defaults__ else None
+        values = cache._values
+        name = func.__name__
+
+        @wraps(func)
+        async def _cached_evaluation(
+            flag: str, default: t.Any = default_value
+        ) -> t.Any:
+            key = (name, flag, type(default), _freeze(default))
+            try:
+                value = values[key]
+            except KeyError:
+                cache.counter()[1] += 1
+                value = values.setdefault(key, _copy_json(await func(flag, default)))
+            except TypeError:
+                # Unhashable default, never valid: let the validator reject it
+                return await func(flag, default)
+            else:
+                cache.counter()[0] += 1
+            return _copy_json(value)
+
+        _add_cache_helpers(_cached_evaluation, func, values)
+        return _cached_evaluation
 
     return _main
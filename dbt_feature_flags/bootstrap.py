@@ -0,0 +1,89 @@
+# Copyright 2022 Alex Butler
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Deferred bootstrap executed by zzz_dbt_feature_flags.pth.
+
+The .pth file runs in every interpreter of the environment (pip, pytest,
+orchestrator workers...), so this module must stay as cheap as possible to
+import. It only installs a meta path finder; dbt and the provider modules are
+imported, and dbt's jinja environment patched, once dbt itself imports
+dbt.clients.jinja.
+"""
+
+from __future__ import annotations
+
+import sys
+
+_TARGET_MODULE = "dbt.clients.jinja"
+
+
+def _apply_patch() -> None:
+    from dbt_feature_flags import patch
+
+    patch.patch_dbt_environment()
+
+
+class _PatchingLoader:
+    """Delegate to the real loader and patch dbt once the module has executed."""
+
+    def __init__(self, loader: object) -> None:
+        self._loader = loader
+
+    def __getattr__(self, name: str) -> object:
+        return getattr(self._loader, name)
+
+    def create_module(self, spec: object) -> object:
+        return self._loader.create_module(spec)  # type: ignore[attr-defined]
+
+    def exec_module(self, module: object) -> None:
+        self._loader.exec_module(module)  # type: ignore[attr-defined]
+        uninstall()
+        _apply_patch()
+
+
+class DbtJinjaFinder:
+    """Meta path finder that intercepts the import of dbt.clients.jinja."""
+
+    def find_spec(
+        self, fullname: str, path: object = None, target: object = None
+    ) -> object:
+        if fullname != _TARGET_MODULE:
+            return None
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _PatchingLoader(spec.loader)
+        return spec
+
+
+def install() -> None:
+    """Patch dbt now if it is already loaded, otherwise when it gets imported."""
+    if _TARGET_MODULE in sys.modules:
+        _apply_patch()
+        return
+    if not any(isinstance(finder, DbtJinjaFinder) for finder in sys.meta_path):
+        sys.meta_path.insert(0, DbtJinjaFinder())
+
+
+def uninstall() -> None:
+    """Remove the import hook installed by install()."""
+    sys.meta_path[:] = [
+        finder for finder in sys.meta_path if not isinstance(finder, DbtJinjaFinder)
+    ]
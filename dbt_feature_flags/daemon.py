@@ -0,0 +1,368 @@
+# Copyright 2022 Alex Butler
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Shared flag resolution daemon for concurrent dbt invocations on one host.
+
+`dbt-ff-daemon` holds one warm provider SDK connection and serves evaluations
+over a Unix domain socket. dbt processes started with DBT_FF_PROVIDER=daemon
+evaluate through it instead of each performing their own SDK handshake, and
+fall back to building the provider in process when no daemon is listening, or
+when it stops answering mid-run and cannot be reconnected to.
+
+The protocol is one JSON object per line in each direction:
+
+    {"op": "ping", "provider": "fme"}
+    {"op": "evaluate", "provider": "fme", "target": "prod",
+     "variation": "bool_variation", "flags": ["a", "b"], "default": false}
+
+Evaluations are answered with the values and the upstream client's reasons
+(see BaseFeatureFlagsClient.reasons), so an unavailable upstream is not
+mistaken for a flag change:
+
+    {"values": {"a": true, "b": false}, "reasons": {"a": "rule_match", "b": "default"}}
+
+Values are cached per target in the daemon for DBT_FF_DAEMON_TTL seconds, on
+top of the provider SDK's own synchronization. When they expire, providers that
+fetch flags once (Harness) are re-synchronized. LaunchDarkly's poll and file
+modes load flags only once and are rejected.
+
+Required env var: DBT_FF_DAEMON_PROVIDER   (harness, fme, launchdarkly or file)
+Optional env var: DBT_FF_DAEMON_SOCKET     (default: $TMPDIR/dbt-ff-<uid>.sock)
+Optional env var: DBT_FF_DAEMON_TTL        (seconds, default: 30)
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import typing as t
+
+from dbt_feature_flags.base import (
+    VALIDATORS,
+    BaseFeatureFlagsClient,
+    JSONValue,
+    Variation,
+)
+
+DEFAULT_TTL = 30.0
+
+
+def default_socket_path() -> str:
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    return os.path.join(tempfile.gettempdir(), f"dbt-ff-{uid}.sock")
+
+
+class DaemonFeatureFlagsClient(BaseFeatureFlagsClient):
+    """Evaluates flags through a running dbt-ff-daemon.
+
+    :raises OSError: If no daemon is listening on the socket, or it serves a
+                     different provider.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        path: str | None = None,
+        timeout: float = 5.0,
+        fallback: t.Callable[[], BaseFeatureFlagsClient] | None = None,
+    ) -> None:
+        self.provider = provider
+        self.path = path or os.getenv("DBT_FF_DAEMON_SOCKET") or default_socket_path()
+        self.timeout = timeout
+        self.target = os.getenv("DBT_TARGET", "default")
+        self._local = threading.local()
+        # Builds the provider in process if the daemon goes away, shared with
+        # the for_target() copies of this client
+        self._fallback = fallback
+        self._in_process: dict[str, BaseFeatureFlagsClient] = {}
+        self._in_process_lock = threading.Lock()
+        served = self._request({"op": "ping", "provider": provider})["provider"]
+        if served != provider:
+            self.shutdown()
+            raise ConnectionRefusedError(
+                f"dbt-ff daemon at {self.path} serves {served}, not {provider}"
+            )
+        super().__init__()
+
+    def _connection(self) -> t.BinaryIO:
+        """Return the calling thread's connection, dbt renders from many threads."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+            conn = self._local.conn = sock.makefile("rwb")
+        return conn
+
+    def _request(self, payload: dict[str, t.Any]) -> dict[str, t.Any]:
+        conn = self._connection()
+        # Defaults may hold non-JSON leaves, e.g. a date from a YAML var
+        conn.write(json.dumps(payload, default=str).encode() + b"\n")
+        conn.flush()
+        line = conn.readline()
+        if not line:
+            raise ConnectionError(f"dbt-ff daemon at {self.path} closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            # Invalid evaluations surface as they would in process
+            if response.get("type") == "ValueError":
+                raise ValueError(response["error"])
+            raise RuntimeError(f"dbt-ff daemon: {response['error']}")
+        return response
+
+    def _close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.conn = None
+            try:
+                conn.close()
+            except OSError:
+                pass  # flushing to a daemon that went away
+
+    def _evaluate(
+        self, variation: Variation, flags: list[str], default: t.Any
+    ) -> dict[str, t.Any]:
+        if self._in_process:
+            return self._evaluate_in_process(variation, flags, default)
+        payload = {
+            "op": "evaluate",
+            "provider": self.provider,
+            "target": self.target,
+            "variation": variation,
+            "flags": flags,
+            "default": default,
+        }
+        try:
+            return self._values(self._request(payload))
+        except OSError:
+            # The daemon restarted or dropped the connection, reconnect once
+            self._close()
+        try:
+            return self._values(self._request(payload))
+        except OSError as exc:
+            self._close()
+            if self._fallback is None:
+                raise
+            self.logger.warning(
+                "dbt-ff daemon unavailable (%s), evaluating flags in process", exc
+            )
+            return self._evaluate_in_process(variation, flags, default)
+
+    def _values(self, response: dict[str, t.Any]) -> dict[str, t.Any]:
+        self.reasons.update(response.get("reasons", {}))
+        return response["values"]
+
+    def _evaluate_in_process(
+        self, variation: Variation, flags: list[str], default: t.Any
+    ) -> dict[str, t.Any]:
+        client = self._in_process.get(self.target)
+        if client is None:
+            with self._in_process_lock:
+                if not self._in_process:
+                    self._in_process[""] = t.cast(
+                        t.Callable[[], BaseFeatureFlagsClient], self._fallback
+                    )()
+                client = self._in_process[""]
+                if self.target != os.getenv("DBT_TARGET", "default"):
+                    client = client.for_target(self.target)
+                self._in_process[self.target] = client
+        values = client.bulk_evaluate(flags, variation, default)
+        self.reasons.update(
+            (flag, client.reasons[flag]) for flag in flags if flag in client.reasons
+        )
+        return values
+
+    def _set_target(self, target: str) -> None:
+        self.target = target
+
+    def bool_variation(self, flag: str, default: bool = False) -> bool:
+        return self._evaluate("bool_variation", [flag], default)[flag]
+
+    def string_variation(self, flag: str, default: str = "") -> str:
+        return self._evaluate("string_variation", [flag], default)[flag]
+
+    def number_variation(self, flag: str, default: float | int = 0) -> float | int:
+        return self._evaluate("number_variation", [flag], default)[flag]
+
+    def json_variation(self, flag: str, default: JSONValue | None = None) -> JSONValue:
+        return self._evaluate("json_variation", [flag], default)[flag]
+
+    def _bulk_variation(
+        self, variation: Variation, flags: list[str], default: t.Any
+    ) -> dict[str, t.Any]:
+        """Evaluate all flags with a single round trip to the daemon."""
+        return self._evaluate(variation, flags, default)
+
+    def shutdown(self) -> None:
+        self._close()
+        in_process = self._in_process.get("")
+        if in_process is not None:
+            in_process.shutdown()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: FlagDaemon
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                response = self.server.dispatch(json.loads(line))
+            except Exception as exc:
+                response = {"error": str(exc), "type": type(exc).__name__}
+            self.wfile.write(json.dumps(response, default=str).encode() + b"\n")
+            self.wfile.flush()
+
+
+class FlagDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serves evaluations from one provider client to many dbt processes."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        path: str,
+        provider: str,
+        client: BaseFeatureFlagsClient,
+        ttl: float = DEFAULT_TTL,
+    ) -> None:
+        self.provider = provider
+        self.client = client
+        self.ttl = ttl
+        self._expires = time.monotonic() + ttl
+        self._refresh_lock = threading.Lock()
+        super().__init__(path, _Handler)
+
+    def _expire(self) -> None:
+        """Re-synchronize the provider and forget cached values after the TTL."""
+        now = time.monotonic()
+        if now < self._expires or not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            self._expires = now + self.ttl
+            try:
+                self.client.refresh()
+            except Exception:
+                self.client.logger.exception(
+                    "Failed to refresh %s flags, serving the current ones",
+                    self.provider,
+                )
+            self.client.cache.clear()
+            for target in list(self.client._targets.values()):
+                target.cache.clear()
+        finally:
+            self._refresh_lock.release()
+
+    def dispatch(self, request: dict[str, t.Any]) -> dict[str, t.Any]:
+        op = request.get("op")
+        if op == "ping":
+            return {"provider": self.provider}
+        if op != "evaluate":
+            raise ValueError(f"Unknown operation {op!r}")
+        if request["provider"] != self.provider:
+            raise ValueError(
+                f"Daemon serves {self.provider}, not {request['provider']}"
+            )
+        variation = request["variation"]
+        if variation not in VALIDATORS:
+            raise ValueError(f"Unknown variation {variation!r}")
+        self._expire()
+        client = self.client.for_target(request["target"])
+        values = client.bulk_evaluate(request["flags"], variation, request["default"])
+        reasons = {
+            flag: client.reasons[flag] for flag in values if flag in client.reasons
+        }
+        return {"values": values, "reasons": reasons}
+
+
+def serve(path: str | None = None, provider: str | None = None) -> None:
+    """Build the provider client and serve it until interrupted."""
+    from dbt_feature_flags import launchdarkly
+    from dbt_feature_flags.patch import (
+        SupportedProviders,
+        _build_provider_client,
+        _get_upstream_provider,
+    )
+
+    path = path or os.getenv("DBT_FF_DAEMON_SOCKET") or default_socket_path()
+    upstream = _get_upstream_provider("DBT_FF_DAEMON_PROVIDER", provider)
+    if upstream == SupportedProviders.LaunchDarkly:
+        mode = launchdarkly.get_mode()
+        if mode != "stream":
+            raise RuntimeError(
+                f"DBT_FF_LAUNCHDARKLY_MODE={mode} loads flags only once, "
+                "the dbt-ff daemon requires stream mode"
+            )
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.unlink(path)  # left behind by a daemon that did not exit cleanly
+        else:
+            raise RuntimeError(f"A dbt-ff daemon is already listening on {path}")
+        finally:
+            probe.close()
+
+    client = _build_provider_client(upstream)
+    ttl = float(os.getenv("DBT_FF_DAEMON_TTL", DEFAULT_TTL))
+    # Bind with owner-only permissions, the socket exists as soon as it is bound
+    umask = os.umask(0o177)
+    try:
+        server = FlagDaemon(path, upstream.value, client, ttl)
+    finally:
+        os.umask(umask)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"[dbt-ff] Serving {upstream.value} flags on {path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(path)
+        client.shutdown()
+
+
+def cli() -> None:
+    """Entry point for the dbt-ff-daemon CLI command."""
+    parser = argparse.ArgumentParser(
+        description="Serve feature flag evaluations to dbt processes on this host."
+    )
+    parser.add_argument(
+        "--provider",
+        help="Provider to serve (default: DBT_FF_DAEMON_PROVIDER).",
+    )
+    parser.add_argument(
+        "--socket",
+        metavar="PATH",
+        help=f"Unix socket path (default: {default_socket_path()}).",
+    )
+    args = parser.parse_args()
+    serve(path=args.socket, provider=args.provider)
+
+
+if __name__ == "__main__":
+    cli()
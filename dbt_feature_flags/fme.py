@@ -18,8 +18,10 @@ An additional provider alongside the existing Harness Feature Flags (HFF)
 provider. Both providers coexist — use DBT_FF_PROVIDER=harness for HFF
 and DBT_FF_PROVIDER=fme for FME.
 
-Required env var: DBT_FF_API_KEY  (FME server-side SDK key)
-Optional env var: DBT_TARGET      (used as the targeting key, e.g. "dev", "prod")
+Required env var: DBT_FF_API_KEY                 (FME server-side SDK key)
+Optional env var: DBT_TARGET                     (used as the targeting key, e.g. "dev", "prod")
+Optional env var: DBT_FF_FME_IMPRESSIONS         (optimized, debug or none; default: optimized)
+Optional env var: DBT_FF_FME_SHUTDOWN_TIMEOUT    (seconds to wait for impressions at exit; default: 5)
 """
 
 from __future__ import annotations
@@ -29,13 +31,38 @@ from importlib import import_module
 import json
 import os
 import threading
+import time
 import typing as t
 
-from dbt_feature_flags.base import JSONValue, BaseFeatureFlagsClient
+from dbt_feature_flags.base import (
+    DEFAULT_REASON,
+    UNAVAILABLE_REASON,
+    AsyncBaseFeatureFlagsClient,
+    BaseFeatureFlagsClient,
+    JSONValue,
+    Variation,
+)
 
 # Module-level singleton — ensures get_factory is called only once per SDK key,
-# avoiding the splitio "multiple factory instances" warning.
+# avoiding the splitio "multiple factory instances" warning. The lock makes
+# this hold when clients are constructed from several threads at once.
 _factory_cache: dict[str, t.Any] = {}
+_factory_lock = threading.Lock()
+
+# A dbt run evaluates each flag once per client (see EvaluationCache) and
+# repeats the same evaluations run after run, so per-evaluation DEBUG
+# impressions add queue memory and exit latency without information.
+IMPRESSIONS_MODES = ("optimized", "debug", "none")
+DEFAULT_SHUTDOWN_TIMEOUT = 5.0
+
+
+def _impressions_mode() -> str:
+    mode = os.getenv("DBT_FF_FME_IMPRESSIONS", "optimized").lower()
+    if mode not in IMPRESSIONS_MODES:
+        raise RuntimeError(
+            f"Unsupported FME impressions mode: DBT_FF_FME_IMPRESSIONS={mode}"
+        )
+    return mode.upper()
 
 
 def _shutdown_factories() -> None:
@@ -44,11 +71,22 @@ def _shutdown_factories() -> None:
     Passes a threading.Event to destroy() and waits for it — this ensures the
     SDK flushes all queued impressions to Harness before the process exits.
     Without this, destroy() fires asynchronously and impressions are dropped.
+    All factories are destroyed first and then awaited against one deadline,
+    so exit time does not grow with the number of factories.
     """
+    timeout = float(os.getenv("DBT_FF_FME_SHUTDOWN_TIMEOUT", DEFAULT_SHUTDOWN_TIMEOUT))
+    pending = []
     for factory in _factory_cache.values():
         done = threading.Event()
         factory.destroy(destroyed_event=done)
-        done.wait(timeout=5)
+        pending.append(done)
+    deadline = time.monotonic() + timeout
+    for done in pending:
+        if not done.wait(timeout=max(deadline - time.monotonic(), 0)):
+            BaseFeatureFlagsClient.logger.warning(
+                "FME impressions not flushed within %ss", timeout
+            )
+            return
 
 
 atexit.register(_shutdown_factories)
@@ -65,40 +103,173 @@ class HarnessFMEClient(BaseFeatureFlagsClient):
 
         self._key = "dbt-" + os.getenv("DBT_TARGET", "default")
 
-        if sdk_key not in _factory_cache:
-            factory = get_factory(sdk_key, config={"impressionsMode": "DEBUG"})
-            factory.block_until_ready(5)
-            _factory_cache[sdk_key] = factory
+        with _factory_lock:
+            if sdk_key not in _factory_cache:
+                factory = get_factory(
+                    sdk_key, config={"impressionsMode": _impressions_mode()}
+                )
+                factory.block_until_ready(5)
+                _factory_cache[sdk_key] = factory
 
-        self._client = _factory_cache[sdk_key].client()
+        self._factory = _factory_cache[sdk_key]
+        self._client = self._factory.client()
         super().__init__()
 
-    def _get_treatment(self, flag: str, default: t.Any) -> t.Any:
-        """Evaluate a flag, mapping Split's 'control' sentinel to the provided default."""
+    def _set_target(self, target: str) -> None:
+        self._key = "dbt-" + target
+
+    def state_version(self) -> str | None:
+        # Split exposes flag change numbers (manager().splits()) but not segment
+        # change numbers, so a version could miss segment membership changes.
+        return None
+
+    def _treatment(self, flag: str) -> t.Any:
         treatment = self._client.get_treatment(self._key, flag)
-        return default if treatment == "control" else treatment
+        self.reasons[flag] = _reason(treatment, self._factory)
+        return treatment
 
     def bool_variation(self, flag: str, default: bool = False) -> bool:
-        treatment = self._get_treatment(flag, str(default))
-        return str(treatment).lower() in ("on", "true")
+        return _to_bool(self._treatment(flag), default)
 
     def string_variation(self, flag: str, default: str = "") -> str:
-        return self._get_treatment(flag, default)
+        return _to_string(self._treatment(flag), default)
 
     def number_variation(self, flag: str, default: float | int = 0) -> float | int:
-        treatment = self._get_treatment(flag, None)
-        if treatment is None:
-            return default
-        try:
-            return float(treatment)
-        except (ValueError, TypeError):
-            return default
+        return _to_number(self._treatment(flag), default)
 
     def json_variation(self, flag: str, default: JSONValue | None = None) -> JSONValue:
         result = self._client.get_treatment_with_config(self._key, flag)
-        if result.treatment == "control" or result.config is None:
-            return {} if default is None else default
-        try:
-            return json.loads(result.config)
-        except (json.JSONDecodeError, TypeError):
-            return {} if default is None else default
+        self.reasons[flag] = _reason(result.treatment, self._factory)
+        return _to_json(result, default)
+
+    def _bulk_variation(
+        self, variation: Variation, flags: list[str], default: t.Any
+    ) -> dict[str, t.Any]:
+        """Evaluate all flags with a single get_treatments(_with_config) call."""
+        if variation == "json_variation":
+            results = self._client.get_treatments_with_config(self._key, flags)
+            for flag, result in results.items():
+                self.reasons[flag] = _reason(result.treatment, self._factory)
+            return {flag: _to_json(results[flag], default) for flag in results}
+        treatments = self._client.get_treatments(self._key, flags)
+        for flag, treatment in treatments.items():
+            self.reasons[flag] = _reason(treatment, self._factory)
+        convert = _CONVERTERS[variation]
+        return {flag: convert(treatments[flag], default) for flag in treatments}
+
+
+class AsyncHarnessFMEClient(AsyncBaseFeatureFlagsClient):
+    """Asyncio client on the Split SDK's native asyncio mode.
+
+    Requires the splitio-client[asyncio] extra. The client owns its factory;
+    use for_target() rather than several clients for many targets.
+    """
+
+    def __init__(self, factory: t.Any, key: str) -> None:
+        self._factory = factory
+        self._client = factory.client()
+        self._key = key
+        super().__init__()
+
+    @classmethod
+    async def create(cls) -> AsyncHarnessFMEClient:
+        get_factory_async = import_module("splitio").get_factory_async
+        sdk_key = os.environ.get("DBT_FF_API_KEY")
+        if sdk_key is None:
+            raise RuntimeError(
+                "dbt-feature-flags injected in environment, this patch requires the env var DBT_FF_API_KEY"
+            )
+        factory = await get_factory_async(
+            sdk_key, config={"impressionsMode": _impressions_mode()}
+        )
+        await factory.block_until_ready(5)
+        return cls(factory, "dbt-" + os.getenv("DBT_TARGET", "default"))
+
+    def _set_target(self, target: str) -> None:
+        self._key = "dbt-" + target
+
+    async def _treatment(self, flag: str) -> t.Any:
+        treatment = await self._client.get_treatment(self._key, flag)
+        self.reasons[flag] = _reason(treatment, self._factory)
+        return treatment
+
+    async def bool_variation(self, flag: str, default: bool = False) -> bool:
+        return _to_bool(await self._treatment(flag), default)
+
+    async def string_variation(self, flag: str, default: str = "") -> str:
+        return _to_string(await self._treatment(flag), default)
+
+    async def number_variation(
+        self, flag: str, default: float | int = 0
+    ) -> float | int:
+        return _to_number(await self._treatment(flag), default)
+
+    async def json_variation(
+        self, flag: str, default: JSONValue | None = None
+    ) -> JSONValue:
+        result = await self._client.get_treatment_with_config(self._key, flag)
+        self.reasons[flag] = _reason(result.treatment, self._factory)
+        return _to_json(result, default)
+
+    async def _bulk_variation(
+        self, variation: Variation, flags: list[str], default: t.Any
+    ) -> dict[str, t.Any]:
+        """Evaluate all flags with a single get_treatments(_with_config) call."""
+        if variation == "json_variation":
+            results = await self._client.get_treatments_with_config(self._key, flags)
+            for flag, result in results.items():
+                self.reasons[flag] = _reason(result.treatment, self._factory)
+            return {flag: _to_json(results[flag], default) for flag in results}
+        treatments = await self._client.get_treatments(self._key, flags)
+        for flag, treatment in treatments.items():
+            self.reasons[flag] = _reason(treatment, self._factory)
+        convert = _CONVERTERS[variation]
+        return {flag: convert(treatments[flag], default) for flag in treatments}
+
+    async def shutdown(self) -> None:
+        await self._factory.destroy()
+
+
+def _reason(treatment: t.Any, factory: t.Any) -> str:
+    """Split only reports 'control' when it did not evaluate; the factory's
+    readiness tells an unknown flag from an SDK that never synced."""
+    if treatment != "control":
+        return "treatment"
+    return DEFAULT_REASON if factory.ready else UNAVAILABLE_REASON
+
+
+# Treatment converters map Split's 'control' sentinel (flag unknown or SDK not
+# ready) to the provided default.
+def _to_bool(treatment: t.Any, default: bool) -> bool:
+    if treatment == "control":
+        treatment = str(default)
+    return str(treatment).lower() in ("on", "true")
+
+
+def _to_string(treatment: t.Any, default: str) -> str:
+    return default if treatment == "control" else treatment
+
+
+def _to_number(treatment: t.Any, default: float | int) -> float | int:
+    if treatment == "control" or treatment is None:
+        return default
+    try:
+        return float(treatment)
+    except (ValueError, TypeError):
+        return default
+
+
+def _to_json(result: t.Any, default: JSONValue | None) -> JSONValue:
+    if result.treatment == "control" or result.config is None:
+        return {} if default is None else default
+    try:
+        return json.loads(result.config)
+    except (json.JSONDecodeError, TypeError):
+        return {} if default is None else default
+
+
+_CONVERTERS: dict[str, t.Callable[[t.Any, t.Any], t.Any]] = {
+    "bool_variation": _to_bool,
+    "string_variation": _to_string,
+    "number_variation": _to_number,
+}
@@ -0,0 +1,212 @@
+# Copyright 2022 Alex Butler
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Flag dependency graph: which dbt nodes evaluated which flags.
+
+The patched get_rendered records (node unique_id, flag, variation, value) for
+every feature_flag* call made while dbt renders a node (models, tests, seeds,
+snapshots, hooks...). Flags evaluated in macros are attributed to the node
+being rendered. At exit the graph is merged into
+$DBT_TARGET_PATH/.dbt_ff_graph.json, next to manifest.json:
+
+    {
+      "version": 1,
+      "nodes": {"model.jaffle.orders": {"enable_new_mart": {"kind": "bool_variation", "hash": "...", "value": true}}},
+      "built": {"model.jaffle.orders": {"enable_new_mart": {"kind": "bool_variation", "hash": "...", "value": false}}},
+      "flags": {"enable_new_mart": ["model.jaffle.orders"]}
+    }
+
+Values are stored as preflight fingerprints, along with the call-site default
+when one was passed. With partial parsing dbt only
+renders changed nodes, so entries of nodes not rendered in a run are kept from
+the previous artifact and a node's flags accumulate across runs: the graph may
+list a dependency that no longer exists, never miss one.
+
+Rendering is not building: dbt parse, compile, ls or docs generate render nodes
+too. A separate "built" mapping, shaped like "nodes", keeps the flags each node
+was last built with. It only moves forward for the nodes a run, build, seed,
+snapshot, test or retry command of this invocation reports as successful in
+run_results.json, and those nodes' entries are replaced by what they evaluated
+in this run.
+
+Optional env var: DBT_FF_GRAPH         (set to false to disable recording)
+Optional env var: DBT_FF_GRAPH_PATH    (default: $DBT_TARGET_PATH/.dbt_ff_graph.json)
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import threading
+import time
+import typing as t
+
+from dbt_feature_flags.base import _MISSING, BaseFeatureFlagsClient, Variation
+
+GRAPH_VERSION = 1
+GRAPH_FILE = ".dbt_ff_graph.json"
+
+# dbt commands executing nodes, and the run_results.json statuses of a node
+# that was built (or, for tests, evaluated) successfully
+BUILD_COMMANDS = frozenset({"run", "build", "seed", "snapshot", "test", "retry"})
+SUCCESS_STATUSES = frozenset({"success", "pass", "warn"})
+
+
+def default_graph_path() -> pathlib.Path:
+    target_dir = os.getenv("DBT_TARGET_PATH", "target")
+    return pathlib.Path(
+        os.getenv("DBT_FF_GRAPH_PATH") or pathlib.Path(target_dir, GRAPH_FILE)
+    )
+
+
+def default_run_results_path() -> pathlib.Path:
+    return pathlib.Path(os.getenv("DBT_TARGET_PATH", "target"), "run_results.json")
+
+
+def _load_payload(path: pathlib.Path) -> dict[str, t.Any]:
+    try:
+        payload = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+    if payload.get("version") != GRAPH_VERSION:
+        return {}
+    return payload
+
+
+def load_graph(path: pathlib.Path) -> dict[str, dict[str, t.Any]]:
+    """Read {node unique_id: {flag: state}} from a graph artifact."""
+    return _load_payload(path).get("nodes", {})
+
+
+def load_built(path: pathlib.Path) -> dict[str, dict[str, t.Any]]:
+    """Read the flags each node was last built with, shaped like load_graph()."""
+    return _load_payload(path).get("built", {})
+
+
+def succeeded_nodes(run_results: pathlib.Path, since: float) -> set[str]:
+    """Return the unique_ids a node-executing dbt command built successfully.
+
+    :param run_results: dbt's run_results.json.
+    :param since: Ignore results written before this time, i.e. by an earlier
+                  invocation.
+    """
+    try:
+        if run_results.stat().st_mtime < since:
+            return set()
+        payload = json.loads(run_results.read_text())
+    except (OSError, ValueError):
+        return set()
+    if payload.get("args", {}).get("which") not in BUILD_COMMANDS:
+        return set()
+    return {
+        result["unique_id"]
+        for result in payload.get("results", [])
+        if result.get("status") in SUCCESS_STATUSES
+    }
+
+
+def dependents(nodes: dict[str, dict[str, t.Any]], flags: t.Iterable[str]) -> set[str]:
+    """Return the unique_ids of the nodes that evaluated any of the flags."""
+    wanted = set(flags)
+    return {
+        node for node, node_flags in nodes.items() if not wanted.isdisjoint(node_flags)
+    }
+
+
+class FlagGraph:
+    """Records flag evaluations per dbt node for one dbt invocation.
+
+    The node being rendered is tracked per thread, since dbt renders nodes from
+    many threads. Recording is a dict store, it never takes a lock.
+    """
+
+    def __init__(
+        self,
+        path: pathlib.Path | None = None,
+        run_results: pathlib.Path | None = None,
+    ) -> None:
+        self.path = path or default_graph_path()
+        self.run_results = run_results or default_run_results_path()
+        self.started = time.time()
+        self.current = threading.local()
+        self._records: dict[tuple[str, str], tuple[Variation, t.Any, t.Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def recorder(
+        self, variation: Variation, evaluate: t.Callable[..., t.Any]
+    ) -> t.Callable[..., t.Any]:
+        """Wrap a flag function to record its evaluations for the current node."""
+        current, records = self.current, self._records
+
+        def _recorded(*args: t.Any, **kwargs: t.Any) -> t.Any:
+            value = evaluate(*args, **kwargs)
+            node = getattr(current, "node", None)
+            if node is not None:
+                flag = args[0] if args else kwargs["flag"]
+                default = args[1] if len(args) > 1 else kwargs.get("default", _MISSING)
+                records[(node, flag)] = (variation, value, default)
+            return value
+
+        return _recorded
+
+    def nodes(self) -> dict[str, dict[str, t.Any]]:
+        """Return the evaluations of this run as {unique_id: {flag: state}}."""
+        from dbt_feature_flags.preflight import fingerprint
+
+        nodes: dict[str, dict[str, t.Any]] = {}
+        for (node, flag), (variation, value, default) in list(self._records.items()):
+            state = nodes.setdefault(node, {})[flag] = fingerprint(variation, value)
+            if default is not _MISSING:
+                state["default"] = default
+        return nodes
+
+    def write(self) -> None:
+        """Merge this run's evaluations into the artifact, if there are any."""
+        if not self._records:
+            return
+        previous = _load_payload(self.path)
+        nodes, built = previous.get("nodes", {}), previous.get("built", {})
+        rendered = self.nodes()
+        for node, node_flags in rendered.items():
+            nodes.setdefault(node, {}).update(node_flags)
+        # A node built in this run was rendered in full, so what it evaluated
+        # is its complete, current set of flags
+        for node in succeeded_nodes(self.run_results, self.started):
+            if node in rendered:
+                nodes[node] = built[node] = rendered[node]
+            elif node in nodes:
+                del nodes[node]
+                built.pop(node, None)
+        flags: dict[str, list[str]] = {}
+        for node in sorted(nodes):
+            for flag in nodes[node]:
+                flags.setdefault(flag, []).append(node)
+        payload = {
+            "version": GRAPH_VERSION,
+            "nodes": nodes,
+            "built": built,
+            "flags": flags,
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(payload, separators=(",", ":"), default=str))
+            os.replace(tmp, self.path)
+        except OSError:
+            BaseFeatureFlagsClient.logger.warning(
+                "Could not write the flag dependency graph to %s", self.path
+            )
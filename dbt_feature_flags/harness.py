@@ -12,24 +12,180 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+"""Harness Feature Flags (HFF) provider.
+
+Feature and segment configs are fetched once, without streaming, and
+persisted to $DBT_TARGET_PATH/.dbt_ff_harness.json. Later runs revalidate
+them with ETag conditional requests, so unchanged environments are not
+downloaded again, or skip the API entirely while the saved configs are
+younger than DBT_FF_HARNESS_CACHE_TTL seconds.
+
+Required env var: DBT_FF_API_KEY               (Harness server SDK key)
+Optional env var: DBT_TARGET                   (used as the target identifier)
+Optional env var: DBT_FF_HARNESS_CACHE_TTL     (seconds, default: 0, always revalidate)
+Optional env var: DBT_FF_HARNESS_CACHE_PATH    (default: $DBT_TARGET_PATH/.dbt_ff_harness.json)
+"""
+
+from __future__ import annotations
+
+from http import HTTPStatus
 from importlib import import_module
+import hashlib
+import inspect
+import json
+import os
+import pathlib
+import time
 import typing as t
 
-from dbt_feature_flags.base import JSONValue, BaseFeatureFlagsClient
+from dbt_feature_flags.base import (
+    _MISSING,
+    DEFAULT_REASON,
+    BaseFeatureFlagsClient,
+    JSONValue,
+    ThreadedSDKClient,
+    Variation,
+    state_digest,
+)
+
+CACHE_VERSION = 1
+
+# Harness flag kinds, the variation serving them and how the served variation
+# value (always a string) is decoded, as the SDK does.
+_KINDS: dict[str, tuple[Variation, t.Callable[[str], t.Any]]] = {
+    "boolean": ("bool_variation", lambda value: value.lower() == "true"),
+    "string": ("string_variation", str),
+    "int": ("number_variation", float),
+    "json": ("json_variation", json.loads),
+}
+
+# Fetches one config collection; given the saved ETag, returns the items (or
+# None when the server reports them unchanged) and the new ETag.
+Fetch = t.Callable[[str | None], tuple[list[dict[str, t.Any]] | None, str | None]]
+
+
+def default_cache_path() -> pathlib.Path:
+    target_dir = os.getenv("DBT_TARGET_PATH", "target")
+    return pathlib.Path(target_dir) / ".dbt_ff_harness.json"
+
+
+def sync_configs(
+    fetchers: dict[str, Fetch],
+    path: pathlib.Path,
+    sdk_key: str,
+    ttl: float = 0,
+) -> dict[str, list[dict[str, t.Any]]]:
+    """Return feature and segment configs, downloading only what changed.
+
+    :param fetchers: Fetch callables keyed by collection ("flags", "segments").
+                     They are not called at all while the saved configs are
+                     younger than ttl.
+    :param path: Local copy of the configs, keyed by a hash of the SDK key.
+    :return: The configs as API dicts, keyed like fetchers.
+    """
+    key = hashlib.sha256(sdk_key.encode()).hexdigest()[:16]
+    try:
+        saved = json.loads(path.read_text())
+        if saved.get("version") != CACHE_VERSION or saved.get("key") != key:
+            saved = None
+    except (OSError, ValueError):
+        saved = None
+    collections = saved["collections"] if saved else {}
+
+    if saved and time.time() - saved["fetched_at"] < ttl:
+        return {name: collections[name]["items"] for name in fetchers}
+
+    for name, fetch in fetchers.items():
+        previous = collections.get(name)
+        items, etag = fetch(previous["etag"] if previous else None)
+        if items is None:
+            items = previous["items"] if previous else []
+        collections[name] = {"etag": etag, "items": items}
+
+    payload = {
+        "version": CACHE_VERSION,
+        "key": key,
+        "fetched_at": time.time(),
+        "collections": collections,
+    }
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(payload, separators=(",", ":")))
+        os.replace(tmp, path)
+    except OSError:
+        BaseFeatureFlagsClient.logger.warning(
+            "Could not save Harness configs to %s", path
+        )
+    return {name: collections[name]["items"] for name in fetchers}
+
+
+def resolve_flags(
+    evaluate: t.Callable[[str, str], t.Any], flags: list[dict[str, t.Any]]
+) -> dict[str, tuple[Variation, t.Any]]:
+    """Resolve every flag for one target into {flag: (variation, value)}.
+
+    :param evaluate: Returns the SDK's served variation for (identifier, kind),
+                     or None when it has none.
+    :param flags: Feature configs as API dicts.
+    """
+    resolved = {}
+    for config in flags:
+        kind = _KINDS.get(config.get("kind", ""))
+        if kind is None:
+            continue
+        served = evaluate(config["feature"], config["kind"])
+        if served is None or served.value is None:
+            continue
+        try:
+            resolved[config["feature"]] = (kind[0], kind[1](served.value))
+        except ValueError:
+            # Undecodable, left to the SDK which applies its own fallback at call time
+            continue
+    return resolved
+
+
+def _conditional_fetch(
+    endpoint: t.Any, connect: t.Callable[[], tuple[t.Any, str]]
+) -> Fetch:
+    """Adapt a generated API endpoint module to a Fetch using If-None-Match.
+
+    connect() returns the authenticated API client and environment id; it is
+    only called when a request is actually made.
+    """
+
+    def _fetch(etag: str | None) -> tuple[list[dict[str, t.Any]] | None, str | None]:
+        client, environment_uuid = connect()
+        if etag:
+            client = client.with_headers({"If-None-Match": etag})
+        response = endpoint.sync_detailed(
+            client=client, environment_uuid=environment_uuid
+        )
+        if response.status_code == HTTPStatus.NOT_MODIFIED:
+            return None, etag
+        if response.parsed is None:
+            raise RuntimeError(
+                f"Harness API request failed with status {response.status_code}"
+            )
+        return (
+            [item.to_dict() for item in response.parsed],
+            response.headers.get("ETag"),
+        )
+
+    return _fetch
 
 
 class HarnessFeatureFlagsClient(BaseFeatureFlagsClient):
     def __init__(self) -> None:
         # Lazy imports
         import logging
-        import os
-
-        retrieve_segments = import_module(
-            "featureflags.api.default.get_all_segments"
-        ).sync
-        retrieve_flags = import_module(
-            "featureflags.api.default.get_feature_config"
-        ).sync
+
+        retrieve_segments = import_module("featureflags.api.default.get_all_segments")
+        retrieve_flags = import_module("featureflags.api.default.get_feature_config")
+        FeatureConfig: t.Any = import_module(
+            "featureflags.evaluations.feature"
+        ).FeatureConfig
+        Segment: t.Any = import_module("featureflags.evaluations.segment").Segment
         featureflags_client = import_module("featureflags.client")
         CfClient: t.Any = featureflags_client.CfClient
         Target: t.Any = featureflags_client.Target
@@ -46,25 +202,56 @@ class HarnessFeatureFlagsClient(BaseFeatureFlagsClient):
                 self._sdk_key: str | None = sdk_key
                 self._config = Config(enable_stream=False, enable_analytics=False)
 
-                # Set by authenticate
+                # Set by authenticate, which is skipped when saved configs are fresh
                 self._client: t.Any = None
                 self._auth_token: str | None = None
                 self._environment_id: str | None = None
                 self._cluster: str = "1"
-                self.authenticate()
 
+                def connect() -> tuple[t.Any, str]:
+                    if self._client is None:
+                        self.authenticate()
+                    return self._client, t.cast(str, self._environment_id)
+
+                self._fetchers = {
+                    "flags": _conditional_fetch(retrieve_flags, connect),
+                    "segments": _conditional_fetch(retrieve_segments, connect),
+                }
+                self.configs: dict[str, list[dict[str, t.Any]]] = {
+                    "flags": [],
+                    "segments": [],
+                }
                 self._repository = Repository(self._config.cache)
                 self._evaluator = Evaluator(self._repository)
-                flags = retrieve_flags(
-                    client=self._client, environment_uuid=self._environment_id
-                )
-                for flag in flags:
-                    self._repository.set_flag(flag)
-                segments = retrieve_segments(
-                    client=self._client, environment_uuid=self._environment_id
+                self.sync()
+
+            def sync(self) -> bool:
+                """Load changed configs into the repository. Returns True if any did."""
+                configs = sync_configs(
+                    self._fetchers,
+                    pathlib.Path(
+                        os.getenv("DBT_FF_HARNESS_CACHE_PATH") or default_cache_path()
+                    ),
+                    t.cast(str, self._sdk_key),
+                    float(os.getenv("DBT_FF_HARNESS_CACHE_TTL", "0")),
                 )
-                for segment in segments:
-                    self._repository.set_segment(segment)
+                if configs == self.configs:
+                    return False
+                # set_* ignore configs whose version is not newer than the stored one
+                for flag in configs["flags"]:
+                    self._repository.set_flag(FeatureConfig.from_dict(flag))
+                for segment in configs["segments"]:
+                    self._repository.set_segment(Segment.from_dict(segment))
+                for name, key, remove in (
+                    ("flags", "feature", self._repository.remove_flag),
+                    ("segments", "identifier", self._repository.remove_segment),
+                ):
+                    current = {item[key] for item in configs[name]}
+                    for item in self.configs[name]:
+                        if item[key] not in current:
+                            remove(item[key])
+                self.configs = configs
+                return True
 
         # Set up target
         self.target: t.Any = Target(
@@ -81,8 +268,72 @@ class HarnessFeatureFlagsClient(BaseFeatureFlagsClient):
 
         # Init client
         self.client: t.Any = CfSyncClient(FF_KEY)
+        # flag -> (variation, value) for self.target, see _resolve()
+        self._resolved: dict[str, tuple[Variation, t.Any]] = {}
+        self._resolve()
         super().__init__()
 
+    def _resolve(self) -> None:
+        """Evaluate every flag once for the run's fixed target.
+
+        Rules, distributions and segment inclusion lists are walked here only;
+        evaluations are then a dict lookup. Flags that cannot be resolved (or
+        are requested as another kind) still go through the SDK.
+        """
+        evaluate, target = self.client._evaluator.evaluate, self.target
+        # harness-featureflags < 1.3 evaluates (identifier, target) only
+        takes_kind = "kind" in inspect.signature(evaluate).parameters
+
+        def resolve(flag: str, kind: str) -> t.Any:
+            if takes_kind:
+                return evaluate(flag, target, kind)
+            return evaluate(flag, target)
+
+        try:
+            self._resolved = resolve_flags(resolve, self.client.configs["flags"])
+        except Exception as exc:
+            self.logger.warning(
+                "Could not precompute Harness flags (%s), evaluating through the SDK",
+                exc,
+            )
+            self._resolved = {}
+
+    def _lookup(self, variation: Variation, flag: str) -> t.Any:
+        entry = self._resolved.get(flag)
+        if entry is not None and entry[0] == variation:
+            # The served variation does not record which rule selected it
+            self.reasons[flag] = "precomputed"
+            return entry[1]
+        # Left to the SDK: configured flags of this kind are evaluated there,
+        # unknown flags and flags of another kind get the default
+        known = any(
+            config["feature"] == flag
+            and _KINDS.get(config.get("kind", ""), ("",))[0] == variation
+            for config in self.client.configs["flags"]
+        )
+        self.reasons[flag] = "sdk" if known else DEFAULT_REASON
+        return _MISSING
+
+    def _set_target(self, target: str) -> None:
+        self.target = type(self.target)(identifier="dbt-" + target, name=target.title())
+        if self._resolved:
+            self._resolve()
+
+    def refresh(self) -> bool:
+        """Revalidate the configs and re-resolve the flags of every target."""
+        if not self.client.sync():
+            return False
+        for client in (self, *self._targets.values()):
+            t.cast(HarnessFeatureFlagsClient, client)._resolve()
+            client.cache.clear()
+        return True
+
+    def state_version(self) -> str | None:
+        """Digest of the precomputed table, i.e. every flag value for the target."""
+        if not self._resolved:
+            return None
+        return state_digest("harness", self.target.identifier, self._resolved)
+
     def shutdown(self) -> None:
         try:
             self.client.destroy()
@@ -90,15 +341,43 @@ class HarnessFeatureFlagsClient(BaseFeatureFlagsClient):
             self.logger.exception("Failed to shut down Harness feature flag client")
 
     def bool_variation(self, flag: str, default: bool = False) -> bool:
-        return self.client.bool_variation(flag, target=self.target, default=default)
+        value = self._lookup("bool_variation", flag)
+        if value is _MISSING:
+            value = self.client.bool_variation(
+                flag, target=self.target, default=default
+            )
+        return value
 
     def string_variation(self, flag: str, default: str = "") -> str:
-        return self.client.string_variation(flag, target=self.target, default=default)
+        value = self._lookup("string_variation", flag)
+        if value is _MISSING:
+            value = self.client.string_variation(
+                flag, target=self.target, default=default
+            )
+        return value
 
     def number_variation(self, flag: str, default: float | int = 0) -> float | int:
-        return self.client.number_variation(flag, target=self.target, default=default)
+        value = self._lookup("number_variation", flag)
+        if value is _MISSING:
+            value = self.client.number_variation(
+                flag, target=self.target, default=default
+            )
+        return value
 
     def json_variation(self, flag: str, default: JSONValue | None = None) -> JSONValue:
-        return self.client.json_variation(
-            flag, target=self.target, default={} if default is None else default
-        )
+        value = self._lookup("json_variation", flag)
+        if value is _MISSING:
+            value = self.client.json_variation(
+                flag, target=self.target, default={} if default is None else default
+            )
+        return value
+
+
+class AsyncHarnessFeatureFlagsClient(ThreadedSDKClient):
+    """Asyncio client over the synchronous Harness SDK.
+
+    The SDK evaluates from an in-memory flag store, so only its handshake runs
+    in a worker thread.
+    """
+
+    provider = HarnessFeatureFlagsClient
@@ -0,0 +1,209 @@
+# Copyright 2022 Alex Butler
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Static index of feature flag references in a dbt project.
+
+Scans models/, macros/, dbt_project.yml and profiles.yml for feature_flag,
+feature_flag_str, feature_flag_num and feature_flag_json calls with a literal
+flag name. The index is persisted to target/.dbt_ff_index.json and keyed by
+file mtime/size (falling back to a content hash), so re-scans only read files
+that changed.
+
+Usage (Python):
+    from dbt_feature_flags.index import build_index
+    index = build_index(project_dir=".", target_dir="target")
+    index.flags(config_only=True)
+"""
+
+from __future__ import annotations
+
+import bisect
+import hashlib
+import json
+import os
+import pathlib
+import re
+import typing as t
+
+from dbt_feature_flags.base import Variation
+
+INDEX_VERSION = 1
+INDEX_FILE = ".dbt_ff_index.json"
+SOURCE_DIRS = ("models", "macros")
+SOURCE_SUFFIXES = (".sql", ".yml", ".yaml")
+
+VARIATIONS: dict[str, Variation] = {
+    "feature_flag": "bool_variation",
+    "feature_flag_str": "string_variation",
+    "feature_flag_num": "number_variation",
+    "feature_flag_json": "json_variation",
+}
+
+_REFERENCE = re.compile(
+    r"\b(feature_flag(?:_str|_num|_json)?)\s*\(\s*(?:flag\s*=\s*)?(['\"])(.+?)\2"
+)
+_CONFIG_CALL = re.compile(r"\bconfig\s*\(")
+
+
+class FlagReference(t.NamedTuple):
+    flag: str
+    variation: Variation
+    path: str
+    line: int
+    in_config: bool
+
+
+def _config_spans(text: str) -> list[tuple[int, int]]:
+    """Return the (start, end) offsets of every config(...) call in a template."""
+    spans = []
+    for match in _CONFIG_CALL.finditer(text):
+        depth, quote, pos = 1, "", match.end()
+        while pos < len(text) and depth:
+            char = text[pos]
+            if quote:
+                if char == quote:
+                    quote = ""
+            elif char in "'\"":
+                quote = char
+            elif char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+            pos += 1
+        spans.append((match.start(), pos))
+    return spans
+
+
+def scan_text(text: str, path: str) -> list[FlagReference]:
+    """Extract flag references from a file's contents.
+
+    In SQL files a reference is config-layer when it sits inside config(...).
+    YAML files (dbt_project.yml, profiles.yml, properties) are rendered before
+    or as part of node configs, so all their references are config-layer.
+    """
+    matches = list(_REFERENCE.finditer(text))
+    if not matches:
+        return []
+    is_yaml = path.endswith((".yml", ".yaml"))
+    spans = [] if is_yaml else _config_spans(text)
+    newlines = [match.start() for match in re.finditer("\n", text)]
+    references = []
+    for match in matches:
+        start = match.start()
+        references.append(
+            FlagReference(
+                flag=match.group(3),
+                variation=VARIATIONS[match.group(1)],
+                path=path,
+                line=bisect.bisect_left(newlines, start) + 1,
+                in_config=is_yaml or any(a <= start < b for a, b in spans),
+            )
+        )
+    return references
+
+
+def _iter_project_files(project_dir: pathlib.Path) -> t.Iterator[pathlib.Path]:
+    for name in SOURCE_DIRS:
+        for root, _, files in os.walk(project_dir / name):
+            for file in files:
+                if file.endswith(SOURCE_SUFFIXES):
+                    yield pathlib.Path(root, file)
+    profiles_dir = pathlib.Path(os.getenv("DBT_PROFILES_DIR", project_dir))
+    for path in dict.fromkeys(
+        (
+            project_dir / "dbt_project.yml",
+            project_dir / "profiles.yml",
+            profiles_dir / "profiles.yml",
+        )
+    ):
+        if path.is_file():
+            yield path
+
+
+class FlagIndex:
+    """Persistent, incrementally updated map of file -> flag references."""
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+        self.files: dict[str, dict[str, t.Any]] = {}
+        self.scanned = 0
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> FlagIndex:
+        index = cls(path)
+        try:
+            payload = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return index
+        if payload.get("version") == INDEX_VERSION:
+            index.files = payload.get("files", {})
+        return index
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"version": INDEX_VERSION, "files": self.files}
+        self.path.write_text(json.dumps(payload, separators=(",", ":")))
+
+    def update(self, project_dir: pathlib.Path) -> bool:
+        """Re-scan files whose mtime/size changed. Returns True if the index changed."""
+        changed = False
+        seen = set()
+        for file in _iter_project_files(project_dir):
+            key = os.path.relpath(file, project_dir)
+            seen.add(key)
+            stat = file.stat()
+            entry = self.files.get(key)
+            if (
+                entry is not None
+                and entry["mtime"] == stat.st_mtime_ns
+                and entry["size"] == stat.st_size
+            ):
+                continue
+            content = file.read_bytes()
+            digest = hashlib.sha256(content).hexdigest()
+            if entry is None or entry["sha256"] != digest:
+                self.scanned += 1
+                refs = scan_text(content.decode("utf-8", errors="replace"), key)
+                entry = {
+                    "sha256": digest,
+                    "refs": [list(ref[:2] + ref[3:]) for ref in refs],
+                }
+            entry.update(mtime=stat.st_mtime_ns, size=stat.st_size)
+            self.files[key] = entry
+            changed = True
+        for key in set(self.files) - seen:
+            del self.files[key]
+            changed = True
+        return changed
+
+    def references(self) -> t.Iterator[FlagReference]:
+        for path, entry in self.files.items():
+            for flag, variation, line, in_config in entry["refs"]:
+                yield FlagReference(flag, variation, path, line, in_config)
+
+    def flags(self, config_only: bool = False) -> dict[str, Variation]:
+        """Return referenced flag names mapped to the variation they are used with."""
+        return {
+            ref.flag: ref.variation
+            for ref in self.references()
+            if ref.in_config or not config_only
+        }
+
+
+def build_index(project_dir: str = ".", target_dir: str = "target") -> FlagIndex:
+    """Load the persisted index, update it incrementally and save it if changed."""
+    index = FlagIndex.load(pathlib.Path(target_dir) / INDEX_FILE)
+    if index.update(pathlib.Path(project_dir)):
+        index.save()
+    return index
@@ -12,20 +12,93 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+"""LaunchDarkly provider.
+
+By default the SDK opens a streaming connection and an event processor. For
+short-lived dbt commands DBT_FF_LAUNCHDARKLY_MODE selects a cheaper setup:
+
+- poll: a single polling request at startup, no stream and no events
+- file: flag data read once from DBT_FF_LAUNCHDARKLY_FILE (a LaunchDarkly
+  flag-data JSON/YAML file, e.g. exported from the relay proxy), no network
+
+Required env var: DBT_FF_API_KEY               (not needed in file mode)
+Optional env var: DBT_TARGET                   (used as the context key)
+Optional env var: DBT_FF_LAUNCHDARKLY_MODE     (stream, poll or file; default: stream, or file when a file is set)
+Optional env var: DBT_FF_LAUNCHDARKLY_FILE     (flag-data file for file mode)
+"""
+
+from __future__ import annotations
+
 from importlib import import_module
+import os
 import typing as t
 
-from dbt_feature_flags.base import JSONValue, BaseFeatureFlagsClient
+from dbt_feature_flags.base import (
+    DEFAULT_REASON,
+    UNAVAILABLE_REASON,
+    JSONValue,
+    BaseFeatureFlagsClient,
+    ThreadedSDKClient,
+    Variation,
+    state_digest,
+)
+
+
+MODES = ("stream", "poll", "file")
+
+# The poller repeats its request after this many seconds; a dbt command exits
+# long before, so polling mode amounts to a single request at startup.
+ONE_SHOT_POLL_INTERVAL = 24 * 60 * 60
+
+
+def get_mode() -> str:
+    """Return the configured DBT_FF_LAUNCHDARKLY_MODE, see the module docstring."""
+    path = os.getenv("DBT_FF_LAUNCHDARKLY_FILE")
+    return os.getenv("DBT_FF_LAUNCHDARKLY_MODE") or ("file" if path else "stream")
+
+
+def _config(sdk_key: str | None) -> t.Any:
+    """Build the SDK config for DBT_FF_LAUNCHDARKLY_MODE."""
+    Config = import_module("ldclient.config").Config
+    path = os.getenv("DBT_FF_LAUNCHDARKLY_FILE")
+    mode = get_mode()
+    if mode not in MODES:
+        raise RuntimeError(
+            f"Unsupported LaunchDarkly mode: DBT_FF_LAUNCHDARKLY_MODE={mode}"
+        )
+    if mode == "file":
+        if path is None:
+            raise RuntimeError(
+                "DBT_FF_LAUNCHDARKLY_MODE=file requires the env var DBT_FF_LAUNCHDARKLY_FILE"
+            )
+        Files = import_module("ldclient.integrations").Files
+        return Config(
+            sdk_key or "dbt-feature-flags-offline",
+            update_processor_class=Files.new_data_source(paths=[path]),
+            send_events=False,
+            diagnostic_opt_out=True,
+        )
+    if sdk_key is None:
+        raise RuntimeError(
+            "dbt-feature-flags injected in environment, this patch requires the env var DBT_FF_API_KEY"
+        )
+    if mode == "poll":
+        return Config(
+            sdk_key,
+            stream=False,
+            poll_interval=ONE_SHOT_POLL_INTERVAL,
+            send_events=False,
+            diagnostic_opt_out=True,
+        )
+    return Config(sdk_key)
 
 
 class LaunchDarklyFeatureFlagsClient(BaseFeatureFlagsClient):
     def __init__(self) -> None:
         # Lazy imports
         import atexit
-        import os
 
         ldclient = import_module("ldclient")
-        Config = import_module("ldclient.config").Config
 
         # Set up target
         self.target = {
@@ -35,13 +108,9 @@ class LaunchDarklyFeatureFlagsClient(BaseFeatureFlagsClient):
 
         # Get key
         FF_KEY = os.getenv("DBT_FF_API_KEY")
-        if FF_KEY is None:
-            raise RuntimeError(
-                "dbt-feature-flags injected in environment, this patch requires the env var DBT_FF_API_KEY"
-            )
 
         # Init client
-        ldclient.set_config(Config(FF_KEY))
+        ldclient.set_config(_config(FF_KEY))
         self.client = ldclient.get()
         if not self.client.is_initialized():
             raise RuntimeError(
@@ -55,16 +124,88 @@ class LaunchDarklyFeatureFlagsClient(BaseFeatureFlagsClient):
         atexit.register(exit_handler, self.client)
         super().__init__()
 
+    def _set_target(self, target: str) -> None:
+        self.target = {"key": "dbt-" + target, "name": target.title()}
+
+    def state_version(self) -> str | None:
+        """Digest of every flag's version and served variation for the target.
+
+        Versions cover flag edits, variations cover segment changes. Both come
+        from the SDK's in-memory store, without sending evaluation events.
+        """
+        state = self.client.all_flags_state(self.target)
+        if not state.valid:
+            return None
+        flags = state.to_json_dict().get("$flagsState", {})
+        return state_digest(
+            "launchdarkly",
+            self.target["key"],
+            {
+                flag: [meta.get("version"), meta.get("variation")]
+                for flag, meta in flags.items()
+            },
+        )
+
+    def _variation(self, flag: str, default: t.Any) -> t.Any:
+        detail = self.client.variation_detail(flag, self.target, default)
+        self.reasons[flag] = _reason(detail.reason)
+        return detail.value
+
     def bool_variation(self, flag: str, default: bool = False) -> bool:
-        return self.client.variation(flag, self.target, default)
+        return self._variation(flag, default)
 
     def string_variation(self, flag: str, default: str = "") -> str:
-        return self.client.variation(flag, self.target, default)
+        return self._variation(flag, default)
 
     def number_variation(self, flag: str, default: float | int = 0) -> float | int:
-        return self.client.variation(flag, self.target, default)
+        return self._variation(flag, default)
 
     def json_variation(self, flag: str, default: JSONValue | None = None) -> JSONValue:
-        return self.client.variation(
-            flag, self.target, {} if default is None else default
-        )
+        return self._variation(flag, {} if default is None else default)
+
+    def _bulk_variation(
+        self, variation: Variation, flags: list[str], default: t.Any
+    ) -> dict[str, t.Any]:
+        """Evaluate all flags for the target with a single all_flags_state call."""
+        if variation == "json_variation" and default is None:
+            default = {}
+        state = self.client.all_flags_state(self.target, with_reasons=True)
+        if not state.valid:
+            self.reasons.update(dict.fromkeys(flags, UNAVAILABLE_REASON))
+            return dict.fromkeys(flags, default)
+        values = state.to_values_map()
+        evaluated = {}
+        for flag in flags:
+            if values.get(flag) is None:
+                self.reasons[flag] = DEFAULT_REASON
+                evaluated[flag] = default
+            else:
+                self.reasons[flag] = _reason(state.get_flag_reason(flag))
+                evaluated[flag] = values[flag]
+        return evaluated
+
+
+# Error kinds meaning the SDK could not evaluate at all, rather than that the
+# flag is unknown or of another type
+_UNAVAILABLE_ERRORS = ("CLIENT_NOT_READY", "EXCEPTION")
+
+
+def _reason(reason: dict[str, t.Any] | None) -> str:
+    """Map a LaunchDarkly evaluation reason, e.g. RULE_MATCH -> rule_match."""
+    reason = reason or {}
+    kind = reason.get("kind")
+    if kind is None or kind == "ERROR":
+        if reason.get("errorKind") in _UNAVAILABLE_ERRORS:
+            return UNAVAILABLE_REASON
+        return DEFAULT_REASON
+    return kind.lower()
+
+
+class AsyncLaunchDarklyFeatureFlagsClient(ThreadedSDKClient):
+    """Asyncio client over the synchronous LaunchDarkly SDK.
+
+    The SDK evaluates from an in-memory flag store, so only its handshake runs
+    in a worker thread.
+    """
+
+    provider = LaunchDarklyFeatureFlagsClient
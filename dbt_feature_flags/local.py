@@ -0,0 +1,139 @@
+# Copyright 2022 Alex Butler
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Local file backed provider for tests and air-gapped environments.
+
+Flag definitions are read from a YAML or JSON file:
+
+    flags:
+      enable_new_mart: true
+      orders_materialization:
+        value: view
+        targets:
+          prod: table
+      mart_settings:
+        value: {"days": 30}
+
+A flag is either its value directly or a mapping with a ``value`` and optional
+per-target overrides keyed on DBT_TARGET (JSON object flags must use the
+``value`` form). The file is resolved once for the current target into a flat
+lookup table and only re-read when its mtime changes, which is checked on
+evaluation cache misses and by refresh().
+
+Required env var: DBT_FF_FILE    (path to the .yml/.yaml/.json definitions)
+Optional env var: DBT_TARGET     (selects per-target overrides)
+"""
+
+from __future__ import annotations
+
+from importlib import import_module
+import json
+import os
+import pathlib
+import threading
+import typing as t
+
+from dbt_feature_flags.base import (
+    DEFAULT_REASON,
+    JSONValue,
+    BaseFeatureFlagsClient,
+    ThreadedSDKClient,
+    state_digest,
+)
+
+
+def load_flags(path: pathlib.Path, target: str) -> dict[str, t.Any]:
+    """Parse a definitions file into {flag: value} for the given target."""
+    text = path.read_text()
+    if path.suffix in (".yml", ".yaml"):
+        payload = import_module("yaml").safe_load(text) or {}
+    else:
+        payload = json.loads(text)
+    definitions = payload.get("flags") or {}
+    if not isinstance(definitions, dict):
+        raise RuntimeError(f"Invalid feature flag file {path}: 'flags' must be a map")
+    flags = {}
+    for flag, definition in definitions.items():
+        if isinstance(definition, dict) and "value" in definition:
+            overrides = definition.get("targets") or {}
+            flags[flag] = overrides.get(target, definition["value"])
+        else:
+            flags[flag] = definition
+    return flags
+
+
+class FileFeatureFlagsClient(BaseFeatureFlagsClient):
+    def __init__(self, path: pathlib.Path | None = None) -> None:
+        if path is None:
+            file = os.getenv("DBT_FF_FILE")
+            if file is None:
+                raise RuntimeError(
+                    "dbt-feature-flags injected in environment, this patch requires the env var DBT_FF_FILE"
+                )
+            path = pathlib.Path(file)
+        self.path = path
+        self.target = os.getenv("DBT_TARGET", "default")
+        self._lock = threading.Lock()
+        self._mtime = self.path.stat().st_mtime_ns
+        self._flags = load_flags(self.path, self.target)
+        super().__init__()
+
+    def refresh(self) -> bool:
+        """Reload the file if its mtime changed. Returns True if it was reloaded.
+
+        Reloading clears the evaluation cache so new values are served.
+        """
+        mtime = self.path.stat().st_mtime_ns
+        if mtime == self._mtime:
+            return False
+        with self._lock:
+            if mtime != self._mtime:
+                self._flags = load_flags(self.path, self.target)
+                self._mtime = mtime
+                self.cache.clear()
+        return True
+
+    def _set_target(self, target: str) -> None:
+        self.target = target
+        self._flags = load_flags(self.path, target)
+
+    def state_version(self) -> str | None:
+        self.refresh()
+        return state_digest("file", self.target, self._flags)
+
+    def _get(self, flag: str, default: t.Any) -> t.Any:
+        self.refresh()
+        if flag in self._flags:
+            self.reasons[flag] = "file"
+            return self._flags[flag]
+        self.reasons[flag] = DEFAULT_REASON
+        return default
+
+    def bool_variation(self, flag: str, default: bool = False) -> bool:
+        return self._get(flag, default)
+
+    def string_variation(self, flag: str, default: str = "") -> str:
+        return self._get(flag, default)
+
+    def number_variation(self, flag: str, default: float | int = 0) -> float | int:
+        return self._get(flag, default)
+
+    def json_variation(self, flag: str, default: JSONValue | None = None) -> JSONValue:
+        return self._get(flag, {} if default is None else default)
+
+
+class AsyncFileFeatureFlagsClient(ThreadedSDKClient):
+    """Asyncio client; the definitions file is read in a worker thread."""
+
+    provider = FileFeatureFlagsClient
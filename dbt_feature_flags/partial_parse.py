@@ -0,0 +1,76 @@
+# Copyright 2022 Alex Butler
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Selective invalidation of dbt's partial parse cache.
+
+dbt re-parses a file when its checksum differs from the one stored in
+target/partial_parse.msgpack. Overwriting the stored checksum of the files that
+reference a changed flag makes dbt re-parse only those files (and, for macros,
+their dependents) instead of the whole project. This does not work for schema
+YAML files: dbt re-reads them but only re-parses the entries whose YAML text
+changed, so flags referenced there require deleting the cache.
+"""
+
+from __future__ import annotations
+
+import os
+import pathlib
+import typing as t
+
+INVALIDATED_CHECKSUM = "dbt-ff-invalidated"
+
+
+def invalidate_files(partial_parse: pathlib.Path, paths: t.Iterable[str]) -> set[str]:
+    """Mark project files as changed in dbt's saved manifest.
+
+    :param partial_parse: Path to target/partial_parse.msgpack.
+    :param paths: File paths relative to the project root, e.g. models/a.sql.
+    :return: The paths that were found (and invalidated) in the saved manifest.
+    :raises ValueError: If the saved manifest cannot be read or has an
+                        unexpected layout; callers should fall back to
+                        deleting it.
+    """
+    import msgpack  # dbt-core dependency, only needed here
+
+    wanted = {os.path.normpath(path) for path in paths}
+    try:
+        manifest = msgpack.unpackb(
+            partial_parse.read_bytes(), raw=False, strict_map_key=False
+        )
+        files = manifest["files"]
+    except (OSError, ValueError, KeyError, TypeError, msgpack.UnpackException) as exc:
+        raise ValueError(f"Unreadable partial parse manifest: {exc}") from exc
+
+    found = set()
+    for source_file in files.values():
+        path = source_file.get("path") or {}
+        if "searched_path" not in path:
+            continue
+        original = os.path.normpath(
+            os.path.join(path["searched_path"], path["relative_path"])
+        )
+        if original in wanted:
+            source_file["checksum"] = {
+                "name": "sha256",
+                "checksum": INVALIDATED_CHECKSUM,
+            }
+            # Schema files reuse the saved checksum when the mtime is unchanged
+            path["modification_time"] = 0.0
+            found.add(original)
+
+    if found:
+        tmp = partial_parse.with_suffix(".tmp")
+        tmp.write_bytes(msgpack.packb(manifest, use_bin_type=True))
+        os.replace(tmp, partial_parse)
+    return found
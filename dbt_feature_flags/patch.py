@@ -15,11 +15,26 @@ from __future__ import annotations
 
 import atexit
 import os
+import threading
+import time
 import typing as t
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from enum import Enum
 from functools import wraps
 
-from dbt_feature_flags import base, fme, harness, launchdarkly
+from dbt_feature_flags import (
+    base,
+    daemon,
+    fme,
+    graph,
+    harness,
+    index,
+    launchdarkly,
+    local,
+    snapshot,
+    telemetry,
+)
 
 
 class _MockClient:
@@ -33,6 +48,9 @@ class SupportedProviders(str, Enum):
     Harness = "harness"
     FME = "fme"
     LaunchDarkly = "launchdarkly"
+    File = "file"
+    Snapshot = "snapshot"
+    Daemon = "daemon"
     NoopClient = "mock"
 
 
@@ -41,18 +59,19 @@ def _is_truthy(value: str) -> bool:
     return value.lower() in ("1", "true", "yes")
 
 
-def _get_client() -> base.BaseFeatureFlagsClient | _MockClient:
-    """Return the user specified client.
+def _get_provider() -> SupportedProviders | None:
+    """Return the user specified provider, or None when the mock client applies.
 
-    Valid implementations MUST inherit from BaseFeatureFlagsClient.
+    This only inspects the environment so it is cheap enough to call before
+    deciding whether a provider client needs to be built at all.
     """
     provider_name = os.getenv("DBT_FF_PROVIDER")
 
     if _is_truthy(os.getenv("DBT_FF_DISABLE", "0")):
-        return _MOCK_CLIENT
+        return None
 
     if not provider_name:
-        return _MOCK_CLIENT
+        return None
 
     try:
         provider = SupportedProviders(provider_name)
@@ -61,66 +80,395 @@ def _get_client() -> base.BaseFeatureFlagsClient | _MockClient:
             f"Unsupported dbt feature flag provider: DBT_FF_PROVIDER={provider_name}"
         ) from exc
 
+    if provider == SupportedProviders.NoopClient:
+        return None
+    return provider
+
+
+def _build_provider_client(provider: SupportedProviders) -> base.BaseFeatureFlagsClient:
+    """Construct the client for a provider serving flags from its own source."""
     if provider == SupportedProviders.Harness:
         return harness.HarnessFeatureFlagsClient()
     if provider == SupportedProviders.FME:
         return fme.HarnessFMEClient()
     if provider == SupportedProviders.LaunchDarkly:
         return launchdarkly.LaunchDarklyFeatureFlagsClient()
+    if provider == SupportedProviders.File:
+        return local.FileFeatureFlagsClient()
+    raise RuntimeError(f"{provider.value} cannot be used as an upstream provider")
+
+
+def _get_upstream_provider(env_var: str, name: str | None = None) -> SupportedProviders:
+    """Return the provider a snapshot or daemon client wraps, from env_var."""
+    upstream_name = name or os.getenv(env_var)
+    if upstream_name is None:
+        raise RuntimeError(
+            f"DBT_FF_PROVIDER={os.getenv('DBT_FF_PROVIDER')} requires the env var {env_var}"
+        )
+    try:
+        return SupportedProviders(upstream_name)
+    except ValueError as exc:
+        raise RuntimeError(
+            f"Unsupported dbt feature flag provider: {env_var}={upstream_name}"
+        ) from exc
+
+
+def _get_snapshot_client() -> snapshot.SnapshotFeatureFlagsClient:
+    upstream = _get_upstream_provider("DBT_FF_SNAPSHOT_PROVIDER")
+    return snapshot.SnapshotFeatureFlagsClient(
+        lambda: _build_provider_client(upstream), upstream.value
+    )
+
+
+def _get_daemon_client() -> base.BaseFeatureFlagsClient:
+    """Evaluate through the host's dbt-ff-daemon, or in process without one."""
+    upstream = _get_upstream_provider("DBT_FF_DAEMON_PROVIDER")
+    try:
+        return daemon.DaemonFeatureFlagsClient(
+            upstream.value, fallback=lambda: _build_provider_client(upstream)
+        )
+    except OSError as exc:
+        base.BaseFeatureFlagsClient.logger.info(
+            "dbt-ff daemon unavailable (%s), evaluating flags in process", exc
+        )
+        return _build_provider_client(upstream)
+
+
+def _get_client() -> base.BaseFeatureFlagsClient | _MockClient:
+    """Return the user specified client.
+
+    Valid implementations MUST inherit from BaseFeatureFlagsClient.
+    """
+    provider = _get_provider()
+
+    if provider is None:
+        return _MOCK_CLIENT
+    recorder = telemetry.get_recorder()
+    if recorder is None:
+        return _build_client(provider)
+    with recorder.span("init", provider=provider.value):
+        started = time.perf_counter()
+        client = _build_client(provider)
+    recorder.record_init(provider.value, time.perf_counter() - started)
+    return client
+
+
+def _build_client(provider: SupportedProviders) -> base.BaseFeatureFlagsClient:
+    if provider == SupportedProviders.Snapshot:
+        return _get_snapshot_client()
+    if provider == SupportedProviders.Daemon:
+        return _get_daemon_client()
+    return _build_provider_client(provider)
+
+
+class _DefaultsClient(base.BaseFeatureFlagsClient):
+    """Serves call-site defaults when the provider missed its startup deadline,
+    or to get_client() callers in mock mode."""
+
+    def bool_variation(self, flag: str, default: bool = False) -> bool:
+        self.reasons[flag] = base.UNAVAILABLE_REASON
+        return default
+
+    def string_variation(self, flag: str, default: str = "") -> str:
+        self.reasons[flag] = base.UNAVAILABLE_REASON
+        return default
+
+    def number_variation(self, flag: str, default: float | int = 0) -> float | int:
+        self.reasons[flag] = base.UNAVAILABLE_REASON
+        return default
+
+    def json_variation(
+        self, flag: str, default: base.JSONValue | None = None
+    ) -> base.JSONValue:
+        self.reasons[flag] = base.UNAVAILABLE_REASON
+        return {} if default is None else default
+
+    def _set_target(self, target: str) -> None:
+        pass
+
+
+class _AsyncDefaultsClient(base.AsyncBaseFeatureFlagsClient):
+    """Serves call-site defaults to asyncio callers in mock mode."""
+
+    async def bool_variation(self, flag: str, default: bool = False) -> bool:
+        return default
+
+    async def string_variation(self, flag: str, default: str = "") -> str:
+        return default
+
+    async def number_variation(
+        self, flag: str, default: float | int = 0
+    ) -> float | int:
+        return default
+
+    async def json_variation(
+        self, flag: str, default: base.JSONValue | None = None
+    ) -> base.JSONValue:
+        return {} if default is None else default
+
+    def _set_target(self, target: str) -> None:
+        pass
+
+
+_ASYNC_CLIENTS: dict[SupportedProviders, type[base.AsyncBaseFeatureFlagsClient]] = {
+    SupportedProviders.Harness: harness.AsyncHarnessFeatureFlagsClient,
+    SupportedProviders.FME: fme.AsyncHarnessFMEClient,
+    SupportedProviders.LaunchDarkly: launchdarkly.AsyncLaunchDarklyFeatureFlagsClient,
+    SupportedProviders.File: local.AsyncFileFeatureFlagsClient,
+}
 
-    return _MOCK_CLIENT
+
+def get_client() -> base.BaseFeatureFlagsClient:
+    """Return the user specified client for callers such as orchestrators.
+
+    Unlike the client patched into dbt it is built right away, and mock mode
+    serves call-site defaults. The caller shuts it down.
+    """
+    client = _get_client()
+    if client is _MOCK_CLIENT:
+        return _DefaultsClient()
+    return t.cast(base.BaseFeatureFlagsClient, client)
+
+
+async def get_async_client() -> base.AsyncBaseFeatureFlagsClient:
+    """Return the user specified client for asyncio callers such as orchestrators.
+
+    Mock mode serves call-site defaults, like the synchronous mock client.
+    """
+    provider = _get_provider()
+    if provider is None:
+        return _AsyncDefaultsClient()
+    client_class = _ASYNC_CLIENTS.get(provider)
+    if client_class is None:
+        raise RuntimeError(f"{provider.value} has no asyncio client")
+    return await client_class.create()
+
+
+class _LazyClient:
+    """Proxy that builds the provider client on the first feature flag call.
+
+    Provider construction performs a network handshake, so it is deferred until
+    a template actually evaluates a flag. Alternatively start() builds it in a
+    background thread while dbt loads the project; with a timeout, the first
+    evaluation waits at most that long and the run falls back to defaults.
+    """
+
+    def __init__(
+        self,
+        factory: t.Callable[[], base.BaseFeatureFlagsClient | _MockClient],
+        prefetch: t.Sequence[str] = (),
+        timeout: float | None = None,
+    ) -> None:
+        self._factory = factory
+        self._prefetch = prefetch
+        self._timeout = timeout
+        self._client: base.BaseFeatureFlagsClient | None = None
+        self._future: Future[base.BaseFeatureFlagsClient] | None = None
+        self._lock = threading.Lock()
+
+    def _build(self) -> base.BaseFeatureFlagsClient:
+        client = t.cast(base.BaseFeatureFlagsClient, self._factory())
+        if self._prefetch:
+            client.bulk_evaluate(self._prefetch)
+        return client
+
+    def start(self) -> None:
+        """Build the client in a daemon thread so a hung SDK never blocks exit."""
+        future: Future[base.BaseFeatureFlagsClient] = Future()
+
+        def _run() -> None:
+            try:
+                future.set_result(self._build())
+            except BaseException as exc:
+                future.set_exception(exc)
+
+        self._future = future
+        threading.Thread(target=_run, name="dbt-ff-init", daemon=True).start()
+
+    def _await(
+        self, future: Future[base.BaseFeatureFlagsClient]
+    ) -> base.BaseFeatureFlagsClient:
+        try:
+            return future.result(timeout=self._timeout)
+        except FutureTimeoutError:
+            base.BaseFeatureFlagsClient.logger.warning(
+                "Feature flag provider not ready after %ss, serving defaults",
+                self._timeout,
+            )
+            return _DefaultsClient()
+
+    def resolve(self) -> base.BaseFeatureFlagsClient:
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    future = self._future
+                    self._client = self._await(future) if future else self._build()
+                client = self._client
+        return client
+
+    def bool_variation(self, *args: t.Any, **kwargs: t.Any) -> bool:
+        return self.resolve().bool_variation(*args, **kwargs)
+
+    def string_variation(self, *args: t.Any, **kwargs: t.Any) -> str:
+        return self.resolve().string_variation(*args, **kwargs)
+
+    def number_variation(self, *args: t.Any, **kwargs: t.Any) -> float | int:
+        return self.resolve().number_variation(*args, **kwargs)
+
+    def json_variation(self, *args: t.Any, **kwargs: t.Any) -> base.JSONValue:
+        return self.resolve().json_variation(*args, **kwargs)
+
+    def for_target(self, target: str) -> base.BaseFeatureFlagsClient:
+        return self.resolve().for_target(target)
+
+    def shutdown(self) -> None:
+        if self._client is not None:
+            self._client.shutdown()
+        future = self._future
+        if future is not None and future.done() and future.exception() is None:
+            if future.result() is not self._client:
+                future.result().shutdown()
+
+
+AnyClient = base.BaseFeatureFlagsClient | _LazyClient | _MockClient
+
+
+# Used in mock mode when a context has no var (e.g. "contextless" rendering)
+_MOCK_FALLBACKS: t.Final[dict[str, t.Callable[..., t.Any]]] = {
+    "feature_flag": lambda _, default=False: default,
+    "feature_flag_str": lambda _, default="": default,
+    "feature_flag_num": lambda _, default=0: default,
+    "feature_flag_json": lambda _, default=None: {} if default is None else default,
+}
 
 
 def get_rendered(
     fn: t.Callable[..., t.Any],
-    client: base.BaseFeatureFlagsClient | _MockClient,
+    client: AnyClient,
+    flag_graph: graph.FlagGraph | None = None,
 ) -> t.Callable[..., t.Any]:
-    """Patch dbt's jinja environment to include feature flag functions."""
+    """Patch dbt's jinja environment to include feature flag functions.
+
+    The flag functions are bound once here; the wrapper only copies them into
+    each render context, which dbt builds tens of thousands of times per parse.
+    With a flag graph, evaluations made while rendering a node are recorded
+    against the node's unique_id.
+    """
 
     if getattr(fn, "status", None) == "patched":
         return fn
 
-    @wraps(fn)
-    def _wrapped(
-        string: str,
-        ctx: dict[str, t.Any],
-        node: t.Any = None,
-        capture_macros: bool = False,
-        native: bool = False,
-    ) -> t.Any:
-        if client is _MOCK_CLIENT:
-            ctx["feature_flag"] = ctx.get("var", lambda _, default=False: default)
-            ctx["feature_flag_str"] = ctx.get("var", lambda _, default="": default)
-            ctx["feature_flag_num"] = ctx.get("var", lambda _, default=0: default)
-            ctx["feature_flag_json"] = ctx.get(
-                "var", lambda _, default=None: {} if default is None else default
-            )
-        else:
-            feature_client = t.cast(base.BaseFeatureFlagsClient, client)
-            ctx["feature_flag"] = feature_client.bool_variation
-            ctx["feature_flag_str"] = feature_client.string_variation
-            ctx["feature_flag_num"] = feature_client.number_variation
-            ctx["feature_flag_json"] = feature_client.json_variation
-        return fn(string, ctx, node, capture_macros, native)
+    if client is _MOCK_CLIENT:
+
+        @wraps(fn)
+        def _wrapped(
+            string: str,
+            ctx: dict[str, t.Any],
+            node: t.Any = None,
+            capture_macros: bool = False,
+            native: bool = False,
+        ) -> t.Any:
+            var = ctx.get("var")
+            if var is None:
+                ctx.update(_MOCK_FALLBACKS)
+            else:
+                ctx["feature_flag"] = ctx["feature_flag_str"] = var
+                ctx["feature_flag_num"] = ctx["feature_flag_json"] = var
+            return fn(string, ctx, node, capture_macros, native)
+
+    elif flag_graph is not None:
+        functions = {
+            name: flag_graph.recorder(variation, getattr(client, variation))
+            for name, variation in index.VARIATIONS.items()
+        }
+        current = flag_graph.current
+
+        @wraps(fn)
+        def _wrapped(
+            string: str,
+            ctx: dict[str, t.Any],
+            node: t.Any = None,
+            capture_macros: bool = False,
+            native: bool = False,
+        ) -> t.Any:
+            ctx.update(functions)
+            if node is None:
+                return fn(string, ctx, node, capture_macros, native)
+            previous = getattr(current, "node", None)
+            current.node = getattr(node, "unique_id", None)
+            try:
+                return fn(string, ctx, node, capture_macros, native)
+            finally:
+                current.node = previous
+
+    else:
+        feature_client = t.cast(base.BaseFeatureFlagsClient, client)
+        functions = {
+            "feature_flag": feature_client.bool_variation,
+            "feature_flag_str": feature_client.string_variation,
+            "feature_flag_num": feature_client.number_variation,
+            "feature_flag_json": feature_client.json_variation,
+        }
+
+        @wraps(fn)
+        def _wrapped(
+            string: str,
+            ctx: dict[str, t.Any],
+            node: t.Any = None,
+            capture_macros: bool = False,
+            native: bool = False,
+        ) -> t.Any:
+            ctx.update(functions)
+            return fn(string, ctx, node, capture_macros, native)
 
     setattr(_wrapped, "status", "patched")
     return _wrapped
 
 
-def _register_shutdown(client: base.BaseFeatureFlagsClient | _MockClient) -> None:
-    if isinstance(client, base.BaseFeatureFlagsClient):
+def _prefetch_flags() -> list[str]:
+    """Boolean flags to bulk evaluate when the client is built (DBT_FF_PREFETCH)."""
+    flags = os.getenv("DBT_FF_PREFETCH", "")
+    return [flag.strip() for flag in flags.split(",") if flag.strip()]
+
+
+def _init_timeout() -> float | None:
+    """Startup deadline in seconds for the provider client (DBT_FF_INIT_TIMEOUT)."""
+    timeout = os.getenv("DBT_FF_INIT_TIMEOUT")
+    return float(timeout) if timeout else None
+
+
+def _register_shutdown(client: AnyClient) -> None:
+    if isinstance(client, (base.BaseFeatureFlagsClient, _LazyClient)):
         atexit.register(client.shutdown)
 
 
 def patch_dbt_environment() -> None:
-    """Patch dbt's jinja environment to include feature flag functions."""
+    """Patch dbt's jinja environment to include feature flag functions.
+
+    The provider client itself is only built on the first feature flag call,
+    unless DBT_FF_INIT_TIMEOUT is set, in which case it is built in the
+    background right away and evaluations wait for it at most that long.
+    """
     from dbt.clients import jinja
 
-    client = _get_client()
+    client: AnyClient = _MOCK_CLIENT
+    flag_graph = None
+    if _get_provider() is not None:
+        timeout = _init_timeout()
+        client = _LazyClient(_get_client, prefetch=_prefetch_flags(), timeout=timeout)
+        if timeout is not None:
+            client.start()
+        if _is_truthy(os.getenv("DBT_FF_GRAPH", "1")):
+            flag_graph = graph.FlagGraph()
     original_get_rendered = getattr(jinja, "_get_rendered", jinja.get_rendered)
     setattr(jinja, "_get_rendered", original_get_rendered)
-    setattr(jinja, "get_rendered", get_rendered(original_get_rendered, client))
+    setattr(
+        jinja, "get_rendered", get_rendered(original_get_rendered, client, flag_graph)
+    )
     _register_shutdown(client)
+    if flag_graph is not None:
+        atexit.register(flag_graph.write)
 
 
 if __name__ == "__main__":
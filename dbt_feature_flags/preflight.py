@@ -15,16 +15,31 @@
 """Preflight check for dbt feature flag cache invalidation.
 
 Compares current flag states against the states from the previous dbt run.
-If any config-layer flags have changed, deletes target/partial_parse.msgpack
-to force dbt to re-parse all models — ensuring config(enabled=feature_flag(...))
-blocks are re-evaluated with the latest flag values.
+If any config-layer flags have changed, the files referencing them are marked
+as modified in target/partial_parse.msgpack (or the file is deleted to force a
+full re-parse when they cannot be determined) — ensuring
+config(enabled=feature_flag(...)) blocks are re-evaluated with the latest
+flag values.
 
 If nothing has changed, partial parsing proceeds normally with no performance cost.
+When the provider reports the same state version (see
+BaseFeatureFlagsClient.state_version) as the last completed check, preflight
+returns right after building the client, without scanning the project,
+evaluating flags or writing files.
+
+Each persisted state carries the provider's evaluation reason. A flag the
+provider could not evaluate (SDK not ready, startup deadline missed) is served
+its default; that is not a flag flip, so its previous state is kept and it does
+not trigger a re-parse.
 
 Usage (CLI):
-    dbt-ff-preflight --flags enable_new_mart enable_experimental_model
+    dbt-ff-preflight --flags enable_new_mart enable_experimental_model model_mat:str
     dbt run --profiles-dir .
 
+Without --flags, the config-layer flags are discovered from the project's
+static flag reference index (see dbt_feature_flags.index):
+    dbt-ff-preflight --project-dir .
+
 Usage (Python):
     from dbt_feature_flags.preflight import run
     run(flags=["enable_new_mart"], target_dir="target")
@@ -33,28 +48,55 @@ Usage (Python):
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
+import os
 import pathlib
 import typing as t
 
-from dbt_feature_flags.base import BaseFeatureFlagsClient
+from dbt_feature_flags.base import UNAVAILABLE_REASON, BaseFeatureFlagsClient, Variation
+from dbt_feature_flags.index import FlagIndex, build_index
+from dbt_feature_flags.partial_parse import invalidate_files
+
+# Project level files are not tracked per file in dbt's partial parse manifest,
+# and schema files re-parse only the entries whose YAML text changed, which it
+# does not when just a flag value did
+YAML_SUFFIXES = (".yml", ".yaml")
 
+STATE_FILE = ".fme_flag_state.json"
+VERSION_FILE = ".fme_flag_state.version"
 
-def run(flags: list[str], target_dir: str = "target") -> None:
+
+def run(
+    flags: list[str] | dict[str, Variation] | None = None,
+    target_dir: str = "target",
+    project_dir: str = ".",
+    selective: bool = True,
+) -> None:
     """Check if any config-layer feature flags have changed since the last run.
 
-    If a change is detected, deletes partial_parse.msgpack so dbt performs
-    a full re-parse on the next run. Persists the current flag states to
-    a cache file for comparison on the next invocation.
+    If a change is detected, marks the files referencing the changed flags as
+    modified in partial_parse.msgpack so dbt re-parses only those, or deletes it
+    so dbt performs a full re-parse when that is not possible. Persists the
+    current flag states to a cache file for comparison on the next invocation.
+    Returns early, without scanning, evaluating or writing, when the provider's
+    state version matches the one stored by the last completed check.
 
-    :param flags: List of flag names that are used in model config() blocks
-                  or dbt_project.yml +enabled directives.
+    :param flags: Flag names that are used in model config() blocks or
+                  dbt_project.yml +enabled directives, either as a list of
+                  boolean flags or mapped to their variation. When omitted,
+                  they are read from the project's flag reference index.
     :param target_dir: Path to the dbt target directory (default: "target").
+    :param project_dir: Path to the dbt project, used to build the flag
+                        reference index (default: ".").
+    :param selective: Invalidate only files referencing changed flags instead of
+                      deleting the partial parse cache (default: True).
     """
     from dbt_feature_flags.patch import _get_client, _MOCK_CLIENT
 
     target = pathlib.Path(target_dir)
-    cache_file = target / ".fme_flag_state.json"
+    cache_file = target / STATE_FILE
+    version_file = target / VERSION_FILE
     partial_parse = target / "partial_parse.msgpack"
 
     client = _get_client()
@@ -64,28 +106,175 @@ def run(flags: list[str], target_dir: str = "target") -> None:
         return
 
     feature_client = t.cast(BaseFeatureFlagsClient, client)
-    current = {flag: feature_client.bool_variation(flag, False) for flag in flags}
+    version = feature_client.state_version()
+    if version is not None and _read_version(version_file) == version:
+        feature_client.shutdown()
+        print("[dbt-ff] Flag state version unchanged — partial parse OK")
+        return
+
+    index: FlagIndex | None = None
+    if flags is None:
+        index = build_index(project_dir=project_dir, target_dir=target_dir)
+        flags = index.flags(config_only=True)
+        print(f"[dbt-ff] Found {len(flags)} config-layer flag(s) in the project index")
+    elif not isinstance(flags, dict):
+        flags = dict.fromkeys(flags, t.cast(Variation, "bool_variation"))
+
+    current = evaluate_state(feature_client, flags)
     feature_client.shutdown()
+    if any(state.get("reason") == UNAVAILABLE_REASON for state in current.values()):
+        # Not a complete picture of this version, check again next run
+        version = None
 
     # Compare to previous run
-    previous = json.loads(cache_file.read_text()) if cache_file.exists() else {}
-    changed = {
-        f: (previous.get(f, None), v)
-        for f, v in current.items()
-        if v != previous.get(f)
-    }
+    previous = load_state(cache_file)
+    changed = {}
+    for flag, state in current.items():
+        before = previous.get(flag)
+        if not _changed(before, state):
+            continue
+        if before is not None and state.get("reason") == UNAVAILABLE_REASON:
+            print(f"[dbt-ff] {flag}: provider unavailable, keeping {_display(before)}")
+            current[flag] = before
+            continue
+        changed[flag] = (before, state)
 
     if changed:
-        print("[dbt-ff] Flag state changed — forcing full re-parse")
+        print("[dbt-ff] Flag state changed")
         for flag, (before, after) in changed.items():
-            print(f"[dbt-ff]   {flag}: {before} -> {after}")
-        partial_parse.unlink(missing_ok=True)
+            print(f"[dbt-ff]   {flag}: {_display(before)} -> {_display(after)}")
+        if partial_parse.exists():
+            if selective and index is None:
+                index = build_index(project_dir=project_dir, target_dir=target_dir)
+            _invalidate(partial_parse, set(changed), index if selective else None)
     else:
         print("[dbt-ff] Flag state unchanged — partial parse OK")
 
     # Persist current state for next run
     target.mkdir(exist_ok=True)
-    cache_file.write_text(json.dumps(current, indent=2))
+    cache_file.write_text(json.dumps(current, separators=(",", ":")))
+    if version is not None:
+        version_file.write_text(version)
+    else:
+        version_file.unlink(missing_ok=True)
+
+
+def _read_version(version_file: pathlib.Path) -> str | None:
+    try:
+        return version_file.read_text()
+    except OSError:
+        return None
+
+
+FlagState = dict[str, t.Any]
+
+
+def fingerprint(variation: Variation, value: t.Any) -> FlagState:
+    """Return the persisted state of an evaluated flag.
+
+    Values are identified by a stable content hash so JSON payloads do not have
+    to be stored in full; scalar values are kept alongside for readable output.
+    """
+    encoded = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    state: FlagState = {
+        "kind": variation,
+        "hash": hashlib.sha256(encoded.encode()).hexdigest()[:16],
+    }
+    if not isinstance(value, (dict, list)) and len(encoded) <= 64:
+        state["value"] = value
+    return state
+
+
+def evaluate_state(
+    client: BaseFeatureFlagsClient, flags: dict[str, Variation]
+) -> dict[str, FlagState]:
+    """Evaluate flags with one bulk call per variation type.
+
+    States include the reason the provider recorded for the evaluation, if any.
+    """
+    by_variation: dict[Variation, list[str]] = {}
+    for flag, variation in flags.items():
+        by_variation.setdefault(variation, []).append(flag)
+    current = {}
+    for variation, names in by_variation.items():
+        for flag, value in client.bulk_evaluate(names, variation).items():
+            current[flag] = fingerprint(variation, value)
+            if flag in client.reasons:
+                current[flag]["reason"] = client.reasons[flag]
+    return {flag: current[flag] for flag in flags}
+
+
+def load_state(cache_file: pathlib.Path) -> dict[str, FlagState]:
+    """Read the previous flag states, upgrading boolean-only state files."""
+    if not cache_file.exists():
+        return {}
+    return {
+        flag: state if isinstance(state, dict) else fingerprint("bool_variation", state)
+        for flag, state in json.loads(cache_file.read_text()).items()
+    }
+
+
+def _changed(before: FlagState | None, after: FlagState) -> bool:
+    return before is None or (before["kind"], before["hash"]) != (
+        after["kind"],
+        after["hash"],
+    )
+
+
+def _display(state: FlagState | None) -> str:
+    if state is None:
+        return "None"
+    return repr(state["value"]) if "value" in state else f"<{state['hash']}>"
+
+
+def _invalidate(
+    partial_parse: pathlib.Path, changed: set[str], index: FlagIndex | None
+) -> None:
+    """Invalidate only the files referencing changed flags, else the whole cache.
+
+    Falls back to a full re-parse when no index is given, when a changed flag is
+    not referenced by any indexed file (e.g. a dynamically built flag name) or
+    is referenced from a YAML file: dbt does not track dbt_project.yml and
+    profiles.yml per file, and does not re-parse unchanged schema file entries.
+    """
+    files = set()
+    if index is not None:
+        referenced = set()
+        for ref in index.references():
+            if ref.flag in changed:
+                referenced.add(ref.flag)
+                files.add(ref.path)
+        if referenced != changed or any(path.endswith(YAML_SUFFIXES) for path in files):
+            files = set()
+    if files:
+        try:
+            found = invalidate_files(partial_parse, files)
+        except ValueError as exc:
+            print(f"[dbt-ff] {exc}")
+        else:
+            if found:
+                print(f"[dbt-ff] Invalidated {len(found)} file(s) — partial re-parse")
+                return
+    print("[dbt-ff] Forcing full re-parse")
+    partial_parse.unlink(missing_ok=True)
+
+
+_KINDS: dict[str, Variation] = {
+    "bool": "bool_variation",
+    "str": "string_variation",
+    "num": "number_variation",
+    "json": "json_variation",
+}
+
+
+def _parse_flag_args(values: list[str]) -> dict[str, Variation]:
+    flags: dict[str, Variation] = {}
+    for value in values:
+        flag, _, kind = value.rpartition(":")
+        if not flag or kind not in _KINDS:
+            flag, kind = value, "bool"
+        flags[flag] = _KINDS[kind]
+    return flags
 
 
 def cli() -> None:
@@ -99,9 +288,18 @@ def cli() -> None:
     parser.add_argument(
         "--flags",
         nargs="+",
-        required=True,
         metavar="FLAG",
-        help="Flag names used in model config() blocks or dbt_project.yml +enabled.",
+        help=(
+            "Flag names used in model config() blocks or dbt_project.yml +enabled, "
+            "optionally suffixed with :str, :num or :json for non-boolean flags. "
+            "Defaults to the flags found by scanning the project."
+        ),
+    )
+    parser.add_argument(
+        "--project-dir",
+        default=".",
+        metavar="DIR",
+        help="Path to the dbt project to scan when --flags is omitted (default: .).",
     )
     parser.add_argument(
         "--target-dir",
@@ -109,8 +307,18 @@ def cli() -> None:
         metavar="DIR",
         help="Path to the dbt target directory (default: target).",
     )
+    parser.add_argument(
+        "--full-reparse",
+        action="store_true",
+        help="Delete partial_parse.msgpack on change instead of invalidating files.",
+    )
     args = parser.parse_args()
-    run(flags=args.flags, target_dir=args.target_dir)
+    run(
+        flags=_parse_flag_args(args.flags) if args.flags else None,
+        target_dir=args.target_dir,
+        project_dir=args.project_dir,
+        selective=not args.full_reparse,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,221 @@
+# Copyright 2022 Alex Butler
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Select the dbt nodes affected by flag changes, for minimal rebuilds.
+
+Compares current flag values with the values each node was last successfully
+built with, as recorded in the flag dependency graph (see
+dbt_feature_flags.graph), and prints a dbt selection of the nodes that saw a changed flag plus everything
+downstream of them. Node unique_ids are turned into fqn selectors through
+target/manifest.json, or into bare node names when there is no manifest.
+
+Flags are re-evaluated with the default each node passed, so flags unknown to
+the provider compare equal. Flags the provider could not evaluate are treated
+as unchanged. Nodes never built since they started using a flag are always
+selected.
+
+Usage (CLI):
+    dbt-ff-preflight --project-dir .
+    dbt build --select "$(dbt-ff-select)"
+
+Nothing is printed when no flag changed; check for empty output, an empty
+--select builds the whole project. --output yaml prints a selectors.yml
+definition instead.
+"""
+
+from __future__ import annotations
+
+import argparse
+from importlib import import_module
+import json
+import os
+import pathlib
+import sys
+import typing as t
+
+from dbt_feature_flags.base import (
+    _MISSING,
+    UNAVAILABLE_REASON,
+    BaseFeatureFlagsClient,
+    Variation,
+)
+from dbt_feature_flags.graph import (
+    GRAPH_FILE,
+    default_graph_path,
+    load_built,
+    load_graph,
+)
+from dbt_feature_flags.preflight import FlagState, _changed, fingerprint
+
+SELECTOR_NAME = "dbt_ff_changed"
+
+
+def changed_nodes(
+    client: BaseFeatureFlagsClient,
+    nodes: dict[str, dict[str, FlagState]],
+    built: dict[str, dict[str, FlagState]],
+) -> set[str]:
+    """Return the unique_ids of nodes built with a flag value that changed.
+
+    :param nodes: The flags each node was last rendered with.
+    :param built: The flags each node was last built with. Nodes rendered with
+                  a flag they were never built with are changed.
+
+    Flags are evaluated in bulk, once per variation and default they are used
+    with.
+    """
+    unbuilt = {
+        node
+        for node, node_flags in nodes.items()
+        if not node_flags.keys() <= built.get(node, {}).keys()
+    }
+    baselines = {node: built[node] for node in nodes.keys() - unbuilt}
+    groups: dict[tuple[Variation, str], set[str]] = {}
+    for node_flags in baselines.values():
+        for flag, state in node_flags.items():
+            groups.setdefault(_group(state), set()).add(flag)
+    current: dict[tuple[str, tuple[Variation, str]], FlagState] = {}
+    for group, flags in groups.items():
+        variation, default = group
+        values = client.bulk_evaluate(
+            sorted(flags),
+            variation,
+            _MISSING if default == "" else json.loads(default),
+        )
+        for flag, value in values.items():
+            state = current[(flag, group)] = fingerprint(variation, value)
+            if flag in client.reasons:
+                state["reason"] = client.reasons[flag]
+
+    def _differs(flag: str, before: FlagState) -> bool:
+        after = current[(flag, _group(before))]
+        return after.get("reason") != UNAVAILABLE_REASON and _changed(before, after)
+
+    return unbuilt | {
+        node
+        for node, node_flags in baselines.items()
+        if any(_differs(flag, state) for flag, state in node_flags.items())
+    }
+
+
+def _group(state: FlagState) -> tuple[Variation, str]:
+    default = json.dumps(state["default"], sort_keys=True) if "default" in state else ""
+    return state["kind"], default
+
+
+def node_selectors(unique_ids: t.Iterable[str], manifest: pathlib.Path) -> list[str]:
+    """Map unique_ids to dbt selectors, by fqn when the manifest has the node."""
+    try:
+        manifest_nodes = json.loads(manifest.read_text()).get("nodes", {})
+    except (OSError, ValueError):
+        manifest_nodes = {}
+    selectors = set()
+    for unique_id in unique_ids:
+        node = manifest_nodes.get(unique_id)
+        if node is not None and node.get("fqn"):
+            selectors.add("fqn:" + ".".join(node["fqn"]))
+        else:
+            # resource_type.package.name[.version or test hash]
+            selectors.add(unique_id.split(".")[2])
+    return sorted(selectors)
+
+
+def format_selection(selectors: list[str], output: str = "select") -> str:
+    """Render selectors, with their children, as a --select argument or YAML."""
+    if not selectors:
+        return ""
+    if output == "select":
+        return " ".join(selector + "+" for selector in selectors)
+    union = []
+    for selector in selectors:
+        method, _, value = selector.rpartition(":")
+        union.append({"method": method or "fqn", "value": value, "children": True})
+    return import_module("yaml").safe_dump(
+        {"selectors": [{"name": SELECTOR_NAME, "definition": {"union": union}}]},
+        sort_keys=False,
+    )
+
+
+def run(
+    target_dir: str = "target",
+    graph_path: pathlib.Path | None = None,
+    output: str = "select",
+) -> str:
+    """Return the selection of nodes affected by changed flags.
+
+    :param target_dir: Path to the dbt target directory holding manifest.json.
+    :param graph_path: Flag dependency graph, see graph.default_graph_path().
+    :param output: "select" for a --select argument, "yaml" for selectors.yml.
+    :raises RuntimeError: If no flag dependency graph has been recorded yet.
+    """
+    from dbt_feature_flags.patch import _get_client, _MOCK_CLIENT
+
+    graph_path = graph_path or default_graph_path()
+    nodes = load_graph(graph_path)
+    if not nodes:
+        raise RuntimeError(
+            f"No flag dependency graph at {graph_path}, run dbt with a provider first"
+        )
+
+    client = _get_client()
+    if client is _MOCK_CLIENT:
+        print("[dbt-ff] Running in mock mode — no flag changes.", file=sys.stderr)
+        return ""
+
+    feature_client = t.cast(BaseFeatureFlagsClient, client)
+    changed = changed_nodes(feature_client, nodes, load_built(graph_path))
+    feature_client.shutdown()
+
+    print(
+        f"[dbt-ff] {len(changed)} of {len(nodes)} flag-dependent node(s) changed",
+        file=sys.stderr,
+    )
+    selectors = node_selectors(changed, pathlib.Path(target_dir, "manifest.json"))
+    return format_selection(selectors, output)
+
+
+def cli() -> None:
+    """Entry point for the dbt-ff-select CLI command."""
+    parser = argparse.ArgumentParser(
+        description=(
+            "Print a dbt selection of the nodes whose feature flags changed since "
+            "they were last built, plus their downstream dependents."
+        )
+    )
+    parser.add_argument(
+        "--target-dir",
+        default=os.getenv("DBT_TARGET_PATH", "target"),
+        metavar="DIR",
+        help="Path to the dbt target directory (default: target).",
+    )
+    parser.add_argument(
+        "--output",
+        choices=("select", "yaml"),
+        default="select",
+        help="A --select argument (default) or a selectors.yml definition.",
+    )
+    args = parser.parse_args()
+    graph_path = os.getenv("DBT_FF_GRAPH_PATH") or os.path.join(
+        args.target_dir, GRAPH_FILE
+    )
+    try:
+        selection = run(args.target_dir, pathlib.Path(graph_path), args.output)
+    except RuntimeError as exc:
+        parser.exit(1, f"[dbt-ff] {exc}\n")
+    if selection:
+        print(selection.rstrip("\n"))
+
+
+if __name__ == "__main__":
+    cli()
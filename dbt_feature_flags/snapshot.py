@@ -0,0 +1,195 @@
+# Copyright 2022 Alex Butler
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Snapshot provider serving flag values persisted by a previous dbt run.
+
+Wraps one of the network providers. Evaluated values are written to a compact
+JSON file in the dbt target directory at exit, and later runs are served from
+that file without constructing the upstream SDK client. Once the snapshot is
+older than its TTL it keeps being served while a background thread refreshes
+it from the upstream provider for the next run.
+
+Required env var: DBT_FF_SNAPSHOT_PROVIDER  (harness, fme or launchdarkly)
+Optional env var: DBT_FF_SNAPSHOT_PATH      (default: $DBT_TARGET_PATH/.dbt_ff_snapshot.json)
+Optional env var: DBT_FF_SNAPSHOT_TTL       (seconds, default: 300)
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import threading
+import time
+import typing as t
+
+from dbt_feature_flags.base import UNAVAILABLE_REASON, JSONValue, BaseFeatureFlagsClient
+
+SNAPSHOT_VERSION = 1
+DEFAULT_TTL = 300.0
+
+SnapshotKey = tuple[str, str, str]
+
+
+def default_snapshot_path() -> pathlib.Path:
+    target_dir = os.getenv("DBT_TARGET_PATH", "target")
+    return pathlib.Path(target_dir) / ".dbt_ff_snapshot.json"
+
+
+def _key(variation: str, flag: str, default: t.Any) -> SnapshotKey:
+    # Defaults may hold non-JSON leaves, e.g. a date from a YAML var; they are
+    # stored as strings and key the same once read back
+    return (variation, flag, json.dumps(default, sort_keys=True, default=str))
+
+
+class SnapshotFeatureFlagsClient(BaseFeatureFlagsClient):
+    def __init__(
+        self,
+        upstream: t.Callable[[], BaseFeatureFlagsClient],
+        provider: str,
+        path: pathlib.Path | None = None,
+        ttl: float | None = None,
+    ) -> None:
+        self._upstream_factory = upstream
+        self._upstream: BaseFeatureFlagsClient | None = None
+        self._upstream_lock = threading.Lock()
+        self._refresh_thread: threading.Thread | None = None
+        self._refreshed: dict[SnapshotKey, t.Any] | None = None
+        self._recorded: dict[SnapshotKey, t.Any] = {}
+
+        self.path = path or pathlib.Path(
+            os.getenv("DBT_FF_SNAPSHOT_PATH") or default_snapshot_path()
+        )
+        self.ttl = (
+            ttl
+            if ttl is not None
+            else float(os.getenv("DBT_FF_SNAPSHOT_TTL", DEFAULT_TTL))
+        )
+        self.provenance = {
+            "provider": provider,
+            "target": os.getenv("DBT_TARGET", "default"),
+        }
+        self.created_at, self._values = self._load()
+
+        if self._values and self.is_stale():
+            self._refresh_thread = threading.Thread(
+                target=self._refresh, name="dbt-ff-snapshot-refresh", daemon=True
+            )
+            self._refresh_thread.start()
+        super().__init__()
+
+    def _load(self) -> tuple[float, dict[SnapshotKey, t.Any]]:
+        """Read the snapshot, ignoring unreadable or foreign (provider/target) files."""
+        try:
+            payload = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return 0.0, {}
+        meta = payload.get("meta", {})
+        if meta.get("version") != SNAPSHOT_VERSION or any(
+            meta.get(k) != v for k, v in self.provenance.items()
+        ):
+            return 0.0, {}
+        values = {
+            _key(variation, flag, default): value
+            for variation, flag, default, value in payload.get("values", [])
+        }
+        return float(meta.get("created_at", 0.0)), values
+
+    def is_stale(self) -> bool:
+        return time.time() - self.created_at > self.ttl
+
+    def _get_upstream(self) -> BaseFeatureFlagsClient:
+        if self._upstream is None:
+            with self._upstream_lock:
+                if self._upstream is None:
+                    self._upstream = self._upstream_factory()
+        return self._upstream
+
+    def _refresh(self) -> None:
+        try:
+            upstream = self._get_upstream()
+            self._refreshed = {
+                key: getattr(upstream, key[0])(key[1], json.loads(key[2]))
+                for key in self._values
+            }
+        except Exception:
+            self.logger.exception("Failed to refresh feature flag snapshot")
+
+    def _evaluate(self, variation: str, flag: str, default: t.Any) -> t.Any:
+        key = _key(variation, flag, default)
+        if key in self._values:
+            self.reasons[flag] = "snapshot"
+            return self._values[key]
+        try:
+            upstream = self._get_upstream()
+            value = getattr(upstream, variation)(flag, default)
+        except Exception:
+            self.logger.exception(
+                "Feature flag %s is not in the snapshot and the upstream provider "
+                "is unavailable, serving the default",
+                flag,
+            )
+            self.reasons[flag] = UNAVAILABLE_REASON
+            return {} if default is None and variation == "json_variation" else default
+        self.reasons[flag] = upstream.reasons.get(flag, "upstream")
+        self._recorded[key] = value
+        return value
+
+    def write(self) -> None:
+        """Persist the snapshot if this run produced new or refreshed values."""
+        if self._refreshed is None and not self._recorded:
+            return
+        created_at = self.created_at
+        values = dict(self._values)
+        if self._refreshed is not None or not values:
+            created_at = time.time()
+            values.update(self._refreshed or {})
+        values.update(self._recorded)
+        payload = {
+            "meta": {
+                "version": SNAPSHOT_VERSION,
+                "created_at": created_at,
+                **self.provenance,
+            },
+            "values": [
+                [variation, flag, json.loads(default), value]
+                for (variation, flag, default), value in values.items()
+            ],
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(payload, separators=(",", ":"), default=str))
+        os.replace(tmp, self.path)
+
+    def shutdown(self) -> None:
+        if self._refresh_thread is not None:
+            self._refresh_thread.join(timeout=10)
+        try:
+            self.write()
+        except OSError:
+            self.logger.exception("Failed to write feature flag snapshot")
+        if self._upstream is not None:
+            self._upstream.shutdown()
+
+    def bool_variation(self, flag: str, default: bool = False) -> bool:
+        return self._evaluate("bool_variation", flag, default)
+
+    def string_variation(self, flag: str, default: str = "") -> str:
+        return self._evaluate("string_variation", flag, default)
+
+    def number_variation(self, flag: str, default: float | int = 0) -> float | int:
+        return self._evaluate("number_variation", flag, default)
+
+    def json_variation(self, flag: str, default: JSONValue | None = None) -> JSONValue:
+        return self._evaluate("json_variation", flag, default)
@@ -0,0 +1,259 @@
+# Copyright 2022 Alex Butler
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Opt-in evaluation telemetry.
+
+With DBT_FF_TELEMETRY set, every provider client is instrumented to record
+per-flag and per-variation call counts, cache hits, provider (SDK) latency
+histograms and the time spent building the client. The report is written to
+$DBT_TARGET_PATH/.dbt_ff_telemetry.json at exit. With DBT_FF_TELEMETRY=otel,
+provider initialization and SDK calls are additionally exported as
+OpenTelemetry spans (requires opentelemetry-api and a configured tracer
+provider).
+
+When DBT_FF_TELEMETRY is unset, clients are not instrumented at all, so
+evaluation runs exactly the same code as without this module.
+
+Optional env var: DBT_FF_TELEMETRY         (1/true or otel)
+Optional env var: DBT_FF_TELEMETRY_PATH    (default: $DBT_TARGET_PATH/.dbt_ff_telemetry.json)
+"""
+
+from __future__ import annotations
+
+import atexit
+import bisect
+import contextlib
+import datetime
+import json
+import os
+import pathlib
+import threading
+import time
+import typing as t
+from functools import wraps
+from importlib import import_module
+
+REPORT_VERSION = 1
+REPORT_FILE = ".dbt_ff_telemetry.json"
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (0.01, 0.1, 1.0, 10.0, 100.0, 1000.0, 10000.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram, in milliseconds."""
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def to_dict(self) -> dict[str, t.Any]:
+        count = sum(self.counts)
+        bounds = [f"le_{bound:g}" for bound in LATENCY_BUCKETS_MS] + ["inf"]
+        return {
+            "count": count,
+            "sum_ms": self.total,
+            "mean_ms": self.total / count if count else 0.0,
+            "max_ms": self.max,
+            "buckets": dict(zip(bounds, self.counts)),
+        }
+
+
+class Recorder:
+    """Collects evaluation telemetry for one dbt invocation."""
+
+    def __init__(self, path: pathlib.Path, tracer: t.Any = None) -> None:
+        self.path = path
+        self.tracer = tracer
+        self._lock = threading.Lock()
+        # flag -> variation -> [calls, cache hits, provider calls]
+        self._flags: dict[str, dict[str, list[int]]] = {}
+        self._latency: dict[str, Histogram] = {}
+        self._init: dict[str, float] = {}
+        self._caches: list[tuple[str, t.Any]] = []
+
+    def _counts(self, flag: str, variation: str) -> list[int]:
+        per_flag = self._flags.get(flag)
+        if per_flag is None:
+            per_flag = self._flags.setdefault(flag, {})
+        counts = per_flag.get(variation)
+        if counts is None:
+            counts = per_flag.setdefault(variation, [0, 0, 0])
+        return counts
+
+    def _observe(self, name: str, started: float) -> None:
+        ms = (time.perf_counter() - started) * 1000
+        histogram = self._latency.get(name)
+        if histogram is None:
+            histogram = self._latency.setdefault(name, Histogram())
+        histogram.observe(ms)
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes: t.Any) -> t.Iterator[None]:
+        if self.tracer is None:
+            yield
+            return
+        with self.tracer.start_as_current_span(f"dbt_ff.{name}", attributes=attributes):
+            yield
+
+    def record_init(self, provider: str, seconds: float) -> None:
+        with self._lock:
+            self._init[provider] = self._init.get(provider, 0.0) + seconds
+
+    def instrument(self, client: t.Any) -> None:
+        """Wrap a client's (already memoized) variations and its bulk evaluation.
+
+        Calls and cache hits are counted on the outer, cached method; provider
+        calls and their latency by time_provider() and on bulk evaluation.
+        """
+        name = type(client).__name__
+        self._caches.append((name, client.cache))
+        for variation in (
+            "bool_variation",
+            "string_variation",
+            "number_variation",
+            "json_variation",
+        ):
+            setattr(
+                client, variation, self._count(variation, getattr(client, variation))
+            )
+        client._bulk_variation = self._time_bulk(client._bulk_variation)
+
+    def time_provider(self, func: t.Any) -> t.Any:
+        """Wrap a raw provider method to record provider calls and their latency."""
+        variation = func.__name__
+        default_value = func.__defaults__[0] if func.__defaults__ else None
+
+        @wraps(func)
+        def _timed(flag: str, default: t.Any = default_value) -> t.Any:
+            with self.span(variation, flag=flag):
+                started = time.perf_counter()
+                try:
+                    return func(flag, default)
+                finally:
+                    with self._lock:
+                        self._counts(flag, variation)[2] += 1
+                        self._observe(variation, started)
+
+        return _timed
+
+    def _count(self, variation: str, func: t.Any) -> t.Any:
+        default_value = func.__defaults__[0] if func.__defaults__ else None
+
+        is_cached = func.is_cached
+
+        @wraps(func)
+        def _counted(flag: str, default: t.Any = default_value) -> t.Any:
+            hit = is_cached(flag, default)
+            with self._lock:
+                counts = self._counts(flag, variation)
+                counts[0] += 1
+                counts[1] += hit
+            return func(flag, default)
+
+        for attribute in ("is_cached", "prime"):
+            setattr(_counted, attribute, getattr(func, attribute))
+        return _counted
+
+    def _time_bulk(self, func: t.Any) -> t.Any:
+        @wraps(func)
+        def _timed(variation: str, flags: list[str], default: t.Any) -> t.Any:
+            with self.span("bulk_evaluate", variation=variation, flags=len(flags)):
+                started = time.perf_counter()
+                try:
+                    return func(variation, flags, default)
+                finally:
+                    with self._lock:
+                        for flag in flags:
+                            self._counts(flag, variation)[2] += 1
+                        self._observe(f"bulk:{variation}", started)
+
+        return _timed
+
+    def report(self) -> dict[str, t.Any]:
+        with self._lock:
+            flags = {
+                flag: {
+                    variation: {
+                        "calls": calls,
+                        "cache_hits": hits,
+                        "provider_calls": provider_calls,
+                    }
+                    for variation, (calls, hits, provider_calls) in per_flag.items()
+                }
+                for flag, per_flag in sorted(self._flags.items())
+            }
+            return {
+                "version": REPORT_VERSION,
+                "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "init_s": dict(self._init),
+                "flags": flags,
+                "provider_latency": {
+                    name: histogram.to_dict()
+                    for name, histogram in sorted(self._latency.items())
+                },
+                "caches": {name: cache.stats() for name, cache in self._caches},
+            }
+
+    def write(self) -> None:
+        """Write the report; never fail the dbt invocation over telemetry."""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(json.dumps(self.report(), indent=2))
+        except OSError:
+            pass
+
+
+_RECORDER: Recorder | None = None
+_RECORDER_LOCK = threading.Lock()
+
+
+def _tracer() -> t.Any:
+    try:
+        trace = import_module("opentelemetry.trace")
+    except ImportError as exc:
+        raise RuntimeError(
+            "DBT_FF_TELEMETRY=otel requires the opentelemetry-api package"
+        ) from exc
+    return trace.get_tracer("dbt_feature_flags")
+
+
+def get_recorder() -> Recorder | None:
+    """Return the process-wide recorder, or None when telemetry is disabled.
+
+    The first call with DBT_FF_TELEMETRY set creates the recorder and registers
+    the report to be written at exit.
+    """
+    global _RECORDER
+    mode = os.getenv("DBT_FF_TELEMETRY", "").lower()
+    if mode not in ("1", "true", "yes", "otel"):
+        return None
+    if _RECORDER is None:
+        with _RECORDER_LOCK:
+            if _RECORDER is None:
+                path = os.getenv("DBT_FF_TELEMETRY_PATH") or os.path.join(
+                    os.getenv("DBT_TARGET_PATH", "target"), REPORT_FILE
+                )
+                recorder = Recorder(
+                    pathlib.Path(path), _tracer() if mode == "otel" else None
+                )
+                atexit.register(recorder.write)
+                _RECORDER = recorder
+    return _RECORDER
@@ -1,6 +1,8 @@
 import json
+import os
 import pathlib
-from types import SimpleNamespace
+import sys
+from types import ModuleType, SimpleNamespace
 import typing as t
 
 import pytest
@@ -8,6 +10,7 @@ import pytest
 from dbt_feature_flags.base import JSONValue, BaseFeatureFlagsClient
 from dbt_feature_flags.patch import _MOCK_CLIENT, _get_client, _is_truthy
 from dbt_feature_flags.patch import patch_dbt_environment
+from dbt_feature_flags.preflight import fingerprint
 
 patch_dbt_environment()
 
@@ -88,6 +91,103 @@ def test_mock_feature_flag_rendering(
     assert get_rendered(template, generate_base_context(context)) == expected
 
 
+def test_get_rendered_injects_prebuilt_flag_functions() -> None:
+    from dbt_feature_flags.patch import get_rendered
+
+    contexts: list[dict[str, t.Any]] = []
+    client = FakeClient({"flag": True})
+    rendered = get_rendered(lambda _, ctx, *args: contexts.append(ctx), client)
+
+    rendered("a", {})
+    rendered("b", {})
+
+    assert contexts[0]["feature_flag"] is contexts[1]["feature_flag"]
+    assert contexts[0]["feature_flag"]("flag") is True
+
+
+def test_get_rendered_records_flags_per_node(tmp_path: pathlib.Path) -> None:
+    from dbt_feature_flags.graph import FlagGraph, dependents, load_graph
+    from dbt_feature_flags.patch import get_rendered
+
+    flag_graph = FlagGraph(tmp_path / "graph.json")
+    client = FakeClient({"a": True})
+    rendered: t.Callable[..., t.Any]
+
+    def render(string: str, ctx: dict[str, t.Any], *args: t.Any) -> None:
+        ctx["feature_flag"](string)
+        if string == "a":
+            rendered("b", {}, SimpleNamespace(unique_id="test.p.nested"))
+            ctx["feature_flag"](flag="after_nested")
+
+    rendered = get_rendered(render, client, flag_graph)
+    rendered("a", {}, SimpleNamespace(unique_id="model.p.a"))
+    rendered("contextless", {})
+
+    nodes = flag_graph.nodes()
+    assert nodes == {
+        "model.p.a": {
+            "a": fingerprint("bool_variation", True),
+            "after_nested": fingerprint("bool_variation", False),
+        },
+        "test.p.nested": {"b": fingerprint("bool_variation", False)},
+    }
+
+    flag_graph.write()
+    FlagGraph(flag_graph.path).write()  # nothing recorded, artifact untouched
+    second = FlagGraph(flag_graph.path)
+    get_rendered(render, client, second)(
+        "b", {}, SimpleNamespace(unique_id="model.p.b")
+    )
+    second.write()
+
+    assert load_graph(flag_graph.path) == {
+        **nodes,
+        "model.p.b": {"b": fingerprint("bool_variation", False)},
+    }
+    assert json.loads(flag_graph.path.read_text())["flags"]["b"] == [
+        "model.p.b",
+        "test.p.nested",
+    ]
+    assert dependents(load_graph(flag_graph.path), ["a", "missing"]) == {"model.p.a"}
+
+
+def test_flag_graph_writes_defaults_with_non_json_values(
+    tmp_path: pathlib.Path,
+) -> None:
+    import datetime
+
+    from dbt_feature_flags.graph import FlagGraph, load_graph
+    from dbt_feature_flags.patch import get_rendered
+
+    flag_graph = FlagGraph(tmp_path / "graph.json")
+    default = {"since": datetime.date(2024, 1, 1)}
+
+    def render(string: str, ctx: dict[str, t.Any], *args: t.Any) -> None:
+        ctx["feature_flag_json"](string, default=default)
+
+    rendered = get_rendered(render, StaticClient(), flag_graph)
+    rendered("cfg", {}, SimpleNamespace(unique_id="model.p.a"))
+    flag_graph.write()
+
+    state = load_graph(flag_graph.path)["model.p.a"]["cfg"]
+    assert state["default"] == {"since": "2024-01-01"}
+    assert state["hash"] == fingerprint("json_variation", default)["hash"]
+
+
+def test_get_rendered_mock_falls_back_without_var() -> None:
+    from dbt_feature_flags.patch import get_rendered
+
+    contexts: list[dict[str, t.Any]] = []
+    rendered = get_rendered(lambda _, ctx, *args: contexts.append(ctx), _MOCK_CLIENT)
+
+    rendered("a", {})
+
+    assert contexts[0]["feature_flag"]("flag") is False
+    assert contexts[0]["feature_flag_str"]("flag") == ""
+    assert contexts[0]["feature_flag_num"]("flag") == 0
+    assert contexts[0]["feature_flag_json"]("flag") == {}
+
+
 def test_get_client_defaults_to_mock(monkeypatch: pytest.MonkeyPatch) -> None:
     monkeypatch.delenv("DBT_FF_DISABLE", raising=False)
     monkeypatch.delenv("DBT_FF_PROVIDER", raising=False)
@@ -178,6 +278,11 @@ def test_client_validator_rejects_wrong_default_type() -> None:
 
     with pytest.raises(ValueError, match="Invalid default value"):
         client.bool_variation("bool-flag", t.cast(bool, "true"))
+    # Unhashable defaults are rejected by the validator, not the cache
+    with pytest.raises(ValueError, match="Invalid default value"):
+        client.json_variation("json-flag", t.cast(JSONValue, {1}))
+    with pytest.raises(ValueError, match="Invalid default value"):
+        client.bulk_evaluate(["json-flag"], "json_variation", {1})
 
 
 def test_client_validator_rejects_wrong_return_type() -> None:
@@ -194,6 +299,156 @@ def test_client_validator_rejects_json_none_return() -> None:
         client.json_variation("json-flag")
 
 
+class CountingClient(StaticClient):
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, t.Any]] = []
+        super().__init__()
+
+    def bool_variation(self, flag: str, default: bool = False) -> bool:
+        self.calls.append((flag, default))
+        return not default
+
+    def json_variation(self, flag: str, default: JSONValue | None = None) -> JSONValue:
+        self.calls.append((flag, default))
+        return {"flag": flag}
+
+
+def test_client_memoizes_evaluations_per_flag_and_default() -> None:
+    client = CountingClient()
+
+    for _ in range(5):
+        assert client.bool_variation("flag") is True
+    assert client.bool_variation("flag", True) is False
+    assert client.json_variation("payload", {"a": [1]}) == {"flag": "payload"}
+    assert client.json_variation("payload", {"a": [1]}) == {"flag": "payload"}
+
+    assert client.calls == [("flag", False), ("flag", True), ("payload", {"a": [1]})]
+    assert client.cache.stats() == {"hits": 5, "misses": 3, "size": 3}
+
+    client.cache.clear()
+    client.bool_variation("flag")
+    assert client.calls[-1] == ("flag", False)
+
+
+def test_client_cache_hands_out_copies_of_json_values() -> None:
+    client = CountingClient()
+
+    client.json_variation("payload").update(mutated=True)
+    client.bulk_evaluate(["bulk"], "json_variation")["bulk"].clear()
+
+    assert client.json_variation("payload") == {"flag": "payload"}
+    assert client.bulk_evaluate(["bulk"], "json_variation") == {
+        "bulk": {"flag": "bulk"}
+    }
+    assert len(client.calls) == 2
+
+
+def test_bulk_evaluate_falls_back_to_per_flag_calls_and_warms_cache() -> None:
+    client = CountingClient()
+    client.bool_variation("cached")
+
+    assert client.bulk_evaluate(["cached", "a", "b", "a"]) == {
+        "cached": True,
+        "a": True,
+        "b": True,
+    }
+    assert client.bool_variation("b") is True
+    assert client.calls == [("cached", False), ("a", False), ("b", False)]
+    assert client.cache.stats() == {"hits": 2, "misses": 3, "size": 3}
+
+
+def test_bulk_evaluate_validates_batch_results() -> None:
+    client = BadBoolClient()
+
+    with pytest.raises(ValueError, match="Invalid feature flag evaluation"):
+        client.bulk_evaluate(["bool-flag"])
+
+
+class FlippingClient(StaticClient):
+    """Returns a different value on every SDK call to expose inconsistent reads."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        super().__init__()
+
+    def bool_variation(self, flag: str, default: bool = False) -> bool:
+        import time
+
+        self.calls += 1
+        time.sleep(0.001)
+        return self.calls % 2 == 0
+
+
+def test_concurrent_evaluations_are_consistent_and_counted() -> None:
+    from concurrent.futures import ThreadPoolExecutor
+
+    client = FlippingClient()
+    threads, calls, flags = 16, 500, [f"flag_{i}" for i in range(10)]
+
+    def hammer(_: int) -> dict[str, set[bool]]:
+        seen: dict[str, set[bool]] = {}
+        for i in range(calls):
+            flag = flags[i % len(flags)]
+            seen.setdefault(flag, set()).add(client.bool_variation(flag))
+        return seen
+
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(hammer, range(threads)))
+
+    for flag in flags:
+        assert len(set().union(*(seen[flag] for seen in results))) == 1
+    stats = client.cache.stats()
+    assert stats["hits"] + stats["misses"] == threads * calls
+    assert stats["size"] == len(flags)
+
+
+def test_fme_factory_created_once_under_concurrent_construction(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    import sys
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    from dbt_feature_flags import fme
+
+    created: list[str] = []
+
+    class Factory:
+        ready = True
+
+        def block_until_ready(self, timeout: int) -> None:
+            time.sleep(0.01)
+
+        def client(self) -> FakeSplitClient:
+            return FakeSplitClient()
+
+    def get_factory(sdk_key: str, config: dict[str, t.Any]) -> Factory:
+        created.append(sdk_key)
+        return Factory()
+
+    monkeypatch.setitem(
+        sys.modules, "splitio", SimpleNamespace(get_factory=get_factory)
+    )
+    monkeypatch.setenv("DBT_FF_API_KEY", "sdk")
+    monkeypatch.setattr(fme, "_factory_cache", {})
+
+    with ThreadPoolExecutor(16) as pool:
+        clients = list(pool.map(lambda _: fme.HarnessFMEClient(), range(16)))
+
+    assert created == ["sdk"]
+    assert all(client.bool_variation("enabled") for client in clients)
+
+
+def test_client_cache_does_not_store_invalid_evaluations() -> None:
+    client = BadBoolClient()
+
+    for _ in range(2):
+        with pytest.raises(ValueError, match="Invalid feature flag evaluation"):
+            client.bool_variation("bool-flag")
+
+    assert len(client.cache) == 0
+
+
 class FakeClient(StaticClient):
     def __init__(self, values: dict[str, bool]) -> None:
         self.values = values
@@ -246,10 +501,56 @@ def test_preflight_invalidates_partial_parse_when_flags_change(
     preflight.run(["flag"], target_dir=str(target_dir))
 
     assert not partial_parse.exists()
-    assert json.loads(cache_file.read_text()) == {"flag": True}
+    assert json.loads(cache_file.read_text()) == {
+        "flag": fingerprint("bool_variation", True)
+    }
     assert client.shutdown_called
 
 
+def test_preflight_ignores_defaults_served_by_an_unavailable_provider(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: pathlib.Path,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    from dbt_feature_flags import patch, preflight
+
+    target_dir, cache_file, partial_parse = prepare_preflight_target(
+        tmp_path, previous=True
+    )
+    client = patch._DefaultsClient()
+    monkeypatch.setattr(patch, "_get_client", lambda: client)
+
+    preflight.run(["flag"], target_dir=str(target_dir))
+
+    assert partial_parse.exists()
+    assert "flag: provider unavailable, keeping True" in capsys.readouterr().out
+    assert json.loads(cache_file.read_text()) == {
+        "flag": fingerprint("bool_variation", True)
+    }
+
+
+def test_preflight_records_evaluation_reasons(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+) -> None:
+    from dbt_feature_flags import patch, preflight
+    from dbt_feature_flags.local import FileFeatureFlagsClient
+
+    target_dir, cache_file, partial_parse = prepare_preflight_target(
+        tmp_path, previous=True
+    )
+    flags = tmp_path / "flags.json"
+    flags.write_text(json.dumps({"flags": {"flag": False}}))
+    client = FileFeatureFlagsClient(flags)
+    monkeypatch.setattr(patch, "_get_client", lambda: client)
+
+    preflight.run(["flag", "unknown"], target_dir=str(target_dir))
+
+    assert not partial_parse.exists()
+    state = json.loads(cache_file.read_text())
+    assert state["flag"]["reason"] == "file"
+    assert state["unknown"]["reason"] == "default"
+
+
 def test_preflight_keeps_partial_parse_when_flags_match(
     monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
 ) -> None:
@@ -264,157 +565,886 @@ def test_preflight_keeps_partial_parse_when_flags_match(
     preflight.run(["flag"], target_dir=str(target_dir))
 
     assert partial_parse.exists()
-    assert json.loads(cache_file.read_text()) == {"flag": True}
+    assert json.loads(cache_file.read_text()) == {
+        "flag": fingerprint("bool_variation", True)
+    }
     assert client.shutdown_called
 
 
-class FakeHarnessSDK:
-    def __init__(self) -> None:
-        self.destroyed = False
+def build_snapshot_client(
+    path: pathlib.Path, upstream: list[FakeClient], ttl: float = 300
+) -> t.Any:
+    from dbt_feature_flags.snapshot import SnapshotFeatureFlagsClient
 
-    def bool_variation(self, flag: str, target: object, default: bool) -> bool:
-        return not default
+    def factory() -> FakeClient:
+        return upstream[0]
 
-    def string_variation(self, flag: str, target: object, default: str) -> str:
-        return f"{flag}:{default}"
+    return SnapshotFeatureFlagsClient(factory, "fme", path=path, ttl=ttl)
 
-    def number_variation(
-        self, flag: str, target: object, default: float | int
-    ) -> float | int:
-        return default + 1
 
-    def json_variation(
-        self, flag: str, target: object, default: JSONValue
-    ) -> JSONValue:
-        return {"flag": flag, "default": default}
+def test_snapshot_provider_serves_later_runs_without_upstream(
+    tmp_path: pathlib.Path,
+) -> None:
+    path = tmp_path / "target" / ".dbt_ff_snapshot.json"
+    first = FakeClient({"flag": True})
+    client = build_snapshot_client(path, [first])
+    assert client.bool_variation("flag") is True
+    client.shutdown()
 
-    def destroy(self) -> None:
-        self.destroyed = True
+    assert first.shutdown_called
+    payload = json.loads(path.read_text())
+    assert payload["meta"]["provider"] == "fme"
+    assert payload["values"] == [["bool_variation", "flag", False, True]]
 
+    client = build_snapshot_client(path, [])
+    assert client.bool_variation("flag") is True
+    client.shutdown()
+    assert client._upstream is None
 
-def test_harness_provider_delegates_to_sdk_client() -> None:
-    from dbt_feature_flags.harness import HarnessFeatureFlagsClient
 
-    client = object.__new__(HarnessFeatureFlagsClient)
-    client.client = FakeHarnessSDK()
-    client.target = object()
-    BaseFeatureFlagsClient.__init__(client)
+def test_snapshot_provider_accepts_defaults_with_non_json_values(
+    tmp_path: pathlib.Path,
+) -> None:
+    import datetime
 
-    assert client.bool_variation("enabled", False)
-    assert client.string_variation("name", "fallback") == "name:fallback"
-    assert client.number_variation("count", 1) == 2
-    assert client.json_variation("payload", {"x": 1}) == {
-        "flag": "payload",
-        "default": {"x": 1},
-    }
+    path = tmp_path / ".dbt_ff_snapshot.json"
+    default = {"since": datetime.date(2024, 1, 1)}
+    client = build_snapshot_client(path, [FakeClient({})])
+    assert client.json_variation("cfg", default) == default
     client.shutdown()
-    assert client.client.destroyed
 
+    client = build_snapshot_client(path, [])
+    assert client.json_variation("cfg", default) == {"since": "2024-01-01"}
 
-def test_patch_dbt_environment_registers_provider_shutdown(
-    monkeypatch: pytest.MonkeyPatch,
+
+def test_snapshot_provider_refreshes_stale_snapshot_in_background(
+    tmp_path: pathlib.Path,
 ) -> None:
-    from dbt.clients import jinja
-    from dbt_feature_flags import patch
+    path = tmp_path / ".dbt_ff_snapshot.json"
+    client = build_snapshot_client(path, [FakeClient({"flag": True})])
+    client.bool_variation("flag")
+    client.shutdown()
 
-    original_get_rendered = getattr(jinja, "_get_rendered", jinja.get_rendered)
-    client = FakeClient({})
-    registered: list[t.Callable[[], None]] = []
-    monkeypatch.setattr(jinja, "get_rendered", original_get_rendered)
-    monkeypatch.setattr(jinja, "_get_rendered", original_get_rendered, raising=False)
-    monkeypatch.setattr(patch, "_get_client", lambda: client)
-    monkeypatch.setattr(patch.atexit, "register", registered.append)
+    client = build_snapshot_client(path, [FakeClient({"flag": False})], ttl=-1)
+    assert client.bool_variation("flag") is True
+    client.shutdown()
 
-    patch.patch_dbt_environment()
-    registered[0]()
+    client = build_snapshot_client(path, [])
+    assert client.bool_variation("flag") is False
 
-    assert client.shutdown_called
 
+def test_snapshot_provider_ignores_snapshot_for_other_target(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+) -> None:
+    path = tmp_path / ".dbt_ff_snapshot.json"
+    client = build_snapshot_client(path, [FakeClient({"flag": True})])
+    client.bool_variation("flag")
+    client.shutdown()
+
+    monkeypatch.setenv("DBT_TARGET", "prod")
+    client = build_snapshot_client(path, [FakeClient({"flag": False})])
+    assert client.bool_variation("flag") is False
 
-def test_patch_dbt_environment_skips_mock_shutdown_registration(
-    monkeypatch: pytest.MonkeyPatch,
+
+FLAG_FILE = """
+flags:
+  enabled: true
+  materialization:
+    value: view
+    targets:
+      prod: table
+  limit: 10
+  settings:
+    value: {"days": 30}
+"""
+
+
+def test_file_provider_serves_typed_flags_with_target_overrides(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
 ) -> None:
-    from dbt.clients import jinja
-    from dbt_feature_flags import patch
+    from dbt_feature_flags.local import FileFeatureFlagsClient
 
-    original_get_rendered = getattr(jinja, "_get_rendered", jinja.get_rendered)
-    registered: list[t.Callable[[], None]] = []
-    monkeypatch.setattr(jinja, "get_rendered", original_get_rendered)
-    monkeypatch.setattr(jinja, "_get_rendered", original_get_rendered, raising=False)
-    monkeypatch.setattr(patch, "_get_client", lambda: patch._MOCK_CLIENT)
-    monkeypatch.setattr(patch.atexit, "register", registered.append)
+    path = tmp_path / "flags.yml"
+    path.write_text(FLAG_FILE)
+    monkeypatch.setenv("DBT_FF_FILE", str(path))
+    monkeypatch.setenv("DBT_FF_PROVIDER", "file")
+    monkeypatch.delenv("DBT_FF_DISABLE", raising=False)
+    monkeypatch.delenv("DBT_TARGET", raising=False)
 
-    patch.patch_dbt_environment()
+    client = t.cast(FileFeatureFlagsClient, _get_client())
+    assert isinstance(client, FileFeatureFlagsClient)
+    assert client.bool_variation("enabled") is True
+    assert client.bool_variation("missing", True) is True
+    assert client.string_variation("materialization") == "view"
+    assert client.number_variation("limit") == 10
+    assert client.json_variation("settings") == {"days": 30}
 
-    assert registered == []
+    monkeypatch.setenv("DBT_TARGET", "prod")
+    assert FileFeatureFlagsClient().string_variation("materialization") == "table"
 
 
-class FakeLaunchDarklySDK:
-    def __init__(self) -> None:
-        self.calls: list[tuple[str, object, t.Any]] = []
+def test_file_provider_reloads_when_mtime_changes(tmp_path: pathlib.Path) -> None:
+    import os
 
-    def variation(self, flag: str, target: object, default: t.Any) -> t.Any:
-        self.calls.append((flag, target, default))
-        return default
+    from dbt_feature_flags.local import FileFeatureFlagsClient
 
+    path = tmp_path / "flags.json"
+    path.write_text(json.dumps({"flags": {"enabled": True}}))
+    client = FileFeatureFlagsClient(path)
+    assert client.bool_variation("enabled") is True
 
-def test_launchdarkly_provider_uses_context_positional_argument() -> None:
-    from dbt_feature_flags.launchdarkly import LaunchDarklyFeatureFlagsClient
+    assert not client.refresh()
+    path.write_text(json.dumps({"flags": {"enabled": False}}))
+    os.utime(path, ns=(0, 1))
+    assert client.refresh()
+    assert client.bool_variation("enabled") is False
 
-    client = object.__new__(LaunchDarklyFeatureFlagsClient)
-    sdk = FakeLaunchDarklySDK()
-    client.client = sdk
-    client.target = {"key": "dbt-default"}
-    BaseFeatureFlagsClient.__init__(client)
 
-    assert client.bool_variation("enabled", False) is False
-    assert client.json_variation("payload") == {}
-    assert sdk.calls == [
-        ("enabled", {"key": "dbt-default"}, False),
-        ("payload", {"key": "dbt-default"}, {}),
-    ]
+def test_get_client_snapshot_requires_upstream_provider(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.delenv("DBT_FF_DISABLE", raising=False)
+    monkeypatch.delenv("DBT_FF_SNAPSHOT_PROVIDER", raising=False)
+    monkeypatch.setenv("DBT_FF_PROVIDER", "snapshot")
 
+    with pytest.raises(RuntimeError, match="DBT_FF_SNAPSHOT_PROVIDER"):
+        _get_client()
 
-class FakeSplitClient:
-    def __init__(self) -> None:
-        self.treatments = {
-            "enabled": "on",
-            "disabled": "control",
-            "text": "variant",
-            "number": "3.5",
-            "bad-number": "three",
-        }
-        self.configs = {
-            "payload": SimpleNamespace(treatment="on", config='{"enabled": true}'),
-            "bad-json": SimpleNamespace(treatment="on", config="{"),
-            "missing": SimpleNamespace(treatment="control", config=None),
-        }
 
-    def get_treatment(self, _key: str, flag: str) -> str:
-        return self.treatments[flag]
+def write_project(tmp_path: pathlib.Path) -> pathlib.Path:
+    project = tmp_path / "project"
+    (project / "models" / "marts").mkdir(parents=True)
+    (project / "macros").mkdir()
+    (project / "dbt_project.yml").write_text(
+        "models:\n  +enabled: \"{{ feature_flag('project_flag') }}\"\n"
+    )
+    (project / "models" / "marts" / "orders.sql").write_text(
+        "{{ config(\n"
+        "    enabled=feature_flag('orders_enabled', default=true),\n"
+        "    materialized=feature_flag_str(\"orders_mat\", 'view'),\n"
+        ") }}\n"
+        "select {{ feature_flag_num('orders_limit') }} as n\n"
+    )
+    (project / "macros" / "helpers.sql").write_text(
+        "{% macro m() %}{{ feature_flag_json(flag='payload') }}{% endmacro %}\n"
+    )
+    return project
+
+
+def test_index_extracts_flag_references(tmp_path: pathlib.Path) -> None:
+    from dbt_feature_flags.index import FlagReference, build_index
+
+    project = write_project(tmp_path)
+    index = build_index(str(project), str(tmp_path / "target"))
+
+    assert sorted(index.references()) == sorted(
+        [
+            FlagReference("project_flag", "bool_variation", "dbt_project.yml", 2, True),
+            FlagReference("payload", "json_variation", "macros/helpers.sql", 1, False),
+            FlagReference(
+                "orders_enabled", "bool_variation", "models/marts/orders.sql", 2, True
+            ),
+            FlagReference(
+                "orders_limit", "number_variation", "models/marts/orders.sql", 5, False
+            ),
+            FlagReference(
+                "orders_mat", "string_variation", "models/marts/orders.sql", 3, True
+            ),
+        ]
+    )
+    assert index.flags(config_only=True) == {
+        "project_flag": "bool_variation",
+        "orders_enabled": "bool_variation",
+        "orders_mat": "string_variation",
+    }
 
-    def get_treatment_with_config(self, _key: str, flag: str) -> SimpleNamespace:
-        return self.configs[flag]
 
+def test_index_rescans_only_changed_files(tmp_path: pathlib.Path) -> None:
+    import os
 
-def test_fme_provider_maps_split_treatments() -> None:
-    from dbt_feature_flags.fme import HarnessFMEClient
+    from dbt_feature_flags.index import build_index
 
-    client = object.__new__(HarnessFMEClient)
-    client._key = "dbt-default"
-    client._client = FakeSplitClient()
-    BaseFeatureFlagsClient.__init__(client)
+    project = write_project(tmp_path)
+    target = str(tmp_path / "target")
+    assert build_index(str(project), target).scanned == 3
+    assert build_index(str(project), target).scanned == 0
 
-    assert client.bool_variation("enabled") is True
-    assert client.bool_variation("disabled", True) is True
-    assert client.string_variation("text") == "variant"
-    assert client.number_variation("number") == 3.5
+    macro = project / "macros" / "helpers.sql"
+    os.utime(macro, ns=(0, 0))
+    assert build_index(str(project), target).scanned == 0
+
+    macro.write_text("{{ feature_flag('new_flag') }}")
+    (project / "models" / "marts" / "orders.sql").unlink()
+    index = build_index(str(project), target)
+    assert index.scanned == 1
+    assert index.flags() == {
+        "project_flag": "bool_variation",
+        "new_flag": "bool_variation",
+    }
+
+
+def test_preflight_reads_flags_from_project_index(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+) -> None:
+    from dbt_feature_flags import patch, preflight
+
+    project = write_project(tmp_path)
+    target_dir = tmp_path / "target"
+    client = FakeClient({"orders_enabled": False})
+    monkeypatch.setattr(patch, "_get_client", lambda: client)
+
+    preflight.run(target_dir=str(target_dir), project_dir=str(project))
+
+    state = json.loads((target_dir / ".fme_flag_state.json").read_text())
+    assert state == {
+        "project_flag": fingerprint("bool_variation", False),
+        "orders_enabled": fingerprint("bool_variation", False),
+        "orders_mat": fingerprint("string_variation", ""),
+    }
+    assert state["orders_mat"] == {
+        "kind": "string_variation",
+        "hash": fingerprint("string_variation", "")["hash"],
+        "value": "",
+    }
+
+
+def test_preflight_cli_parses_typed_flags() -> None:
+    from dbt_feature_flags.preflight import _parse_flag_args
+
+    assert _parse_flag_args(["a", "b:str", "c:num", "d:json", "e:x"]) == {
+        "a": "bool_variation",
+        "b": "string_variation",
+        "c": "number_variation",
+        "d": "json_variation",
+        "e:x": "bool_variation",
+    }
+
+
+class TypedClient(StaticClient):
+    def __init__(self, values: dict[str, t.Any]) -> None:
+        self.values = values
+        super().__init__()
+
+    def string_variation(self, flag: str, default: str = "") -> str:
+        return self.values.get(flag, default)
+
+    def json_variation(self, flag: str, default: JSONValue | None = None) -> JSONValue:
+        return self.values.get(flag, {} if default is None else default)
+
+
+def test_preflight_detects_string_and_json_flag_changes(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+) -> None:
+    from dbt_feature_flags import patch, preflight
+
+    target_dir, cache_file, partial_parse = prepare_preflight_target(
+        tmp_path, previous=True
+    )
+    flags: dict[str, t.Any] = {
+        "materialized": "string_variation",
+        "payload": "json_variation",
+    }
+    values: dict[str, t.Any] = {"materialized": "view", "payload": {"big": [1] * 100}}
+    monkeypatch.setattr(patch, "_get_client", lambda: TypedClient(values))
+
+    preflight.run(flags, target_dir=str(target_dir))
+    state = json.loads(cache_file.read_text())
+    assert "value" not in state["payload"]
+    assert state["materialized"]["value"] == "view"
+
+    partial_parse.write_bytes(b"cached")
+    preflight.run(flags, target_dir=str(target_dir))
+    assert partial_parse.exists()
+
+    values["payload"] = {"big": [2] * 100}
+    preflight.run(flags, target_dir=str(target_dir))
+    assert not partial_parse.exists()
+
+    partial_parse.write_bytes(b"cached")
+    values["materialized"] = "table"
+    preflight.run(flags, target_dir=str(target_dir))
+    assert not partial_parse.exists()
+
+
+def write_partial_parse(path: pathlib.Path, files: list[str]) -> None:
+    import msgpack
+
+    manifest = {
+        "metadata": {"generated_at": msgpack.ExtType(2, b"2026-01-01T00:00:00")},
+        "files": {
+            f"project://{file}": {
+                "path": {
+                    "searched_path": file.split("/", 1)[0],
+                    "relative_path": file.split("/", 1)[1],
+                    "modification_time": 1.0,
+                    "project_root": "/project",
+                },
+                "checksum": {"name": "sha256", "checksum": "abc"},
+            }
+            for file in files
+        },
+    }
+    path.write_bytes(msgpack.packb(manifest, use_bin_type=True))
+
+
+def read_checksums(path: pathlib.Path) -> dict[str, str]:
+    import msgpack
+
+    manifest = msgpack.unpackb(path.read_bytes(), raw=False)
+    assert isinstance(manifest["metadata"]["generated_at"], msgpack.ExtType)
+    return {
+        file_id.split("://")[1]: source["checksum"]["checksum"]
+        for file_id, source in manifest["files"].items()
+    }
+
+
+def test_invalidate_files_marks_only_requested_files(tmp_path: pathlib.Path) -> None:
+    from dbt_feature_flags.partial_parse import INVALIDATED_CHECKSUM, invalidate_files
+
+    partial_parse = tmp_path / "partial_parse.msgpack"
+    write_partial_parse(partial_parse, ["models/a.sql", "models/marts/b.sql"])
+
+    assert invalidate_files(
+        partial_parse, ["models/marts/b.sql", "models/new.sql"]
+    ) == {"models/marts/b.sql"}
+    assert read_checksums(partial_parse) == {
+        "models/a.sql": "abc",
+        "models/marts/b.sql": INVALIDATED_CHECKSUM,
+    }
+
+
+def test_invalidate_files_rejects_unreadable_manifest(tmp_path: pathlib.Path) -> None:
+    from dbt_feature_flags.partial_parse import invalidate_files
+
+    partial_parse = tmp_path / "partial_parse.msgpack"
+    partial_parse.write_bytes(b"cached")
+
+    with pytest.raises(ValueError, match="Unreadable partial parse manifest"):
+        invalidate_files(partial_parse, ["models/a.sql"])
+
+
+def test_preflight_invalidates_only_files_referencing_changed_flags(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+) -> None:
+    from dbt_feature_flags import patch, preflight
+    from dbt_feature_flags.partial_parse import INVALIDATED_CHECKSUM
+
+    project = write_project(tmp_path)
+    target_dir = tmp_path / "target"
+    target_dir.mkdir()
+    partial_parse = target_dir / "partial_parse.msgpack"
+    write_partial_parse(partial_parse, ["models/marts/orders.sql", "models/other.sql"])
+    (target_dir / ".fme_flag_state.json").write_text(
+        json.dumps({"orders_enabled": True, "project_flag": False})
+    )
+    client = FakeClient({"orders_enabled": False})
+    monkeypatch.setattr(patch, "_get_client", lambda: client)
+
+    preflight.run(
+        ["orders_enabled", "project_flag"],
+        target_dir=str(target_dir),
+        project_dir=str(project),
+    )
+
+    assert read_checksums(partial_parse) == {
+        "models/marts/orders.sql": INVALIDATED_CHECKSUM,
+        "models/other.sql": "abc",
+    }
+
+    client = FakeClient({"project_flag": True})
+    preflight.run(
+        ["orders_enabled", "project_flag"],
+        target_dir=str(target_dir),
+        project_dir=str(project),
+    )
+
+    assert not partial_parse.exists()
+
+
+def test_preflight_fully_reparses_for_flags_in_schema_files(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+) -> None:
+    from dbt_feature_flags import patch, preflight
+
+    project = write_project(tmp_path)
+    (project / "models" / "schema.yml").write_text(
+        "models:\n"
+        "  - name: c\n"
+        "    config:\n"
+        "      materialized: \"{{ feature_flag_str('cmat', default='view') }}\"\n"
+    )
+    target_dir = tmp_path / "target"
+    target_dir.mkdir()
+    partial_parse = target_dir / "partial_parse.msgpack"
+    write_partial_parse(partial_parse, ["models/schema.yml", "models/other.sql"])
+    (target_dir / ".fme_flag_state.json").write_text(
+        json.dumps({"cmat": fingerprint("string_variation", "view")})
+    )
+
+    class TableClient(StaticClient):
+        def string_variation(self, flag: str, default: str = "") -> str:
+            return "table"
+
+    monkeypatch.setattr(patch, "_get_client", TableClient)
+
+    preflight.run(
+        {"cmat": "string_variation"},
+        target_dir=str(target_dir),
+        project_dir=str(project),
+    )
+
+    assert not partial_parse.exists()
+
+
+class FakeHarnessSDK:
+    def __init__(self) -> None:
+        self.destroyed = False
+        self.configs: dict[str, list[dict[str, t.Any]]] = {
+            "flags": [],
+            "segments": [],
+        }
+
+    def bool_variation(self, flag: str, target: object, default: bool) -> bool:
+        return not default
+
+    def string_variation(self, flag: str, target: object, default: str) -> str:
+        return f"{flag}:{default}"
+
+    def number_variation(
+        self, flag: str, target: object, default: float | int
+    ) -> float | int:
+        return default + 1
+
+    def json_variation(
+        self, flag: str, target: object, default: JSONValue
+    ) -> JSONValue:
+        return {"flag": flag, "default": default}
+
+    def destroy(self) -> None:
+        self.destroyed = True
+
+
+def test_harness_provider_delegates_to_sdk_client() -> None:
+    from dbt_feature_flags.harness import HarnessFeatureFlagsClient
+
+    client = object.__new__(HarnessFeatureFlagsClient)
+    client.client = FakeHarnessSDK()
+    client._resolved = {}
+    client.target = object()
+    BaseFeatureFlagsClient.__init__(client)
+
+    assert client.bool_variation("enabled", False)
+    assert client.string_variation("name", "fallback") == "name:fallback"
+    assert client.number_variation("count", 1) == 2
+    assert client.json_variation("payload", {"x": 1}) == {
+        "flag": "payload",
+        "default": {"x": 1},
+    }
+    client.shutdown()
+    assert client.client.destroyed
+
+
+def test_patch_dbt_environment_registers_provider_shutdown(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    from dbt.clients import jinja
+    from dbt_feature_flags import patch
+
+    original_get_rendered = getattr(jinja, "_get_rendered", jinja.get_rendered)
+    client = FakeClient({})
+    built: list[FakeClient] = []
+    registered: list[t.Callable[[], None]] = []
+    monkeypatch.setenv("DBT_FF_PROVIDER", "harness")
+    monkeypatch.delenv("DBT_FF_DISABLE", raising=False)
+    monkeypatch.setattr(jinja, "get_rendered", original_get_rendered)
+    monkeypatch.setattr(jinja, "_get_rendered", original_get_rendered, raising=False)
+    monkeypatch.setattr(patch, "_get_client", lambda: built.append(client) or client)
+    monkeypatch.setattr(patch.atexit, "register", registered.append)
+
+    patch.patch_dbt_environment()
+    assert built == []
+
+    assert jinja.get_rendered("{{ feature_flag('flag') }}", {}) == "False"
+    registered[0]()
+
+    assert built == [client]
+    assert client.shutdown_called
+
+
+def test_patch_dbt_environment_skips_mock_shutdown_registration(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    from dbt.clients import jinja
+    from dbt_feature_flags import patch
+
+    original_get_rendered = getattr(jinja, "_get_rendered", jinja.get_rendered)
+    registered: list[t.Callable[[], None]] = []
+    monkeypatch.setattr(jinja, "get_rendered", original_get_rendered)
+    monkeypatch.setattr(jinja, "_get_rendered", original_get_rendered, raising=False)
+    monkeypatch.setattr(patch, "_get_client", lambda: patch._MOCK_CLIENT)
+    monkeypatch.setattr(patch.atexit, "register", registered.append)
+
+    patch.patch_dbt_environment()
+
+    assert registered == []
+
+
+def test_lazy_client_builds_provider_once_on_first_call() -> None:
+    from dbt_feature_flags.patch import _LazyClient
+
+    built: list[FakeClient] = []
+
+    def factory() -> FakeClient:
+        built.append(FakeClient({"flag": True}))
+        return built[-1]
+
+    client = _LazyClient(factory)
+    client.shutdown()
+    assert built == []
+
+    assert client.bool_variation("flag") is True
+    assert client.bool_variation("other", default=True) is True
+    assert len(built) == 1
+    client.shutdown()
+    assert built[0].shutdown_called
+
+
+def test_lazy_client_prefetches_flags_in_bulk() -> None:
+    from dbt_feature_flags.patch import _LazyClient
+
+    provider = CountingClient()
+    client = _LazyClient(lambda: provider, prefetch=["a", "b"])
+
+    assert client.bool_variation("a") is True
+    assert client.bool_variation("b") is True
+    assert provider.calls == [("a", False), ("b", False)]
+    assert provider.cache.hits == 2
+
+
+def test_lazy_client_started_in_background_serves_provider() -> None:
+    import threading
+
+    from dbt_feature_flags.patch import _LazyClient
+
+    built = threading.Event()
+    provider = FakeClient({"flag": True})
+
+    def factory() -> FakeClient:
+        built.set()
+        return provider
+
+    client = _LazyClient(factory, timeout=5)
+    client.start()
+
+    assert built.wait(5)
+    assert client.bool_variation("flag") is True
+    client.shutdown()
+    assert provider.shutdown_called
+
+
+def test_lazy_client_falls_back_to_defaults_after_deadline() -> None:
+    import threading
+
+    from dbt_feature_flags.patch import _LazyClient
+
+    release = threading.Event()
+    provider = FakeClient({"flag": True})
+
+    def factory() -> FakeClient:
+        release.wait(5)
+        return provider
+
+    client = _LazyClient(factory, timeout=0.01)
+    client.start()
+
+    assert client.bool_variation("flag") is False
+    assert client.bool_variation("flag", True) is True
+    assert client.json_variation("payload") == {}
+
+    release.set()
+    assert client._future is not None
+    client._future.result(timeout=5)
+    assert client.bool_variation("flag") is False
+    client.shutdown()
+    assert provider.shutdown_called
+
+
+def test_bootstrap_defers_patch_until_dbt_jinja_import() -> None:
+    import subprocess
+    import sys
+
+    script = (
+        "import sys\n"
+        "import dbt_feature_flags.bootstrap as bootstrap\n"
+        "bootstrap.install()\n"
+        "assert 'dbt_feature_flags.patch' not in sys.modules\n"
+        "assert 'dbt.clients.jinja' not in sys.modules\n"
+        "from dbt.clients import jinja\n"
+        "assert getattr(jinja.get_rendered, 'status', None) == 'patched'\n"
+        "assert not any(\n"
+        "    isinstance(f, bootstrap.DbtJinjaFinder) for f in sys.meta_path\n"
+        ")\n"
+    )
+    subprocess.run([sys.executable, "-c", script], check=True)
+
+
+class FakeLaunchDarklySDK:
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, object, t.Any]] = []
+
+    def variation_detail(
+        self, flag: str, target: object, default: t.Any
+    ) -> SimpleNamespace:
+        self.calls.append((flag, target, default))
+        reason = {"kind": "ERROR", "errorKind": "FLAG_NOT_FOUND"}
+        return SimpleNamespace(value=default, reason=reason)
+
+    def all_flags_state(self, target: object, with_reasons: bool) -> SimpleNamespace:
+        self.calls.append(("*", target, None))
+        values = {"enabled": True, "payload": {"x": 1}}
+        return SimpleNamespace(
+            valid=True,
+            to_values_map=lambda: values,
+            get_flag_reason=lambda flag: {"kind": "RULE_MATCH", "ruleIndex": 0},
+        )
+
+
+def test_launchdarkly_provider_uses_context_positional_argument() -> None:
+    from dbt_feature_flags.launchdarkly import LaunchDarklyFeatureFlagsClient
+
+    client = object.__new__(LaunchDarklyFeatureFlagsClient)
+    sdk = FakeLaunchDarklySDK()
+    client.client = sdk
+    client.target = {"key": "dbt-default"}
+    BaseFeatureFlagsClient.__init__(client)
+
+    assert client.bool_variation("enabled", False) is False
+    assert client.json_variation("payload") == {}
+    assert sdk.calls == [
+        ("enabled", {"key": "dbt-default"}, False),
+        ("payload", {"key": "dbt-default"}, {}),
+    ]
+
+
+def test_launchdarkly_provider_bulk_evaluates_with_all_flags_state() -> None:
+    from dbt_feature_flags.launchdarkly import LaunchDarklyFeatureFlagsClient
+
+    client = object.__new__(LaunchDarklyFeatureFlagsClient)
+    sdk = FakeLaunchDarklySDK()
+    client.client = sdk
+    client.target = {"key": "dbt-default"}
+    BaseFeatureFlagsClient.__init__(client)
+
+    assert client.bulk_evaluate(["enabled", "unknown"]) == {
+        "enabled": True,
+        "unknown": False,
+    }
+    assert client.bulk_evaluate(["payload", "other"], "json_variation") == {
+        "payload": {"x": 1},
+        "other": {},
+    }
+    assert [call[0] for call in sdk.calls] == ["*", "*"]
+    assert client.reasons == {
+        "enabled": "rule_match",
+        "unknown": "default",
+        "payload": "rule_match",
+        "other": "default",
+    }
+
+
+def test_launchdarkly_reasons_separate_unready_sdk_from_unknown_flags() -> None:
+    from dbt_feature_flags.launchdarkly import _reason
+
+    assert _reason({"kind": "FALLTHROUGH"}) == "fallthrough"
+    assert _reason({"kind": "ERROR", "errorKind": "FLAG_NOT_FOUND"}) == "default"
+    assert _reason({"kind": "ERROR", "errorKind": "CLIENT_NOT_READY"}) == (
+        "unavailable"
+    )
+    assert _reason(None) == "default"
+
+
+class FakeLaunchDarklyConfig:
+    def __init__(self, sdk_key: str, **options: t.Any) -> None:
+        self.sdk_key = sdk_key
+        self.options = options
+
+
+@pytest.fixture
+def fake_ld_config(monkeypatch: pytest.MonkeyPatch) -> None:
+    import sys
+
+    monkeypatch.setitem(
+        sys.modules, "ldclient.config", SimpleNamespace(Config=FakeLaunchDarklyConfig)
+    )
+    monkeypatch.setitem(
+        sys.modules,
+        "ldclient.integrations",
+        SimpleNamespace(
+            Files=SimpleNamespace(new_data_source=lambda paths: ("files", paths))
+        ),
+    )
+
+
+def test_launchdarkly_config_modes(
+    fake_ld_config: None, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from dbt_feature_flags.launchdarkly import ONE_SHOT_POLL_INTERVAL, _config
+
+    monkeypatch.delenv("DBT_FF_LAUNCHDARKLY_FILE", raising=False)
+    monkeypatch.delenv("DBT_FF_LAUNCHDARKLY_MODE", raising=False)
+    assert _config("key").options == {}
+
+    monkeypatch.setenv("DBT_FF_LAUNCHDARKLY_MODE", "poll")
+    config = _config("key")
+    assert config.options == {
+        "stream": False,
+        "poll_interval": ONE_SHOT_POLL_INTERVAL,
+        "send_events": False,
+        "diagnostic_opt_out": True,
+    }
+    with pytest.raises(RuntimeError, match="DBT_FF_API_KEY"):
+        _config(None)
+
+    monkeypatch.setenv("DBT_FF_LAUNCHDARKLY_MODE", "file")
+    with pytest.raises(RuntimeError, match="DBT_FF_LAUNCHDARKLY_FILE"):
+        _config(None)
+
+    monkeypatch.delenv("DBT_FF_LAUNCHDARKLY_MODE")
+    monkeypatch.setenv("DBT_FF_LAUNCHDARKLY_FILE", "flags.json")
+    config = _config(None)
+    assert config.options["update_processor_class"] == ("files", ["flags.json"])
+    assert config.options["send_events"] is False
+
+    monkeypatch.setenv("DBT_FF_LAUNCHDARKLY_MODE", "relay")
+    with pytest.raises(RuntimeError, match="Unsupported LaunchDarkly mode"):
+        _config("key")
+
+
+def test_launchdarkly_file_mode_evaluates_offline(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    pytest.importorskip("ldclient")
+    from dbt_feature_flags.launchdarkly import LaunchDarklyFeatureFlagsClient
+
+    flags = tmp_path / "flags.json"
+    flags.write_text(json.dumps({"flagValues": {"enabled": True, "name": "v2"}}))
+    monkeypatch.delenv("DBT_FF_API_KEY", raising=False)
+    monkeypatch.delenv("DBT_FF_LAUNCHDARKLY_MODE", raising=False)
+    monkeypatch.setenv("DBT_FF_LAUNCHDARKLY_FILE", str(flags))
+
+    client = LaunchDarklyFeatureFlagsClient()
+    try:
+        assert client.bool_variation("enabled") is True
+        assert client.string_variation("name") == "v2"
+        assert client.bool_variation("missing") is False
+        version = client.state_version()
+        assert version is not None and version == client.state_version()
+        assert client.for_target("prod").state_version() != version
+    finally:
+        client.client.close()
+
+
+class FakeSplitClient:
+    def __init__(self) -> None:
+        self.batches: list[list[str]] = []
+        self.treatments = {
+            "enabled": "on",
+            "disabled": "control",
+            "text": "variant",
+            "number": "3.5",
+            "bad-number": "three",
+        }
+        self.configs = {
+            "payload": SimpleNamespace(treatment="on", config='{"enabled": true}'),
+            "bad-json": SimpleNamespace(treatment="on", config="{"),
+            "missing": SimpleNamespace(treatment="control", config=None),
+        }
+
+    def get_treatment(self, _key: str, flag: str) -> str:
+        return self.treatments[flag]
+
+    def get_treatment_with_config(self, _key: str, flag: str) -> SimpleNamespace:
+        return self.configs[flag]
+
+    def get_treatments(self, _key: str, flags: list[str]) -> dict[str, str]:
+        self.batches.append(flags)
+        return {flag: self.treatments.get(flag, "control") for flag in flags}
+
+    def get_treatments_with_config(
+        self, _key: str, flags: list[str]
+    ) -> dict[str, SimpleNamespace]:
+        self.batches.append(flags)
+        return {flag: self.configs[flag] for flag in flags}
+
+
+def test_fme_provider_maps_split_treatments() -> None:
+    from dbt_feature_flags.fme import HarnessFMEClient
+
+    client = object.__new__(HarnessFMEClient)
+    client._key = "dbt-default"
+    client._client = FakeSplitClient()
+    client._factory = SimpleNamespace(ready=True)
+    BaseFeatureFlagsClient.__init__(client)
+
+    assert client.bool_variation("enabled") is True
+    assert client.bool_variation("disabled", True) is True
+    assert client.string_variation("text") == "variant"
+    assert client.number_variation("number") == 3.5
     assert client.number_variation("bad-number", 7) == 7
     assert client.json_variation("payload") == {"enabled": True}
     assert client.json_variation("bad-json", []) == []
     assert client.json_variation("missing", []) == []
 
 
+def test_fme_provider_records_control_as_default_or_unavailable() -> None:
+    from dbt_feature_flags.fme import HarnessFMEClient
+
+    client = object.__new__(HarnessFMEClient)
+    client._key = "dbt-default"
+    client._client = FakeSplitClient()
+    client._factory = SimpleNamespace(ready=True)
+    BaseFeatureFlagsClient.__init__(client)
+
+    client.bool_variation("enabled")
+    client.bool_variation("disabled")
+    assert client.reasons == {"enabled": "treatment", "disabled": "default"}
+
+    client._factory.ready = False
+    client.bulk_evaluate(["disabled"], default=True)
+    assert client.reasons["disabled"] == "unavailable"
+
+
+def test_fme_provider_bulk_evaluates_with_single_sdk_call() -> None:
+    from dbt_feature_flags.fme import HarnessFMEClient
+
+    client = object.__new__(HarnessFMEClient)
+    client._key = "dbt-default"
+    client._client = FakeSplitClient()
+    client._factory = SimpleNamespace(ready=True)
+    BaseFeatureFlagsClient.__init__(client)
+
+    assert client.bulk_evaluate(["enabled", "disabled", "unknown"]) == {
+        "enabled": True,
+        "disabled": False,
+        "unknown": False,
+    }
+    assert client.bulk_evaluate(["number", "bad-number"], "number_variation", 7) == {
+        "number": 3.5,
+        "bad-number": 7,
+    }
+    assert client.bulk_evaluate(["payload", "missing"], "json_variation") == {
+        "payload": {"enabled": True},
+        "missing": {},
+    }
+    assert client._client.batches == [
+        ["enabled", "disabled", "unknown"],
+        ["number", "bad-number"],
+        ["payload", "missing"],
+    ]
+    assert client.bool_variation("enabled") is True
+    assert len(client._client.batches) == 3
+
+
 def test_fme_shutdown_factories_waits_for_destroy() -> None:
     from dbt_feature_flags import fme
 
@@ -434,3 +1464,840 @@ def test_fme_shutdown_factories_waits_for_destroy() -> None:
         fme._factory_cache.clear()
 
     assert factory.destroyed
+
+
+def test_telemetry_is_disabled_by_default(monkeypatch: pytest.MonkeyPatch) -> None:
+    from dbt_feature_flags import telemetry
+
+    monkeypatch.delenv("DBT_FF_TELEMETRY", raising=False)
+    monkeypatch.setattr(telemetry, "_RECORDER", None)
+
+    assert telemetry.get_recorder() is None
+    assert not hasattr(CountingClient()._bulk_variation, "__wrapped__")
+
+
+def test_telemetry_records_calls_hits_and_provider_latency(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from dbt_feature_flags import telemetry
+
+    report_path = tmp_path / "target" / ".dbt_ff_telemetry.json"
+    registered: list[t.Callable[[], None]] = []
+    monkeypatch.setenv("DBT_FF_TELEMETRY", "1")
+    monkeypatch.setenv("DBT_FF_TELEMETRY_PATH", str(report_path))
+    monkeypatch.setattr(telemetry, "_RECORDER", None)
+    monkeypatch.setattr(telemetry.atexit, "register", registered.append)
+
+    client = CountingClient()
+    assert client.bool_variation("a") is True
+    assert client.bool_variation("a") is True
+    assert client.bulk_evaluate(["a", "b"]) == {"a": True, "b": True}
+    assert client.bool_variation("b") is True
+    registered[0]()
+
+    report = json.loads(report_path.read_text())
+    assert report["flags"] == {
+        "a": {"bool_variation": {"calls": 3, "cache_hits": 2, "provider_calls": 1}},
+        "b": {"bool_variation": {"calls": 1, "cache_hits": 1, "provider_calls": 1}},
+    }
+    assert report["provider_latency"]["bool_variation"]["count"] == 1
+    assert report["provider_latency"]["bulk:bool_variation"]["count"] == 1
+    assert report["caches"]["CountingClient"] == {"hits": 3, "misses": 2, "size": 2}
+
+
+def test_telemetry_records_provider_init_time(monkeypatch: pytest.MonkeyPatch) -> None:
+    from dbt_feature_flags import patch, telemetry
+
+    monkeypatch.setenv("DBT_FF_TELEMETRY", "true")
+    monkeypatch.setenv("DBT_FF_PROVIDER", "harness")
+    monkeypatch.delenv("DBT_FF_DISABLE", raising=False)
+    monkeypatch.setattr(telemetry, "_RECORDER", None)
+    monkeypatch.setattr(telemetry.atexit, "register", lambda _: None)
+    monkeypatch.setattr(patch, "_build_client", lambda _: FakeClient({}))
+
+    patch._get_client()
+
+    recorder = telemetry.get_recorder()
+    assert recorder is not None
+    assert set(recorder.report()["init_s"]) == {"harness"}
+
+
+def test_trusted_mode_skips_validation(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("DBT_FF_TRUSTED", "1")
+
+    client = BadBoolClient()
+
+    assert client.bool_variation("bool-flag") == "not a bool"
+    assert client.bulk_evaluate(["other-flag"]) == {"other-flag": "not a bool"}
+
+
+def test_validator_is_shared_and_checks_only_cache_misses() -> None:
+    from dbt_feature_flags.base import VALIDATORS
+
+    client = CountingClient()
+    client.bool_variation("flag")
+    check = VALIDATORS["bool_variation"].wrap(lambda flag, default=False: "on")
+
+    assert client.bool_variation("flag") is True
+    assert client.cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+    with pytest.raises(ValueError, match="Invalid return value"):
+        check("flag")
+
+
+def test_fme_impressions_mode_is_configurable(monkeypatch: pytest.MonkeyPatch) -> None:
+    import sys
+
+    from dbt_feature_flags import fme
+
+    configs: list[dict[str, t.Any]] = []
+
+    def get_factory(sdk_key: str, config: dict[str, t.Any]) -> t.Any:
+        configs.append(config)
+        return SimpleNamespace(
+            block_until_ready=lambda timeout: None, client=FakeSplitClient
+        )
+
+    monkeypatch.setitem(
+        sys.modules, "splitio", SimpleNamespace(get_factory=get_factory)
+    )
+    monkeypatch.setenv("DBT_FF_API_KEY", "sdk")
+    monkeypatch.setattr(fme, "_factory_cache", {})
+    fme.HarnessFMEClient()
+    monkeypatch.setattr(fme, "_factory_cache", {})
+    monkeypatch.setenv("DBT_FF_FME_IMPRESSIONS", "none")
+    fme.HarnessFMEClient()
+    monkeypatch.setenv("DBT_FF_FME_IMPRESSIONS", "verbose")
+
+    with pytest.raises(RuntimeError, match="Unsupported FME impressions mode"):
+        fme._impressions_mode()
+    assert configs == [{"impressionsMode": "OPTIMIZED"}, {"impressionsMode": "NONE"}]
+
+
+def test_fme_shutdown_destroys_factories_in_parallel_with_one_deadline(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    import threading
+    import time
+
+    from dbt_feature_flags import fme
+
+    destroyed: list[threading.Event] = []
+
+    class HangingFactory:
+        def destroy(self, destroyed_event: threading.Event) -> None:
+            destroyed.append(destroyed_event)
+
+    monkeypatch.setenv("DBT_FF_FME_SHUTDOWN_TIMEOUT", "0.05")
+    monkeypatch.setattr(
+        fme, "_factory_cache", {f"sdk-{i}": HangingFactory() for i in range(10)}
+    )
+
+    start = time.monotonic()
+    fme._shutdown_factories()
+
+    assert len(destroyed) == 10
+    assert time.monotonic() - start < 0.5
+
+
+def test_for_target_shares_sdk_with_separate_caches() -> None:
+    from dbt_feature_flags.launchdarkly import LaunchDarklyFeatureFlagsClient
+
+    client = object.__new__(LaunchDarklyFeatureFlagsClient)
+    sdk = FakeLaunchDarklySDK()
+    client.client = sdk
+    client.target = {"key": "dbt-default"}
+    BaseFeatureFlagsClient.__init__(client)
+
+    tenant = client.for_target("tenant_a")
+    tenant.bool_variation("enabled")
+    tenant.bool_variation("enabled")
+    client.bool_variation("enabled")
+
+    assert client.for_target("tenant_a") is tenant
+    assert tenant.client is sdk
+    assert sdk.calls == [
+        ("enabled", {"key": "dbt-tenant_a", "name": "Tenant_A"}, False),
+        ("enabled", {"key": "dbt-default"}, False),
+    ]
+    assert tenant.cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+    assert client.cache.stats() == {"hits": 0, "misses": 1, "size": 1}
+
+
+def test_bulk_evaluate_targets_resolves_per_target(tmp_path: pathlib.Path) -> None:
+    from dbt_feature_flags.local import FileFeatureFlagsClient
+
+    path = tmp_path / "flags.json"
+    path.write_text(
+        json.dumps({"flags": {"mart": {"value": False, "targets": {"prod": True}}}})
+    )
+    client = FileFeatureFlagsClient(path)
+
+    assert client.bulk_evaluate_targets(["dev", "prod"], ["mart", "other"]) == {
+        "dev": {"mart": False, "other": False},
+        "prod": {"mart": True, "other": False},
+    }
+    client.for_target("prod").shutdown()
+
+
+def test_for_target_requires_provider_support() -> None:
+    with pytest.raises(NotImplementedError, match="multiple targets"):
+        CountingClient().for_target("prod")
+
+
+@pytest.fixture
+def flag_daemon(tmp_path: pathlib.Path) -> t.Iterator[t.Any]:
+    import tempfile
+    import threading
+
+    from dbt_feature_flags.daemon import FlagDaemon
+    from dbt_feature_flags.local import FileFeatureFlagsClient
+
+    path = tmp_path / "flags.json"
+    path.write_text(
+        json.dumps({"flags": {"mart": {"value": False, "targets": {"prod": True}}}})
+    )
+    with tempfile.TemporaryDirectory() as socket_dir:  # AF_UNIX paths are short
+        server = FlagDaemon(
+            f"{socket_dir}/ff.sock", "file", FileFeatureFlagsClient(path)
+        )
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield server
+        server.shutdown()
+        server.server_close()
+
+
+def test_daemon_serves_evaluations_per_target(flag_daemon: t.Any) -> None:
+    import datetime
+
+    from dbt_feature_flags.daemon import DaemonFeatureFlagsClient
+
+    client = DaemonFeatureFlagsClient("file", path=flag_daemon.server_address)
+
+    assert client.bool_variation("mart") is False
+    assert client.for_target("prod").bool_variation("mart") is True
+    assert client.bulk_evaluate(["mart", "other"], default=True) == {
+        "mart": False,
+        "other": True,
+    }
+    assert client.reasons == {"mart": "file", "other": "default"}
+    with pytest.raises(ValueError, match="Invalid feature flag evaluation"):
+        client.string_variation("mart")
+    assert client.json_variation("cfg", {"since": datetime.date(2024, 1, 1)}) == {
+        "since": "2024-01-01"
+    }
+    assert set(flag_daemon.client._targets) == {"default", "prod"}
+    client.shutdown()
+
+
+def test_daemon_client_rejects_other_provider(flag_daemon: t.Any) -> None:
+    from dbt_feature_flags.daemon import DaemonFeatureFlagsClient
+
+    with pytest.raises(ConnectionRefusedError, match="serves file"):
+        DaemonFeatureFlagsClient("fme", path=flag_daemon.server_address)
+
+
+def test_daemon_provider_falls_back_in_process_without_socket(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from dbt_feature_flags import patch
+
+    fallback = FakeClient({"flag": True})
+    monkeypatch.setenv("DBT_FF_PROVIDER", "daemon")
+    monkeypatch.setenv("DBT_FF_DAEMON_PROVIDER", "fme")
+    monkeypatch.setenv("DBT_FF_DAEMON_SOCKET", str(tmp_path / "missing.sock"))
+    monkeypatch.delenv("DBT_FF_DISABLE", raising=False)
+    monkeypatch.setattr(patch, "_build_provider_client", lambda _: fallback)
+
+    assert patch._get_client() is fallback
+
+
+def test_daemon_client_reconnects_then_falls_back_in_process(
+    flag_daemon: t.Any, tmp_path: pathlib.Path
+) -> None:
+    import socket
+
+    from dbt_feature_flags.daemon import DaemonFeatureFlagsClient
+
+    def drop_connection() -> None:
+        ours, theirs = socket.socketpair()
+        theirs.close()
+        client._local.conn = ours.makefile("rwb")
+
+    fallback = FakeClient({"late": True})
+    client = DaemonFeatureFlagsClient(
+        "file", path=flag_daemon.server_address, fallback=lambda: fallback
+    )
+    drop_connection()
+    assert client.bool_variation("mart") is False  # reconnected to the daemon
+
+    drop_connection()
+    client.path = str(tmp_path / "gone.sock")
+    assert client.bool_variation("late") is True
+    fallback.reasons["unready"] = "unavailable"
+    assert client.bulk_evaluate(["unready"]) == {"unready": False}
+    assert client.reasons == {"mart": "file", "unready": "unavailable"}
+    assert client.bool_variation("mart", True) is True
+    client.shutdown()
+    assert fallback.shutdown_called
+
+
+def test_daemon_refreshes_provider_when_ttl_expires() -> None:
+    import tempfile
+
+    from dbt_feature_flags.daemon import FlagDaemon
+
+    class RefreshingClient(FakeClient):
+        refreshes = 0
+
+        def _set_target(self, target: str) -> None:
+            pass
+
+        def refresh(self) -> bool:
+            self.refreshes += 1
+            raise RuntimeError("upstream unreachable")
+
+    upstream = RefreshingClient({"mart": True})
+    with tempfile.TemporaryDirectory() as socket_dir:
+        server = FlagDaemon(f"{socket_dir}/ff.sock", "file", upstream, ttl=0)
+        request = {
+            "op": "evaluate",
+            "provider": "file",
+            "target": "default",
+            "variation": "bool_variation",
+            "flags": ["mart"],
+            "default": False,
+        }
+        expected = {"values": {"mart": True}, "reasons": {}}
+        assert server.dispatch(request) == expected
+        assert server.dispatch(request) == expected
+        server.server_close()
+
+    assert upstream.refreshes == 2
+
+
+def test_daemon_rejects_launchdarkly_modes_loading_flags_once(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    from dbt_feature_flags import daemon, patch
+
+    monkeypatch.setenv("DBT_FF_LAUNCHDARKLY_MODE", "poll")
+    monkeypatch.setattr(patch, "_build_provider_client", pytest.fail)
+
+    with pytest.raises(RuntimeError, match="requires stream mode"):
+        daemon.serve(provider="launchdarkly")
+
+
+class FakeAsyncSplitClient:
+    def __init__(self) -> None:
+        self.sync = FakeSplitClient()
+        self.keys: list[str] = []
+
+    async def get_treatment(self, key: str, flag: str) -> str:
+        self.keys.append(key)
+        return self.sync.get_treatment(key, flag)
+
+    async def get_treatment_with_config(self, key: str, flag: str) -> t.Any:
+        return self.sync.get_treatment_with_config(key, flag)
+
+    async def get_treatments(self, key: str, flags: list[str]) -> dict[str, str]:
+        self.keys.append(key)
+        return self.sync.get_treatments(key, flags)
+
+
+def test_async_fme_client_evaluates_and_caches_per_target() -> None:
+    import asyncio
+
+    from dbt_feature_flags.fme import AsyncHarnessFMEClient
+
+    sdk = FakeAsyncSplitClient()
+    client = AsyncHarnessFMEClient(
+        SimpleNamespace(client=lambda: sdk, ready=True), "dbt-dev"
+    )
+
+    async def scenario() -> t.Any:
+        single = await client.bool_variation("enabled")
+        cached = await client.bool_variation("enabled")
+        number = await client.number_variation("number")
+        with pytest.raises(ValueError, match="Invalid default value"):
+            await client.bool_variation("number", default=1)  # type: ignore[arg-type]
+        with pytest.raises(ValueError, match="Invalid default value"):
+            await client.json_variation("number", default={1})  # type: ignore[arg-type]
+        targets = await client.bulk_evaluate_targets(
+            ["prod", "ci"], ["enabled", "disabled"]
+        )
+        return single, cached, number, targets
+
+    single, cached, number, targets = asyncio.run(scenario())
+
+    assert (single, cached, number) == (True, True, 3.5)
+    assert targets == {
+        "prod": {"enabled": True, "disabled": False},
+        "ci": {"enabled": True, "disabled": False},
+    }
+    assert sdk.keys == ["dbt-dev", "dbt-dev", "dbt-prod", "dbt-ci"]
+    assert sdk.sync.batches == [["enabled", "disabled"], ["enabled", "disabled"]]
+    assert client.cache.stats() == {"hits": 1, "misses": 3, "size": 2}
+
+
+def test_get_client_follows_provider(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from dbt_feature_flags.local import FileFeatureFlagsClient
+    from dbt_feature_flags.patch import get_client
+
+    path = tmp_path / "flags.json"
+    path.write_text(
+        json.dumps({"flags": {"mart": {"value": False, "targets": {"prod": True}}}})
+    )
+    monkeypatch.delenv("DBT_FF_DISABLE", raising=False)
+    monkeypatch.setenv("DBT_FF_PROVIDER", "file")
+    monkeypatch.setenv("DBT_FF_FILE", str(path))
+
+    client = get_client()
+    assert isinstance(client, FileFeatureFlagsClient)
+    assert client.bulk_evaluate_targets(["dev", "prod"], ["mart"]) == {
+        "dev": {"mart": False},
+        "prod": {"mart": True},
+    }
+    client.shutdown()
+
+    monkeypatch.setenv("DBT_FF_PROVIDER", "mock")
+    mock = get_client()
+    assert mock.for_target("prod").bool_variation("mart", True) is True
+
+
+def test_get_async_client_follows_provider(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    import asyncio
+
+    from dbt_feature_flags.patch import get_async_client
+
+    path = tmp_path / "flags.json"
+    path.write_text(
+        json.dumps({"flags": {"mart": {"value": False, "targets": {"prod": True}}}})
+    )
+    monkeypatch.delenv("DBT_FF_DISABLE", raising=False)
+    monkeypatch.setenv("DBT_FF_PROVIDER", "file")
+    monkeypatch.setenv("DBT_FF_FILE", str(path))
+
+    async def scenario() -> t.Any:
+        client = await get_async_client()
+        values = await client.bulk_evaluate_targets(["dev", "prod"], ["mart"])
+        await client.shutdown()
+        monkeypatch.setenv("DBT_FF_PROVIDER", "mock")
+        mock = await get_async_client()
+        return values, await mock.json_variation("payload")
+
+    assert asyncio.run(scenario()) == (
+        {"dev": {"mart": False}, "prod": {"mart": True}},
+        {},
+    )
+
+
+def test_harness_sync_configs_revalidates_with_etags(tmp_path: pathlib.Path) -> None:
+    from dbt_feature_flags.harness import sync_configs
+
+    path = tmp_path / "target" / ".dbt_ff_harness.json"
+    requests: list[tuple[str, str | None]] = []
+    server = {"flags": ([{"feature": "a"}], "v1"), "segments": ([{"id": "s"}], "s1")}
+
+    def fetcher(name: str) -> t.Any:
+        def fetch(etag: str | None) -> t.Any:
+            requests.append((name, etag))
+            items, current = server[name]
+            return (None, etag) if etag == current else (items, current)
+
+        return fetch
+
+    fetchers = {name: fetcher(name) for name in server}
+
+    first = sync_configs(fetchers, path, "sdk")
+    server["flags"] = ([{"feature": "b"}], "v2")
+    second = sync_configs(fetchers, path, "sdk")
+
+    assert first == {"flags": [{"feature": "a"}], "segments": [{"id": "s"}]}
+    assert second == {"flags": [{"feature": "b"}], "segments": [{"id": "s"}]}
+    assert requests == [
+        ("flags", None),
+        ("segments", None),
+        ("flags", "v1"),
+        ("segments", "s1"),
+    ]
+
+
+def test_harness_sync_configs_skips_api_within_ttl(tmp_path: pathlib.Path) -> None:
+    from dbt_feature_flags.harness import sync_configs
+
+    path = tmp_path / ".dbt_ff_harness.json"
+    calls: list[str | None] = []
+
+    def fetch(etag: str | None) -> t.Any:
+        calls.append(etag)
+        return [{"feature": "a"}], "v1"
+
+    sync_configs({"flags": fetch}, path, "sdk", ttl=60)
+    assert sync_configs({"flags": fetch}, path, "sdk", ttl=60) == {
+        "flags": [{"feature": "a"}]
+    }
+    sync_configs({"flags": fetch}, path, "other-sdk", ttl=60)
+
+    assert calls == [None, None]
+
+
+def test_harness_provider_serves_precomputed_target_values() -> None:
+    from dbt_feature_flags.harness import HarnessFeatureFlagsClient
+
+    evaluated: list[tuple[str, object, str]] = []
+    served = {"enabled": "true", "name": "v2", "count": "3", "payload": '{"x": 1}'}
+
+    class FakeEvaluator:
+        def evaluate(self, flag: str, target: object, kind: str) -> t.Any:
+            evaluated.append((flag, target, kind))
+            value = served.get(flag)
+            return None if value is None else SimpleNamespace(value=value)
+
+    client = object.__new__(HarnessFeatureFlagsClient)
+    client.client = FakeHarnessSDK()
+    client._resolved = {}
+    client.client._evaluator = FakeEvaluator()
+    client.client.configs = {
+        "flags": [
+            {"feature": "enabled", "kind": "boolean"},
+            {"feature": "name", "kind": "string"},
+            {"feature": "count", "kind": "int"},
+            {"feature": "payload", "kind": "json"},
+            {"feature": "unserved", "kind": "boolean"},
+        ]
+    }
+    client.target = SimpleNamespace(identifier="dbt-default")
+    client._resolve()
+    BaseFeatureFlagsClient.__init__(client)
+
+    assert client.bool_variation("enabled") is True
+    assert client.reasons["enabled"] == "precomputed"
+    assert client.string_variation("name") == "v2"
+    assert client.number_variation("count") == 3.0
+    assert client.json_variation("payload") == {"x": 1}
+    # Not resolved, or requested as another kind: served by the SDK
+    assert client.bool_variation("unserved") is True
+    assert client.string_variation("enabled", "x") == "enabled:x"
+    assert client.bool_variation("unknown") is True
+    assert client.reasons == {
+        "enabled": "default",  # requested as a string
+        "name": "precomputed",
+        "count": "precomputed",
+        "payload": "precomputed",
+        "unserved": "sdk",
+        "unknown": "default",
+    }
+    assert [flag for flag, _, _ in evaluated] == [
+        "enabled",
+        "name",
+        "count",
+        "payload",
+        "unserved",
+    ]
+
+    version = client.state_version()
+    served["enabled"] = "false"
+    client._resolve()
+    assert client.state_version() != version
+
+
+def test_harness_precompute_supports_sdk_evaluators_without_kind(
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    from dbt_feature_flags.harness import HarnessFeatureFlagsClient
+
+    class LegacyEvaluator:  # harness-featureflags 1.1/1.2
+        def evaluate(self, identifier: str, target: object) -> t.Any:
+            return SimpleNamespace(value={"enabled": "true"}.get(identifier))
+
+    class BrokenEvaluator:
+        def evaluate(self, identifier: str, target: object, kind: str) -> t.Any:
+            raise RuntimeError("repository unavailable")
+
+    client = object.__new__(HarnessFeatureFlagsClient)
+    client.client = FakeHarnessSDK()
+    client._resolved = {}
+    client.client.configs = {
+        "flags": [
+            {"feature": "enabled", "kind": "boolean"},
+            {"feature": "missing", "kind": "boolean"},
+        ]
+    }
+    client.target = SimpleNamespace(identifier="dbt-default")
+
+    client.client._evaluator = LegacyEvaluator()
+    client._resolve()
+    assert client._resolved == {"enabled": ("bool_variation", True)}
+
+    client.client._evaluator = BrokenEvaluator()
+    client._resolve()
+    assert client._resolved == {}
+    assert "Could not precompute Harness flags" in caplog.text
+
+
+def stub_harness_sdk(
+    monkeypatch: pytest.MonkeyPatch, served: dict[str, str]
+) -> dict[str, list[t.Any]]:
+    """Install fake featureflags modules at the paths the Harness SDK uses."""
+    import logging
+
+    loaded: dict[str, t.Any] = {
+        "flags": [],
+        "segments": [],
+        "removed": [],
+        "requests": [],
+        "configs": {
+            "flags": [{"feature": flag, "kind": "boolean"} for flag in served],
+            "segments": [{"identifier": "beta"}],
+        },
+    }
+
+    class Model(SimpleNamespace):
+        @classmethod
+        def from_dict(cls, src: dict[str, t.Any]) -> "Model":
+            return cls(**src)
+
+        def to_dict(self) -> dict[str, t.Any]:
+            return dict(vars(self))
+
+    def endpoint(name: str) -> t.Any:
+        def sync_detailed(client: t.Any, environment_uuid: str) -> t.Any:
+            loaded["requests"].append((name, environment_uuid))
+            return SimpleNamespace(
+                status_code=200,
+                parsed=[Model.from_dict(item) for item in loaded["configs"][name]],
+                headers={"ETag": name + "-v1"},
+            )
+
+        return SimpleNamespace(sync_detailed=sync_detailed)
+
+    class Repository:
+        def __init__(self, cache: t.Any) -> None:
+            pass
+
+        def set_flag(self, flag: t.Any) -> None:
+            loaded["flags"].append(flag)
+
+        def set_segment(self, segment: t.Any) -> None:
+            loaded["segments"].append(segment)
+
+        def remove_flag(self, identifier: str) -> None:
+            loaded["removed"].append(identifier)
+
+        def remove_segment(self, identifier: str) -> None:
+            loaded["removed"].append(identifier)
+
+    class Evaluator:
+        def __init__(self, repository: t.Any) -> None:
+            pass
+
+        def evaluate(self, flag: str, target: t.Any, kind: str) -> t.Any:
+            return SimpleNamespace(value=served[flag]) if flag in served else None
+
+    class CfClient:
+        def authenticate(self) -> None:
+            self._client = SimpleNamespace(with_headers=lambda headers: self._client)
+            self._environment_id = "env"
+
+        def destroy(self) -> None:
+            pass
+
+    modules = {
+        "featureflags": {},
+        "featureflags.api": {},
+        "featureflags.api.default": {},
+        "featureflags.api.default.get_feature_config": vars(endpoint("flags")),
+        "featureflags.api.default.get_all_segments": vars(endpoint("segments")),
+        "featureflags.evaluations": {},
+        "featureflags.evaluations.feature": {"FeatureConfig": Model},
+        "featureflags.evaluations.segment": {"Segment": Model},
+        "featureflags.evaluations.evaluator": {"Evaluator": Evaluator},
+        "featureflags.repository": {"Repository": Repository},
+        "featureflags.config": {
+            "Config": lambda **kwargs: SimpleNamespace(cache=None, **kwargs)
+        },
+        "featureflags.client": {
+            "CfClient": CfClient,
+            "Target": SimpleNamespace,
+            "log": logging.getLogger("featureflags.test"),
+        },
+    }
+    for name, attributes in modules.items():
+        module = ModuleType(name)
+        module.__dict__.update(attributes)
+        monkeypatch.setitem(sys.modules, name, module)
+    return loaded
+
+
+def test_harness_provider_initializes_against_sdk_modules(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+) -> None:
+    from dbt_feature_flags.harness import HarnessFeatureFlagsClient
+
+    loaded = stub_harness_sdk(monkeypatch, {"enabled": "true", "legacy": "false"})
+    monkeypatch.setenv("DBT_FF_API_KEY", "sdk")
+    monkeypatch.setenv("DBT_FF_HARNESS_CACHE_PATH", str(tmp_path / "hff.json"))
+
+    client = HarnessFeatureFlagsClient()
+
+    assert loaded["requests"] == [("flags", "env"), ("segments", "env")]
+    assert [flag.feature for flag in loaded["flags"]] == ["enabled", "legacy"]
+    assert [segment.identifier for segment in loaded["segments"]] == ["beta"]
+    assert client.bool_variation("enabled") is True
+    assert client.bool_variation("legacy", True) is False
+    client.shutdown()
+
+
+def test_harness_provider_refresh_resyncs_configs(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+) -> None:
+    from dbt_feature_flags.harness import HarnessFeatureFlagsClient
+
+    served = {"enabled": "true", "legacy": "false"}
+    loaded = stub_harness_sdk(monkeypatch, served)
+    monkeypatch.setenv("DBT_FF_API_KEY", "sdk")
+    monkeypatch.setenv("DBT_FF_HARNESS_CACHE_PATH", str(tmp_path / "hff.json"))
+    client = HarnessFeatureFlagsClient()
+    prod = client.for_target("prod")
+    assert client.bool_variation("enabled") is True
+    assert prod.bool_variation("enabled") is True
+
+    assert not client.refresh()  # configs unchanged
+
+    served["enabled"] = "false"
+    loaded["configs"]["flags"] = [
+        {"feature": "enabled", "kind": "boolean", "version": 2}
+    ]
+    assert client.refresh()
+    assert client.bool_variation("enabled") is False
+    assert prod.bool_variation("enabled") is False
+    assert loaded["removed"] == ["legacy"]
+
+
+def test_selector_selects_nodes_rendered_with_changed_flags(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: pathlib.Path,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    from dbt_feature_flags import patch, selector
+    from dbt_feature_flags.graph import FlagGraph
+    from dbt_feature_flags.patch import get_rendered
+
+    def render(string: str, ctx: dict[str, t.Any], *args: t.Any) -> None:
+        for flag in string.split():
+            ctx["feature_flag"](flag, flag == "unknown")
+
+    rendered_nodes = (
+        ("model.p.a", "on"),
+        ("model.p.b", "off unknown"),
+        ("test.p.not_null_b.abc123", "off"),
+        ("seed.p.c", "unknown"),
+    )
+    run_results = tmp_path / "run_results.json"
+
+    def invoke(flags: dict[str, bool], which: str | None) -> None:
+        flag_graph = FlagGraph(tmp_path / ".dbt_ff_graph.json", run_results)
+        rendered = get_rendered(render, FakeClient(flags), flag_graph)
+        for unique_id, node_flags in rendered_nodes:
+            rendered(node_flags, {}, SimpleNamespace(unique_id=unique_id))
+        if which is not None:
+            results = [
+                {"unique_id": unique_id, "status": "success"}
+                for unique_id, _ in rendered_nodes
+            ]
+            run_results.write_text(
+                json.dumps({"args": {"which": which}, "results": results})
+            )
+            os.utime(run_results, (flag_graph.started,) * 2)
+        flag_graph.write()
+
+    invoke({"on": True, "off": False}, "build")
+    # Rendering with the flipped flag, e.g. dbt parse, does not move the baseline
+    invoke({"on": True, "off": True}, None)
+    invoke({"on": True, "off": True}, "compile")
+    (tmp_path / "manifest.json").write_text(
+        json.dumps({"nodes": {"model.p.b": {"fqn": ["p", "staging", "b"]}}})
+    )
+    graph_path = tmp_path / ".dbt_ff_graph.json"
+
+    client = FakeClient({"on": True, "off": True})
+    monkeypatch.setattr(patch, "_get_client", lambda: client)
+    selection = selector.run(str(tmp_path), graph_path)
+
+    assert selection == "fqn:p.staging.b+ not_null_b+"
+    assert "2 of 4 flag-dependent node(s) changed" in capsys.readouterr().err
+    assert client.shutdown_called
+    assert selector.format_selection(["fqn:p.a"], "yaml") == (
+        "selectors:\n"
+        "- name: dbt_ff_changed\n"
+        "  definition:\n"
+        "    union:\n"
+        "    - method: fqn\n"
+        "      value: p.a\n"
+        "      children: true\n"
+    )
+
+    unavailable = patch._DefaultsClient()
+    monkeypatch.setattr(patch, "_get_client", lambda: unavailable)
+    assert selector.run(str(tmp_path), graph_path) == ""
+
+    # A successful build moves the baseline forward
+    invoke({"on": True, "off": True}, "build")
+    monkeypatch.setattr(patch, "_get_client", lambda: client)
+    assert selector.run(str(tmp_path), graph_path) == ""
+    # A node rendered with a flag it was never built with is selected
+    rendered_nodes = (("model.p.a", "on off"),)
+    invoke({"on": True, "off": True}, None)
+    assert selector.run(str(tmp_path), graph_path) == "a+"
+
+    with pytest.raises(RuntimeError, match="No flag dependency graph"):
+        selector.run(str(tmp_path), tmp_path / "missing.json")
+
+
+def test_preflight_short_circuits_on_unchanged_state_version(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: pathlib.Path,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    from dbt_feature_flags import patch, preflight
+    from dbt_feature_flags.local import FileFeatureFlagsClient
+
+    target_dir = tmp_path / "target"
+    flags = tmp_path / "flags.json"
+    flags.write_text(json.dumps({"flags": {"flag": False}}))
+    monkeypatch.setattr(patch, "_get_client", lambda: FileFeatureFlagsClient(flags))
+    scans: list[str] = []
+    build_index = preflight.build_index
+    monkeypatch.setattr(
+        preflight,
+        "build_index",
+        lambda **kwargs: scans.append("scan") or build_index(**kwargs),
+    )
+
+    preflight.run(target_dir=str(target_dir), project_dir=str(tmp_path))
+    state_file = target_dir / preflight.STATE_FILE
+    version = (target_dir / preflight.VERSION_FILE).read_text()
+    written = state_file.stat().st_mtime_ns
+    capsys.readouterr()
+
+    preflight.run(target_dir=str(target_dir), project_dir=str(tmp_path))
+
+    assert "Flag state version unchanged" in capsys.readouterr().out
+    assert scans == ["scan"]
+    assert state_file.stat().st_mtime_ns == written
+
+    flags.write_text(json.dumps({"flags": {"flag": True}}))
+    preflight.run(target_dir=str(target_dir), project_dir=str(tmp_path))
+
+    assert scans == ["scan", "scan"]
+    assert (target_dir / preflight.VERSION_FILE).read_text() != version
+
+    monkeypatch.setattr(patch, "_get_client", patch._DefaultsClient)
+    preflight.run(["flag"], target_dir=str(target_dir))
+
+    assert not (target_dir / preflight.VERSION_FILE).exists()